@@ -4,15 +4,21 @@ BANCO Pichincha - PROCESAMIENTO DE ARCHIVOS CSV OPTIMIZADO
 Versión optimizada del procesador original usando componentes comunes
 """
 from datetime import datetime, timedelta
-import time
 import os
 import re
+import sys
+import signal
 from componentes_comunes import (
     LectorArchivos,
     LogManager,
     BaseDatos,
     SubprocesoManager,
     ConfiguracionManager,
+    MedidorTiempos,
+    MetricasEjecucion,
+    VigilanteDirectorio,
+    ProcesadorParalelo,
+    LedgerArchivos,
     RUTAS_CONFIG
 )
 
@@ -50,18 +56,10 @@ def obtener_empresa_desde_nombre_archivo(nombre_archivo):
         return base.split(".")[0].upper()
 
 
-def obtenerIDEjecucion():
-    """Obtiene el siguiente ID de ejecución de la BD"""
-    try:
-        sql = f"SELECT MAX(idAutomationRun) FROM {DATABASE_RUNS}"
-        resultado = BaseDatos.consultarBD(sql)
-        if resultado and resultado[0] and resultado[0][0]:
-            return resultado[0][0] + 1
-        return 1
-    except Exception as e:
-        LogManager.escribir_log(
-            "ERROR", f"Error obteniendo ID ejecución: {str(e)}")
-        return int(time.time())  # Fallback
+def obtener_cuenta_desde_nombre_archivo(nombre_archivo):
+    """Número de cuenta del archivo (o la clave de empresa si no está en EMPRESAS_PICHINCHA)"""
+    empresa_key = obtener_empresa_desde_nombre_archivo(nombre_archivo)
+    return EMPRESAS_PICHINCHA.get(empresa_key, {}).get("numCuenta") or empresa_key
 
 
 def datosEjecucion(sql):
@@ -137,6 +135,7 @@ def movimiento_ya_existe(documento, fecha_sql, monto, saldo, tipo, documentos_bd
             return True
     return False
     
+@MedidorTiempos.medido()
 def procesar_csv_pichincha(ruta_csv, id_ejecucion):
     """Procesa un archivo CSV de Banco Pichincha"""
     try:
@@ -147,6 +146,21 @@ def procesar_csv_pichincha(ruta_csv, id_ejecucion):
         num_cuenta = info_empresa["numCuenta"]
         empresa = info_empresa["empresa"]
 
+        # Descartar sin leerlo un archivo idéntico a uno ya procesado
+        ledger = LedgerArchivos(NOMBRE_BANCO)
+        hash_archivo = LedgerArchivos.hash_archivo(ruta_csv) if ledger.ruta else None
+        anterior = ledger.archivo_procesado(hash_archivo) if hash_archivo else None
+        if anterior:
+            LogManager.escribir_log(
+                "INFO", f"⏭️ Archivo idéntico a {anterior['nombre']} (procesado {anterior['fecha']}), se descarta")
+            MetricasEjecucion.incrementar("archivos_repetidos")
+            return {
+                "empresa": empresa,
+                "archivo": os.path.basename(ruta_csv),
+                "insertados": 0,
+                "omitidos": anterior["filas"] or 0
+            }
+
         registros = LectorArchivos.leerCSV(ruta_csv)
         # print(f"Registros leídos: {registros}")
         if not registros or len(registros) < 2:
@@ -158,10 +172,25 @@ def procesar_csv_pichincha(ruta_csv, id_ejecucion):
 
         movimientos_insertados = 0
         movimientos_omitidos = 0
+        movimientos_fallidos = 0  # Inserciones que fallaron (no son duplicados)
         consultas_a_insertar = []
 
+        # Filas ya ingeridas en archivos anteriores de la misma cuenta
+        hashes_filas = {}
+        if ledger.ruta:
+            hashes_filas = {i: LedgerArchivos.hash_fila(*fila)
+                            for i, fila in enumerate(registros[1:], start=2)}
+        filas_conocidas = ledger.filas_registradas(num_cuenta or empresa_key, hashes_filas.values())
+        filas_resueltas = []
+        filas_ledger = 0
+
         for i, fila in enumerate(registros[1:], start=2):
             try:
+                if hashes_filas.get(i) in filas_conocidas:
+                    movimientos_omitidos += 1
+                    filas_ledger += 1
+                    continue
+
                 fila_dict = dict(zip(encabezado, fila))
                 documento = str(fila_dict.get("documento", "")).strip().zfill(10)
                 
@@ -199,6 +228,8 @@ def procesar_csv_pichincha(ruta_csv, id_ejecucion):
                 resultado_check = BaseDatos.consultarBD(sql_check)
                 if resultado_check and resultado_check[0][0] > 0:
                     movimientos_omitidos += 1
+                    if i in hashes_filas:
+                        filas_resueltas.append(hashes_filas[i])
                     continue
 
                 # Buscar documentos existentes con el mismo número base
@@ -225,6 +256,8 @@ def procesar_csv_pichincha(ruta_csv, id_ejecucion):
                 # 1. Si ya existe exactamente el mismo movimiento, omitir
                 if movimiento_ya_existe(documento, fecha_sql, monto, saldo, tipo, documentos_bd):
                     movimientos_omitidos += 1
+                    if i in hashes_filas:
+                        filas_resueltas.append(hashes_filas[i])
                     continue
 
                 # 2. Si existe el número base pero con algún campo diferente, asignar sufijo
@@ -252,7 +285,7 @@ def procesar_csv_pichincha(ruta_csv, id_ejecucion):
                             saldo}, '{oficina}', '{concepto}'
                     )
                 """
-                consultas_a_insertar.append(sql_insert)
+                consultas_a_insertar.append((sql_insert, hashes_filas.get(i)))
 
             except Exception as e:
                 LogManager.escribir_log(
@@ -264,20 +297,44 @@ def procesar_csv_pichincha(ruta_csv, id_ejecucion):
         if movimientos_omitidos == 0:
             LogManager.escribir_log(
                 "WARNING", f"El archivo {os.path.basename(ruta_csv)} posiblemente esté incorrecto (0 omitidos), no se insertará.")
+            if hash_archivo:
+                ledger.registrar_archivo(hash_archivo, ruta_csv, len(registros) - 1,
+                                         0, 0, resultado="rechazado")
             return False
 
         # Si pasa la validación, procedemos a insertar
-        for sql_insert in consultas_a_insertar:
+        for sql_insert, hash_fila in consultas_a_insertar:
             if BaseDatos.ejecutarSQL(sql_insert):
                 movimientos_insertados += 1
+                if hash_fila:
+                    filas_resueltas.append(hash_fila)
             else:
-                movimientos_omitidos += 1
+                movimientos_fallidos += 1
+
+        MetricasEjecucion.registrar_filas(
+            movimientos_insertados + movimientos_omitidos + movimientos_fallidos,
+            movimientos_insertados, movimientos_omitidos + movimientos_fallidos)
+
+        if hash_archivo:
+            # Con inserciones fallidas el archivo queda 'parcial': si vuelve a
+            # llegar se reprocesa (las filas ya resueltas las filtra el registro)
+            ledger.registrar_filas(num_cuenta or empresa_key, filas_resueltas)
+            ledger.registrar_archivo(hash_archivo, ruta_csv, len(registros) - 1,
+                                     movimientos_insertados, movimientos_omitidos,
+                                     resultado="parcial" if movimientos_fallidos else "procesado")
+        if movimientos_fallidos:
+            LogManager.escribir_log(
+                "WARNING", f"❌ Inserciones fallidas: {movimientos_fallidos}")
+        if filas_ledger:
+            LogManager.escribir_log(
+                "INFO", f"📒 Filas ya ingeridas en archivos anteriores: {filas_ledger}")
 
         return {
             "empresa": empresa,
             "archivo": os.path.basename(ruta_csv),
             "insertados": movimientos_insertados,
-            "omitidos": movimientos_omitidos
+            "omitidos": movimientos_omitidos,
+            "fallidos": movimientos_fallidos
         }
 
     except Exception as e:
@@ -322,28 +379,31 @@ def obtenerArchivos():
 # ==================== FUNCIÓN PRINCIPAL ====================
 
 
-def main():
-    """Función principal que procesa todos los archivos de Banco Pichincha"""
+def main(archivos=None, workers=1):
+    """
+    Función principal que procesa todos los archivos de Banco Pichincha
+
+    Args:
+        archivos: Rutas a procesar; por defecto todas las de la carpeta (obtenerArchivos)
+        workers: Procesos en paralelo (--workers N); los archivos de una
+                 misma cuenta se procesan siempre en orden
+    """
     id_ejecucion = None
 
     try:
-        # Obtener ID de ejecución
-        id_ejecucion = obtenerIDEjecucion()
+        # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+        id_ejecucion = BaseDatos.registrar_ejecucion(
+            DATABASE_RUNS, f"Procesamiento archivos-{NOMBRE_BANCO}")
 
         LogManager.iniciar_proceso(
             NOMBRE_BANCO, id_ejecucion, f"Procesamiento archivos CSV Pichincha - ID: {id_ejecucion}")
 
-        # Registrar inicio en BD
-        sql_inicio = f"""
-            INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) 
-            VALUES ({id_ejecucion}, 'Procesamiento archivos-{NOMBRE_BANCO}', SYSDATETIME(), 'Running')
-        """
-        datosEjecucion(sql_inicio)
         escribirLog("Inicio del proceso", id_ejecucion,
                     "Information", "Inicio")
 
         # Obtener archivos para procesar
-        archivos = obtenerArchivos()
+        if archivos is None:
+            archivos = obtenerArchivos()
 
         if not archivos:
             LogManager.escribir_log(
@@ -363,22 +423,23 @@ def main():
                 NOMBRE_BANCO, exito=True, descripcion="No hay archivos para procesar")
             return True
 
-        # Procesar cada archivo
+        # Procesar cada archivo (en paralelo por cuenta con --workers)
         archivos_procesados = 0
         archivos_exitosos = 0
+        registros_insertados = 0
 
-        for archivo in archivos:
+        archivos = [archivo for archivo in archivos if archivo.lower().endswith('.csv')]
+        grupos = ProcesadorParalelo.agrupar(
+            archivos, obtener_cuenta_desde_nombre_archivo) if workers > 1 else [archivos]
+
+        for archivo, resumen in ProcesadorParalelo.procesar(procesar_csv_pichincha, grupos, workers, id_ejecucion):
             try:
                 LogManager.escribir_log(
-                    "INFO", f"📁 Procesando archivo {archivos_procesados + 1} de {len(archivos)}")
-
-                if archivo.lower().endswith('.csv'):
-                    resumen = procesar_csv_pichincha(archivo, id_ejecucion)
-                else:
-                    break
+                    "INFO", f"📁 Archivo {archivos_procesados + 1} de {len(archivos)} procesado: {os.path.basename(archivo)}")
 
                 if resumen:
                     archivos_exitosos += 1
+                    registros_insertados += resumen['insertados']
                     escribirLog(f"Archivo procesado exitosamente: {resumen['archivo']}",
                                 id_ejecucion, "Information", "Procesamiento")
                     # BORRAR ARCHIVO SOLO SI SE PROCESÓ EXITOSAMENTE
@@ -417,7 +478,7 @@ def main():
         datosEjecucion(sql_fin)
 
         # Mensaje final
-        mensaje_final = f"Procesamiento completado - {archivos_procesados} archivos procesados, {archivos_exitosos} exitosos"
+        mensaje_final = f"Procesamiento completado - {archivos_procesados} archivos procesados, {archivos_exitosos} exitosos, {registros_insertados} registros insertados"
         LogManager.escribir_log("SUCCESS", mensaje_final)
 
         # Ejecutar BAT para subir movimientos al portal
@@ -450,9 +511,51 @@ def main():
         return False
 
 
-if __name__ == "__main__":
+def vigilar(workers=1):
+    """
+    Modo --vigilar: proceso permanente que ingiere cada CSV apenas termina
+    de copiarse en la carpeta de Pichincha (una ejecución por archivo), en
+    lugar de esperar al siguiente turno de cron
+
+    Args:
+        workers: Procesos para los archivos acumulados al iniciar
+    """
+    vigilante = VigilanteDirectorio(RUTAS_CONFIG['pichincha'], ('.csv',))
+    signal.signal(signal.SIGTERM, lambda signum, frame: vigilante.detener())
+    vigilante.iniciar()
+
+    # Archivos que ya estaban en la carpeta antes de empezar a vigilar
+    resultado = main(workers=workers)
+    try:
+        for ruta in vigilante.esperar_archivos():
+            LogManager.escribir_log(
+                "INFO", f"📥 Archivo recibido: {os.path.basename(ruta)}")
+            resultado = main(archivos=[ruta]) and resultado
+    except KeyboardInterrupt:
+        vigilante.detener()
+    LogManager.escribir_log("INFO", "Vigilancia de carpeta detenida")
+    return resultado
+
+
+# ==================== PUNTO DE ENTRADA ====================
+def ejecutar(argumentos=None):
+    """
+    Punto de entrada de línea de comandos (usado también por orquestador.py)
+
+    Args:
+        argumentos: Lista de argumentos al estilo sys.argv (por defecto sys.argv)
+
+    Returns:
+        int: Código de salida del proceso (0 = éxito)
+    """
+    argumentos = sys.argv if argumentos is None else argumentos
+    resultado = False
     try:
-        resultado = main()
+        workers = ProcesadorParalelo.leer_workers(argumentos)
+        if "--vigilar" in argumentos:
+            resultado = vigilar(workers=workers)
+        else:
+            resultado = main(workers=workers)
         if resultado:
             LogManager.escribir_log(
                 "SUCCESS", "=== PROCESAMIENTO COMPLETADO EXITOSAMENTE ===")
@@ -463,3 +566,8 @@ if __name__ == "__main__":
             "ERROR", f"Error crítico en ejecución: {str(e)}")
     finally:
         LogManager.escribir_log("INFO", "=== FIN DE EJECUCIÓN ===")
+    return 0 if resultado else 1
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
@@ -5,15 +5,21 @@ Versión optimizada del procesador original usando componentes comunes
 """
 
 from datetime import datetime
-import time
 import os
 import re
+import sys
+import signal
 from componentes_comunes import (
     LectorArchivos,
     LogManager,
     BaseDatos,
     SubprocesoManager,
     ConfiguracionManager,
+    MedidorTiempos,
+    MetricasEjecucion,
+    VigilanteDirectorio,
+    ProcesadorParalelo,
+    LedgerArchivos,
     RUTAS_CONFIG
 )
 
@@ -30,20 +36,6 @@ NOMBRE_BANCO = "Banco Bolivariano"
 # ==================== FUNCIONES DE BASE DE DATOS ====================
 
 
-def obtenerIDEjecucion():
-    """Obtiene el siguiente ID de ejecución de la BD"""
-    try:
-        sql = f"SELECT MAX(idAutomationRun) FROM {DATABASE_RUNS}"
-        resultado = BaseDatos.consultarBD(sql)
-        if resultado and resultado[0] and resultado[0][0]:
-            return resultado[0][0] + 1
-        return 1
-    except Exception as e:
-        LogManager.escribir_log(
-            "ERROR", f"Error obteniendo ID ejecución: {str(e)}")
-        return int(time.time())  # Fallback
-
-
 def datosEjecucion(sql):
     """Ejecuta una consulta en la BD"""
     try:
@@ -149,12 +141,47 @@ def leerArchivoTXT(ruta_archivo):
         return None
 
 
+def obtener_cuenta_archivo(ruta_archivo):
+    """Lee solo el número de cuenta del encabezado (línea 2) de un TXT"""
+    with open(ruta_archivo, 'r', encoding='utf-8') as file:
+        lineas = 0
+        for line in file:
+            if line.strip():
+                lineas += 1
+                if lineas == 2:
+                    columnas = line.strip().split('\t')
+                    return columnas[1].replace("'", "").strip() if len(columnas) > 1 else None
+    return None
+
+
+@MedidorTiempos.medido()
 def procesar_archivo(ruta_archivo, id_ejecucion):
-    """Procesa un archivo TXT de Banco Bolivariano"""
+    """
+    Procesa un archivo TXT de Banco Bolivariano
+
+    Returns:
+        dict: empresa, cuenta, archivo, insertados, omitidos; False si no se
+              insertó ningún registro
+    """
     try:
         LogManager.escribir_log(
             "INFO", f"Procesando archivo: {os.path.basename(ruta_archivo)}")
 
+        # Descartar sin leerlo un archivo idéntico a uno ya procesado
+        ledger = LedgerArchivos(NOMBRE_BANCO)
+        hash_archivo = LedgerArchivos.hash_archivo(ruta_archivo) if ledger.ruta else None
+        anterior = ledger.archivo_procesado(hash_archivo) if hash_archivo else None
+        if anterior:
+            LogManager.escribir_log(
+                "INFO", f"⏭️ Archivo idéntico a {anterior['nombre']} (procesado {anterior['fecha']}), se descarta")
+            MetricasEjecucion.incrementar("archivos_repetidos")
+            try:
+                os.remove(ruta_archivo)
+            except Exception as e:
+                LogManager.escribir_log(
+                    "WARNING", f"No se pudo eliminar el archivo: {str(e)}")
+            return False
+
         # Leer contenido del archivo
         contenido = leerArchivoTXT(ruta_archivo)
         if not contenido:
@@ -189,12 +216,27 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
         movimientos_procesados = 0
         movimientos_insertados = 0
         movimientos_omitidos = 0
+        movimientos_fallidos = 0  # Inserciones que fallaron (no son duplicados)
+
+        # Filas ya ingeridas en archivos anteriores de la misma cuenta
+        hashes_filas = {}
+        if ledger.ruta:
+            hashes_filas = {i: LedgerArchivos.hash_fila(*contenido[i])
+                            for i in range(7, len(contenido))}
+        filas_conocidas = ledger.filas_registradas(cuenta, hashes_filas.values())
+        filas_resueltas = []
+        filas_ledger = 0
 
         # Procesar movimientos (empiezan en línea 7, índice 6)
         for i in range(7, len(contenido)):
             try:
                 fila = contenido[i]
 
+                if hashes_filas.get(i) in filas_conocidas:
+                    movimientos_omitidos += 1
+                    filas_ledger += 1
+                    continue
+
                 # Verificar que la fila tenga suficientes columnas
                 if len(fila) < 10:
                     LogManager.escribir_log(
@@ -278,6 +320,8 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
                 resultado_check = BaseDatos.consultarBD(sql_check)
                 if resultado_check and resultado_check[0][0] > 0:
                     movimientos_omitidos += 1
+                    if i in hashes_filas:
+                        filas_resueltas.append(hashes_filas[i])
                     continue
 
                 # Limpiar strings para SQL
@@ -302,8 +346,10 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
 
                 if BaseDatos.ejecutarSQL(sql_insert):
                     movimientos_insertados += 1
+                    if i in hashes_filas:
+                        filas_resueltas.append(hashes_filas[i])
                 else:
-                    movimientos_omitidos += 1
+                    movimientos_fallidos += 1
 
                 movimientos_procesados += 1
 
@@ -313,6 +359,17 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
                 movimientos_omitidos += 1
                 continue
 
+        MetricasEjecucion.registrar_filas(
+            movimientos_procesados, movimientos_insertados, movimientos_omitidos + movimientos_fallidos)
+
+        if hash_archivo:
+            # Con inserciones fallidas el archivo queda 'parcial': si vuelve a
+            # llegar se reprocesa (las filas ya resueltas las filtra el registro)
+            ledger.registrar_filas(cuenta, filas_resueltas)
+            ledger.registrar_archivo(hash_archivo, ruta_archivo, len(contenido) - 7,
+                                     movimientos_insertados, movimientos_omitidos,
+                                     resultado="parcial" if movimientos_fallidos else "procesado")
+
         # Resumen del procesamiento
         LogManager.escribir_log("INFO", f"=== RESUMEN ARCHIVO ===")
         LogManager.escribir_log(
@@ -325,6 +382,12 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
             "INFO", f"✅ Registros insertados: {movimientos_insertados}")
         LogManager.escribir_log(
             "INFO", f"⏭️ Registros omitidos: {movimientos_omitidos}")
+        if movimientos_fallidos:
+            LogManager.escribir_log(
+                "WARNING", f"❌ Inserciones fallidas: {movimientos_fallidos}")
+        if filas_ledger:
+            LogManager.escribir_log(
+                "INFO", f"📒 Filas ya ingeridas en archivos anteriores: {filas_ledger}")
 
         # Eliminar archivo después de procesarlo
         try:
@@ -335,7 +398,17 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
             LogManager.escribir_log(
                 "WARNING", f"No se pudo eliminar el archivo: {str(e)}")
 
-        return movimientos_insertados > 0
+        if movimientos_insertados == 0:
+            return False
+
+        return {
+            "empresa": empresa,
+            "cuenta": cuenta,
+            "archivo": os.path.basename(ruta_archivo),
+            "insertados": movimientos_insertados,
+            "omitidos": movimientos_omitidos,
+            "fallidos": movimientos_fallidos
+        }
 
     except Exception as e:
         LogManager.escribir_log(
@@ -345,27 +418,30 @@ def procesar_archivo(ruta_archivo, id_ejecucion):
 # ==================== FUNCIÓN PRINCIPAL ====================
 
 
-def main():
-    """Función principal que procesa todos los archivos de Banco Bolivariano"""
+def main(archivos=None, workers=1):
+    """
+    Función principal que procesa todos los archivos de Banco Bolivariano
+
+    Args:
+        archivos: Rutas a procesar; por defecto todas las de la carpeta (obtenerArchivos)
+        workers: Procesos en paralelo (--workers N); los archivos de una
+                 misma cuenta se procesan siempre en orden
+    """
     id_ejecucion = None
 
     try:
-        # Obtener ID de ejecución
-        id_ejecucion = obtenerIDEjecucion()
+        # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+        id_ejecucion = BaseDatos.registrar_ejecucion(
+            DATABASE_RUNS, f"Procesamiento archivos-{NOMBRE_BANCO}")
 
         LogManager.iniciar_proceso(NOMBRE_BANCO, id_ejecucion, f"Procesamiento archivos TXT Bolivariano - ID: {id_ejecucion}")
 
-        # Registrar inicio en BD
-        sql_inicio = f"""
-            INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) 
-            VALUES ({id_ejecucion}, 'Procesamiento archivos-{NOMBRE_BANCO}', SYSDATETIME(), 'Running')
-        """
-        datosEjecucion(sql_inicio)
         escribirLog("Inicio del proceso", id_ejecucion,
                     "Information", "Inicio")
 
         # Obtener archivos para procesar
-        archivos = obtenerArchivos()
+        if archivos is None:
+            archivos = obtenerArchivos()
 
         if not archivos:
             LogManager.escribir_log(
@@ -385,17 +461,26 @@ def main():
                 NOMBRE_BANCO, exito=True, descripcion="No hay archivos para procesar")
             return True
 
-        # Procesar cada archivo
+        # Procesar cada archivo (en paralelo por cuenta con --workers)
         archivos_procesados = 0
         archivos_exitosos = 0
+        registros_insertados = 0
 
-        for archivo in archivos:
+        grupos = ProcesadorParalelo.agrupar(
+            archivos, obtener_cuenta_archivo) if workers > 1 else [archivos]
+
+        for archivo, resumen in ProcesadorParalelo.procesar(procesar_archivo, grupos, workers, id_ejecucion):
             try:
                 LogManager.escribir_log(
-                    "INFO", f"📁 Procesando archivo {archivos_procesados + 1} de {len(archivos)}")
+                    "INFO", f"📁 Archivo {archivos_procesados + 1} de {len(archivos)} procesado: {os.path.basename(archivo)}")
 
-                if procesar_archivo(archivo, id_ejecucion):
+                if resumen:
                     archivos_exitosos += 1
+                    registros_insertados += resumen['insertados']
+                    LogManager.escribir_log(
+                        "SUCCESS",
+                        f"Cuenta: {resumen['cuenta']} | Archivo: {resumen['archivo']} | Insertados: {resumen['insertados']} | Omitidos: {resumen['omitidos']}"
+                    )
                     escribirLog(f"Archivo procesado exitosamente: {os.path.basename(archivo)}",
                                 id_ejecucion, "Information", "Procesamiento")
                 else:
@@ -421,7 +506,7 @@ def main():
         datosEjecucion(sql_fin)
 
         # Mensaje final
-        mensaje_final = f"Procesamiento completado - {archivos_procesados} archivos procesados, {archivos_exitosos} exitosos"
+        mensaje_final = f"Procesamiento completado - {archivos_procesados} archivos procesados, {archivos_exitosos} exitosos, {registros_insertados} registros insertados"
         escribirLog(mensaje_final, id_ejecucion, "Information", "Fin")
 
         # Ejecutar BAT para subir movimientos al portal
@@ -454,9 +539,51 @@ def main():
         return False
 
 
-if __name__ == "__main__":
+def vigilar(workers=1):
+    """
+    Modo --vigilar: proceso permanente que ingiere cada TXT apenas termina
+    de copiarse en la carpeta de Bolivariano (una ejecución por archivo), en
+    lugar de esperar al siguiente turno de cron
+
+    Args:
+        workers: Procesos para los archivos acumulados al iniciar
+    """
+    vigilante = VigilanteDirectorio(RUTAS_CONFIG['bolivariano'], ('.txt',))
+    signal.signal(signal.SIGTERM, lambda signum, frame: vigilante.detener())
+    vigilante.iniciar()
+
+    # Archivos que ya estaban en la carpeta antes de empezar a vigilar
+    resultado = main(workers=workers)
     try:
-        resultado = main()
+        for ruta in vigilante.esperar_archivos():
+            LogManager.escribir_log(
+                "INFO", f"📥 Archivo recibido: {os.path.basename(ruta)}")
+            resultado = main(archivos=[ruta]) and resultado
+    except KeyboardInterrupt:
+        vigilante.detener()
+    LogManager.escribir_log("INFO", "Vigilancia de carpeta detenida")
+    return resultado
+
+
+# ==================== PUNTO DE ENTRADA ====================
+def ejecutar(argumentos=None):
+    """
+    Punto de entrada de línea de comandos (usado también por orquestador.py)
+
+    Args:
+        argumentos: Lista de argumentos al estilo sys.argv (por defecto sys.argv)
+
+    Returns:
+        int: Código de salida del proceso (0 = éxito)
+    """
+    argumentos = sys.argv if argumentos is None else argumentos
+    resultado = False
+    try:
+        workers = ProcesadorParalelo.leer_workers(argumentos)
+        if "--vigilar" in argumentos:
+            resultado = vigilar(workers=workers)
+        else:
+            resultado = main(workers=workers)
         if resultado:
             LogManager.escribir_log(
                 "SUCCESS", "=== PROCESAMIENTO COMPLETADO EXITOSAMENTE ===")
@@ -467,3 +594,8 @@ if __name__ == "__main__":
             "ERROR", f"Error crítico en ejecución: {str(e)}")
     finally:
         LogManager.escribir_log("INFO", "=== FIN DE EJECUCIÓN ===")
+    return 0 if resultado else 1
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
@@ -17,13 +17,11 @@ import os
 import sys
 import time
 import json
-import threading
 import re
 import email
 import email.utils
 import imaplib
 from datetime import datetime, date, timedelta, timezone
-from functools import wraps
 from email.header import decode_header
 from componentes_comunes import (
     PlaywrightManager,
@@ -35,6 +33,13 @@ from componentes_comunes import (
     SubprocesoManager,
     CorreoManager,
     ConfiguracionManager,
+    CheckpointManager,
+    TimeoutManager,
+    CancelacionPorTiempo,
+    MedidorTiempos,
+    MetricasEjecucion,
+    RegistroSelectores,
+    EspacioTrabajo,
     RUTAS_CONFIG,
     esperarConLoader,
     esperarConLoaderSimple,
@@ -42,77 +47,9 @@ from componentes_comunes import (
 
 
 # ==================== CONTEXTO DE TIMEOUT ====================
-class TimeoutManager:
-    """Maneja timeouts globales de manera automática"""
-
-    def __init__(self, timeout_seconds=600):
-        self.timeout_seconds = timeout_seconds
-        self.start_time = None
-        self.timer = None
-        self.is_timeout = False
-
-    def start(self):
-        """Inicia el timer de timeout"""
-        self.start_time = datetime.now()
-        self.is_timeout = False
-        LogManager.escribir_log(
-            "INFO", f"Timeout manager iniciado: {self.timeout_seconds//60} minutos")
-        # Configurar timer
-        self.timer = threading.Timer(
-            self.timeout_seconds, self._timeout_callback)
-        self.timer.daemon = True
-        self.timer.start()
-
-    def _timeout_callback(self):
-        """Callback que se ejecuta cuando se alcanza el timeout"""
-        self.is_timeout = True
-        tiempo_str = formatear_tiempo_ejecucion(
-            datetime.now() - self.start_time)
-        LogManager.escribir_log(
-            "ERROR", f"TIMEOUT GLOBAL ALCANZADO: {tiempo_str}")
-        # Forzar salida del programa
-        os._exit(1)
-
-    def check(self):
-        """Verifica si se ha alcanzado el timeout"""
-        if self.is_timeout:
-            tiempo_str = formatear_tiempo_ejecucion(
-                datetime.now() - self.start_time)
-            raise TimeoutError(
-                f"Proceso terminado por timeout global ({tiempo_str})")
-
-    def get_elapsed_time(self):
-        """Obtiene el tiempo transcurrido"""
-        if self.start_time:
-            return datetime.now() - self.start_time
-        return timedelta(0)
-
-    def stop(self):
-        """Detiene el timer"""
-        if self.timer:
-            self.timer.cancel()
-            self.timer = None
-
-
-# Instancia global del timeout manager
+# Instancia global del timeout manager (presupuestos por fase en componentes_comunes)
 timeout_manager = TimeoutManager(600)  # 10 minutos
-
-
-def with_timeout_check(func):
-    """Decorator que verifica timeout antes de ejecutar funciones críticas"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        timeout_manager.check()
-        return func(*args, **kwargs)
-    return wrapper
-
-
-def formatear_tiempo_ejecucion(tiempo_delta):
-    """Formatea un timedelta a string legible"""
-    total_seconds = int(tiempo_delta.total_seconds())
-    minutos = total_seconds // 60
-    segundos = total_seconds % 60
-    return f"{minutos}m {segundos}s"
+with_timeout_check = timeout_manager.verificar
 
 
 # ==================== CONFIGURACIÓN GLOBAL ====================
@@ -163,6 +100,10 @@ SELECTORES_BOTON_INGRESAR = [
     "//button[contains(@class,'cb-button__button--primary')]",
 ]
 
+# Historial de qué selector funcionó: el último bueno se prueba primero y los
+# que vienen fallando bajan al final (configBancos/selectores/Banco_Guayaquil.json)
+registro_selectores = RegistroSelectores(NOMBRE_BANCO)
+
 
 # ==================== HELPERS DE INTERACCIÓN ROBUSTA ====================
 def _guardar_captura(page, etiqueta):
@@ -225,6 +166,28 @@ def diagnosticar_formulario_login(page):
         return []
 
 
+# Espera de cada selector cuando la espera combinada ya terminó (la página está cargada)
+ESPERA_CANDIDATO_MS = 1000
+
+
+def _candidatos_con_espera(page, selectores, descripcion, timeout):
+    """
+    Ordena los candidatos por historial y los espera a todos juntos con
+    ComponenteInteraccion.esperarAlguno: el que apareció va primero. La espera
+    conjunta tiene el mismo presupuesto que antes sumaban las esperas por
+    selector (timeout × candidatos), pero termina apenas aparece uno.
+
+    Returns:
+        list: Selectores en el orden en que deben probarse
+    """
+    candidatos = registro_selectores.ordenar(descripcion, selectores)
+    encontrado = ComponenteInteraccion.esperarAlguno(
+        page, candidatos, timeout=timeout * len(candidatos), descripcion=descripcion)
+    if not encontrado:
+        return candidatos
+    return [encontrado] + [sel for sel in candidatos if sel != encontrado]
+
+
 def escribir_con_fallback(page, selectores, valor, descripcion,
                           timeout_por_selector=5000, tecla_a_tecla=False):
     """
@@ -233,11 +196,16 @@ def escribir_con_fallback(page, selectores, valor, descripcion,
 
     tecla_a_tecla=True usa press_sequentially, necesario cuando Angular no
     reacciona a fill() (raro, pero pasa con algunos componentes custom).
+
+    Los selectores se esperan juntos (_candidatos_con_espera) y se prueban en
+    el orden de registro_selectores (grupo = descripcion); cada resultado queda
+    registrado para la próxima ejecución.
     """
-    for sel in selectores:
+    for sel in _candidatos_con_espera(page, selectores, descripcion, timeout_por_selector):
+        inicio = time.perf_counter()
         try:
-            loc = page.locator(sel).first
-            loc.wait_for(state="visible", timeout=timeout_por_selector)
+            loc = page.locator(sel).locator("visible=true").first
+            loc.wait_for(state="visible", timeout=ESPERA_CANDIDATO_MS)
 
             loc.scroll_into_view_if_needed(timeout=2000)
             loc.click(timeout=3000)
@@ -253,6 +221,8 @@ def escribir_con_fallback(page, selectores, valor, descripcion,
 
             escrito = loc.input_value()
             if escrito == valor:
+                registro_selectores.registrar_exito(
+                    descripcion, sel, (time.perf_counter() - inicio) * 1000)
                 LogManager.escribir_log(
                     "SUCCESS", f"✅ '{descripcion}' escrito con selector: {sel}")
                 return True
@@ -262,6 +232,7 @@ def escribir_con_fallback(page, selectores, valor, descripcion,
                 f"Selector {sel} aceptó texto pero el valor no coincide "
                 f"(esperado {len(valor)} chars, quedó {len(escrito)}).")
         except Exception as e:
+            registro_selectores.registrar_fallo(descripcion, sel)
             LogManager.escribir_log(
                 "DEBUG", f"Selector '{sel}' no funcionó para {descripcion}: {str(e)}")
             continue
@@ -271,6 +242,7 @@ def escribir_con_fallback(page, selectores, valor, descripcion,
         LogManager.escribir_log(
             "WARNING",
             f"Reintentando '{descripcion}' con escritura tecla a tecla...")
+        MetricasEjecucion.incrementar("login_reintentos")
         return escribir_con_fallback(
             page, selectores, valor, descripcion,
             timeout_por_selector=timeout_por_selector, tecla_a_tecla=True)
@@ -281,21 +253,25 @@ def escribir_con_fallback(page, selectores, valor, descripcion,
 
 
 def click_con_fallback(page, selectores, descripcion, timeout_por_selector=5000):
-    """Intenta hacer clic probando cada selector hasta que uno funcione."""
-    for sel in selectores:
+    """Intenta hacer clic probando cada selector (espera combinada, orden de registro_selectores) hasta que uno funcione."""
+    for sel in _candidatos_con_espera(page, selectores, descripcion, timeout_por_selector):
+        inicio = time.perf_counter()
         try:
-            loc = page.locator(sel).first
-            loc.wait_for(state="visible", timeout=timeout_por_selector)
+            loc = page.locator(sel).locator("visible=true").first
+            loc.wait_for(state="visible", timeout=ESPERA_CANDIDATO_MS)
             if loc.is_disabled():
                 LogManager.escribir_log(
                     "DEBUG", f"Selector '{sel}' visible pero deshabilitado.")
                 continue
             loc.scroll_into_view_if_needed(timeout=2000)
             loc.click(timeout=5000)
+            registro_selectores.registrar_exito(
+                descripcion, sel, (time.perf_counter() - inicio) * 1000)
             LogManager.escribir_log(
                 "SUCCESS", f"✅ Clic en '{descripcion}' con selector: {sel}")
             return True
         except Exception as e:
+            registro_selectores.registrar_fallo(descripcion, sel)
             LogManager.escribir_log(
                 "DEBUG", f"Selector '{sel}' no funcionó para clic {descripcion}: {str(e)}")
             continue
@@ -329,20 +305,6 @@ def esperar_boton_ingresar_habilitado(page, timeout=15000):
 
 
 # ==================== FUNCIONES DE BASE DE DATOS ====================
-def obtenerIDEjecucion():
-    """Obtiene el siguiente ID de ejecución de la BD"""
-    try:
-        sql = f"SELECT MAX(idAutomationRun) FROM {DATABASE_RUNS}"
-        resultado = BaseDatos.consultarBD(sql)
-        if resultado and resultado[0] and resultado[0][0]:
-            return resultado[0][0] + 1
-        return 1
-    except Exception as e:
-        LogManager.escribir_log(
-            "ERROR", f"Error obteniendo ID ejecución: {str(e)}")
-        return int(time.time())  # Fallback
-
-
 def datosEjecucion(sql):
     """Ejecuta una consulta en la BD"""
     try:
@@ -381,6 +343,7 @@ def realizar_login_completo(page, timestamp_inicio=None):
         credenciales = credenciales[0]
         usuario = credenciales[1]
         password = credenciales[2]
+        PlaywrightManager.registrar_secreto(password)
 
         # Navegar a la página (sin esperar carga completa, solo que esté disponible)
         LogManager.escribir_log("INFO", "Navegando a página de login...")
@@ -390,16 +353,15 @@ def realizar_login_completo(page, timestamp_inicio=None):
         # Antes se esperaba "input[placeholder='Usuario'], input[id='password']".
         # Ese OR se cumplía con el input de password y el wait pasaba en falso,
         # aunque el campo de usuario nunca existiera con ese selector.
-        # Ahora esperamos EXPLÍCITAMENTE el campo de usuario.
+        # Ahora esperamos EXPLÍCITAMENTE el campo de usuario (cualquiera de sus
+        # selectores de respaldo, en una sola espera).
         LogManager.escribir_log(
             "INFO", "Esperando que el campo de usuario esté disponible...")
-        try:
-            page.wait_for_selector(
-                "app-cbanco-input#username input", timeout=25000, state="visible")
-        except Exception:
+        if not ComponenteInteraccion.esperarAlguno(
+                page, SELECTORES_USUARIO, timeout=25000, descripcion="campo de usuario"):
             LogManager.escribir_log(
                 "WARNING",
-                "No apareció 'app-cbanco-input#username input'. "
+                "No apareció ningún selector del campo de usuario. "
                 "Volcando estructura real del formulario...")
             diagnosticar_formulario_login(page)
             _guardar_captura(page, "login_sin_campo_usuario")
@@ -581,10 +543,11 @@ def realizar_login_completo(page, timestamp_inicio=None):
                 if timestamp_inicio:
                     LogManager.escribir_log(
                         "INFO", f"Usando timestamp de inicio del programa: {timestamp_inicio.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-                codigo = CorreoManager.obtener_codigo_correo(
-                    asunto=asunto_correo,
-                    timestamp_inicio=timestamp_inicio,
-                )
+                with timeout_manager.fase("otp"):
+                    codigo = CorreoManager.obtener_codigo_correo(
+                        asunto=asunto_correo,
+                        timestamp_inicio=timestamp_inicio,
+                    )
                 if codigo and re.fullmatch(r"^\d{6}$", codigo):
                     LogManager.escribir_log(
                         "SUCCESS", f"Código válido recibido: {codigo}")
@@ -831,12 +794,12 @@ def navegar_a_movimientos(page):
 
 # ==================== FUNCIONES DE CONSULTA ====================
 @with_timeout_check
-def obtener_y_procesar_movimientos(page, id_ejecucion):
+def obtener_y_procesar_movimientos(page, id_ejecucion, reanudar=False):
     """Obtiene y procesa los movimientos de todas las empresas disponibles"""
     try:
         LogManager.escribir_log("INFO", "Iniciando obtención de movimientos...")
         # Procesar múltiples empresas
-        return procesar_todas_las_empresas(page, id_ejecucion)
+        return procesar_todas_las_empresas(page, id_ejecucion, reanudar)
     except Exception as e:
         LogManager.escribir_log(
             "ERROR", f"Error obteniendo movimientos: {str(e)}")
@@ -946,15 +909,51 @@ def cerrar_modal_seguridad(page):
         return True
 
 
-def procesar_todas_las_empresas(page, id_ejecucion):
-    """Procesa todas las empresas disponibles en el dropdown"""
+def procesar_todas_las_empresas(page, id_ejecucion, reanudar=False):
+    """
+    Procesa todas las empresas disponibles en el dropdown
+
+    Las empresas ya completadas en la ventana actual (últimos 7 días, según el
+    checkpoint) se omiten; con reanudar=True solo se reintentan las fallidas.
+    """
     try:
         LogManager.escribir_log(
             "INFO", "Iniciando procesamiento de todas las empresas...")
-        empresas_objetivo = ["MAXXIMUNDO", "AUTOLLANTA"]
+        empresas_objetivo = [e for e in ["MAXXIMUNDO", "AUTOLLANTA"]
+                             if ConfiguracionManager.incluir_empresa(e)]
         nombres_empresas_procesadas = []
+        nombres_empresas_omitidas = []
+
+        # El portal consulta por defecto los últimos 7 días
+        hoy = date.today()
+        ventana = f"{(hoy - timedelta(days=7)).isoformat()}_{hoy.isoformat()}"
+        filtro_empresas = ConfiguracionManager.empresas_filtro()
+        if filtro_empresas:
+            # Trabajo de la cola por empresa: checkpoint propio
+            ventana = f"{ventana}_{'_'.join(filtro_empresas)}"
+        checkpoint = CheckpointManager(
+            NOMBRE_BANCO, ventana, solo_fallidos=reanudar)
 
         for empresa_objetivo in empresas_objetivo:
+            if not checkpoint.debe_procesar(empresa_objetivo):
+                LogManager.escribir_log(
+                    "INFO", f"⏭️ Empresa {empresa_objetivo} omitida por checkpoint (estado: {checkpoint.estado(empresa_objetivo) or 'sin procesar'})")
+                nombres_empresas_omitidas.append(empresa_objetivo)
+                continue
+
+            # Archivo descargado en una ejecución anterior pero no ingerido
+            ruta_pendiente = checkpoint.archivo_descargado(empresa_objetivo)
+            if ruta_pendiente:
+                LogManager.escribir_log(
+                    "INFO", f"📌 Reutilizando archivo ya descargado de {empresa_objetivo}: {ruta_pendiente}")
+                if procesar_archivo_excel(ruta_pendiente, id_ejecucion, empresa_objetivo):
+                    checkpoint.marcar(empresa_objetivo, "ingerido")
+                    nombres_empresas_procesadas.append(empresa_objetivo)
+                else:
+                    checkpoint.marcar(empresa_objetivo, "fallido")
+                continue
+
+            checkpoint.marcar(empresa_objetivo, "en_proceso")
             LogManager.escribir_log(
                 "INFO", f"=== PROCESANDO EMPRESA: {empresa_objetivo} ===")
             exito_empresa = False
@@ -975,20 +974,17 @@ def procesar_todas_las_empresas(page, id_ejecucion):
                         "//p-autocomplete//input",
                     ]
 
-                    selector_input = None
-                    for s in selectores_autocomplete:
-                        if page.locator(s).first.is_visible(timeout=3000):
-                            selector_input = s
-                            break
+                    selector_input = ComponenteInteraccion.esperarAlguno(
+                        page, selectores_autocomplete, timeout=3000, descripcion="selector de empresa")
 
                     if not selector_input:
                         LogManager.escribir_log(
                             "WARNING", "No se encontró el selector de empresa")
                         continue
 
-                    # Verificar si ya está seleccionada
-                    valor_actual = page.locator(
-                        selector_input).first.input_value().strip()
+                    # Verificar si ya está seleccionada (la coincidencia visible)
+                    input_empresa = page.locator(selector_input).locator("visible=true").first
+                    valor_actual = input_empresa.input_value().strip()
                     if empresa_objetivo.upper() in valor_actual.upper():
                         LogManager.escribir_log(
                             "SUCCESS", f"✅ Empresa '{empresa_objetivo}' ya está seleccionada")
@@ -997,7 +993,7 @@ def procesar_todas_las_empresas(page, id_ejecucion):
                         dropdown_abierto = False
                         # Clic en el botón dropdown
                         try:
-                            boton_dropdown = page.locator(selector_input).locator("..").locator(
+                            boton_dropdown = input_empresa.locator("..").locator(
                                 "//button[contains(@class, 'p-autocomplete-dropdown')]").first
                             if boton_dropdown.is_visible(timeout=2000):
                                 boton_dropdown.click(timeout=3000)
@@ -1006,7 +1002,7 @@ def procesar_todas_las_empresas(page, id_ejecucion):
                             pass
 
                         if not dropdown_abierto:
-                            page.locator(selector_input).first.click(timeout=3000)
+                            input_empresa.click(timeout=3000)
 
                         esperarConLoaderSimple(2, "Esperando opciones")
 
@@ -1035,7 +1031,7 @@ def procesar_todas_las_empresas(page, id_ejecucion):
                             3, "Esperando procesamiento de selección")
 
                     # 4. Procesar movimientos
-                    if procesar_movimientos_empresa(page, id_ejecucion, empresa_objetivo):
+                    if procesar_movimientos_empresa(page, id_ejecucion, empresa_objetivo, checkpoint):
                         nombres_empresas_procesadas.append(empresa_objetivo)
                         exito_empresa = True
                         LogManager.escribir_log(
@@ -1051,12 +1047,15 @@ def procesar_todas_las_empresas(page, id_ejecucion):
                     esperarConLoaderSimple(3, "Esperando para reintentar")
 
             if not exito_empresa:
+                checkpoint.marcar(empresa_objetivo, "fallido")
                 LogManager.escribir_log(
                     "ERROR", f"❌ No se pudo procesar la empresa {empresa_objetivo} después de todos los intentos")
 
+        checkpoint.finalizar(empresas_objetivo)
+
         LogManager.escribir_log(
-            "INFO", f"Procesamiento finalizado. Empresas procesadas: {nombres_empresas_procesadas}")
-        return len(nombres_empresas_procesadas) > 0
+            "INFO", f"Procesamiento finalizado. Empresas procesadas: {nombres_empresas_procesadas}, omitidas por checkpoint: {nombres_empresas_omitidas}")
+        return len(nombres_empresas_procesadas) + len(nombres_empresas_omitidas) > 0
 
     except Exception as e:
         LogManager.escribir_log(
@@ -1064,6 +1063,7 @@ def procesar_todas_las_empresas(page, id_ejecucion):
         return False
 
 
+@MedidorTiempos.medido()
 def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa):
     """Procesa el archivo Excel descargado usando la estructura del Banco Guayaquil"""
     try:
@@ -1298,6 +1298,9 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa):
                 LogManager.escribir_log(
                     "WARNING", f"Error procesando fila {i}: {str(e)}")
                 continue
+        MetricasEjecucion.registrar_filas(
+            filas_procesadas, movimientos_insertados, movimientos_omitidos)
+
         # Resumen final detallado
         LogManager.escribir_log("INFO", "=== RESUMEN PROCESAMIENTO ===")
         LogManager.escribir_log("INFO", f"🏢 Empresa: {empresa}")
@@ -1321,14 +1324,8 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa):
         else:
             LogManager.escribir_log(
                 "SUCCESS", f"✅ Procesamiento exitoso: No se encontraron registros nuevos para {empresa} (todos ya existen)")
-        # Eliminar archivo después de procesarlo
-        try:
-            os.remove(ruta_archivo)
-            LogManager.escribir_log(
-                "INFO", f"Archivo eliminado: {ruta_archivo}")
-        except Exception as e:
-            LogManager.escribir_log(
-                "WARNING", f"No se pudo eliminar archivo: {str(e)}")
+        # Eliminar archivo (o liberar la descarga en memoria) después de procesarlo
+        LectorArchivos.eliminar_procesado(ruta_archivo)
         return True
     except Exception as e:
         LogManager.escribir_log("ERROR", f"Error procesando Excel: {str(e)}")
@@ -1354,7 +1351,7 @@ def obtener_contador_fecha(cuenta, empresa, fecha):
         return 1
 
 
-def procesar_movimientos_empresa(page, id_ejecucion, nombre_empresa):
+def procesar_movimientos_empresa(page, id_ejecucion, nombre_empresa, checkpoint=None):
     """Procesa los movimientos de una empresa específica"""
     try:
         LogManager.escribir_log(
@@ -1378,22 +1375,33 @@ def procesar_movimientos_empresa(page, id_ejecucion, nombre_empresa):
             "//button[contains(@class, 'cb-button') and .//span[contains(text(), 'Exportar')]]",
         ]
 
+        # Una sola espera sobre todos los candidatos (con el presupuesto que
+        # sumaban las esperas por selector); se hace clic con el que apareció
+        # y, si falla, con los demás que estén en la página
         boton_exportar_clickeado = False
-        for selector_exportar in selectores_boton_exportar:
-            try:
-                LogManager.escribir_log(
-                    "INFO", f"Buscando botón 'Exportar' con selector: {selector_exportar}")
-                if ComponenteInteraccion.esperarElemento(page, selector_exportar, timeout=5000, descripcion="botón exportar"):
+        selector_exportar = ComponenteInteraccion.esperarAlguno(
+            page, selectores_boton_exportar, timeout=5000 * len(selectores_boton_exportar),
+            descripcion="botón exportar")
+        if selector_exportar:
+            LogManager.escribir_log(
+                "INFO", f"Botón 'Exportar' encontrado con selector: {selector_exportar}")
+            candidatos = [selector_exportar] + [
+                sel for sel in selectores_boton_exportar if sel != selector_exportar]
+            for selector in candidatos:
+                try:
+                    if page.locator(selector).locator("visible=true").count() == 0:
+                        continue
+                    # Solo la coincidencia visible (puede haber un duplicado oculto antes)
                     if ComponenteInteraccion.clickComponente(
-                            page, selector_exportar, descripcion="botón exportar", intentos=2, timeout=5000):
+                            page, f"{selector} >> visible=true", descripcion="botón exportar",
+                            intentos=2, timeout=5000):
                         LogManager.escribir_log(
                             "SUCCESS", "Botón 'Exportar' clickeado exitosamente")
                         boton_exportar_clickeado = True
                         break
-            except Exception as e:
-                LogManager.escribir_log(
-                    "DEBUG", f"Selector {selector_exportar} no funcionó: {str(e)}")
-                continue
+                except Exception as e:
+                    LogManager.escribir_log(
+                        "DEBUG", f"Selector {selector} no funcionó: {str(e)}")
 
         if not boton_exportar_clickeado:
             LogManager.escribir_log(
@@ -1405,23 +1413,39 @@ def procesar_movimientos_empresa(page, id_ejecucion, nombre_empresa):
 
         # Paso 3: Descargar archivo
         LogManager.escribir_log("INFO", "Descargando archivo...")
-        ruta_archivo = ComponenteInteraccion.esperarDescarga(
-            page,
-            "//button[.//span[contains(text(), 'Descargar')]]",
-            timeout=30000,
-            descripcion="botón descargar movimientos"
-        )
-        if not ruta_archivo:
+        with timeout_manager.fase(f"descarga:{nombre_empresa}"):
+            descarga = ComponenteInteraccion.esperarDescarga(
+                page,
+                "//button[.//span[contains(text(), 'Descargar')]]",
+                timeout=30000,
+                descripcion="botón descargar movimientos",
+                en_memoria=True
+            )
+        if not descarga:
             LogManager.escribir_log(
                 "ERROR", f"No se pudo descargar archivo para {nombre_empresa}")
             return False
 
-        # Paso 4: Procesar archivo descargado
-        if procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
+        if checkpoint:
+            if checkpoint.solo_fallidos:
+                # Con --resume se guarda en disco antes de ingerir: si la ejecución
+                # vuelve a cortarse, la siguiente reutiliza el archivo
+                LectorArchivos.conservar(descarga)
+            checkpoint.marcar(nombre_empresa, "descargado", ruta=descarga.ruta)
+
+        # Paso 4: Procesar archivo descargado (desde memoria)
+        with timeout_manager.fase(f"ingesta:{nombre_empresa}"):
+            procesado = procesar_archivo_excel(descarga, id_ejecucion, nombre_empresa)
+        if procesado:
+            if checkpoint:
+                checkpoint.marcar(nombre_empresa, "ingerido")
             LogManager.escribir_log(
                 "SUCCESS", f"Movimientos de {nombre_empresa} procesados exitosamente")
             return True
         else:
+            # Conservar el archivo en disco para revisión (si no se guardó ya)
+            if not descarga.ruta:
+                LectorArchivos.conservar(descarga)
             LogManager.escribir_log(
                 "ERROR", f"Error procesando archivo de {nombre_empresa}")
             return False
@@ -1498,7 +1522,7 @@ def test_solo_login():
         timestamp_inicio_programa = datetime.now(timezone.utc)
 
         manager = PlaywrightManager(
-            headless=False, download_path=RUTAS_CONFIG['descargas'])
+            headless=False, download_path=EspacioTrabajo.actual())
         playwright, browser, context, page = manager.iniciar_navegador()
 
         # Diagnóstico previo: mostrar el DOM real del formulario
@@ -1545,16 +1569,23 @@ def test_solo_login():
 
 # ==================== FUNCIÓN PRINCIPAL ====================
 @with_timeout_check
-def main():
-    """Función principal de automatización Banco Guayaquil"""
+def main(reanudar=False):
+    """
+    Función principal de automatización Banco Guayaquil
+
+    Args:
+        reanudar: Si True (--resume), solo reintenta las empresas fallidas
+            según el checkpoint de la ventana actual
+    """
     playwright = None
     browser = None
     context = None
     page = None
     id_ejecucion = None
     try:
-        # Obtener ID de ejecución
-        id_ejecucion = obtenerIDEjecucion()
+        # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+        id_ejecucion = BaseDatos.registrar_ejecucion(
+            DATABASE_RUNS, "Descarga comprobantes-Banco Guayaquil")
 
         # Guardar timestamp de inicio del programa (para buscar correos desde este momento)
         timestamp_inicio_programa = datetime.now(timezone.utc)
@@ -1564,29 +1595,27 @@ def main():
         LogManager.iniciar_proceso(
             NOMBRE_BANCO, id_ejecucion, f"Automatización Banco Guayaquil - ID: {id_ejecucion}")
         # Iniciar timeout manager
+        timeout_manager.configurar_ejecucion(DATABASE_RUNS, id_ejecucion)
         timeout_manager.start()
-        # Registrar inicio de ejecución
-        sql_inicio = f"""
-            INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) VALUES ({id_ejecucion}, 'Descarga comprobantes-Banco Guayaquil', SYSDATETIME(), 'Running')
-        """
-        datosEjecucion(sql_inicio)
         escribirLog("Proceso iniciado", id_ejecucion, "Information", "Inicio")
         # Inicializar Playwright
         LogManager.escribir_log("INFO", "Inicializando navegador...")
         manager = PlaywrightManager(
-            headless=False, download_path=RUTAS_CONFIG['descargas'])
+            headless=False, download_path=EspacioTrabajo.actual())
         playwright, browser, context, page = manager.iniciar_navegador()
         # Realizar login (pasar timestamp de inicio del programa)
-        if not realizar_login_completo(page, timestamp_inicio=timestamp_inicio_programa):
-            raise Exception("Login falló")
+        with timeout_manager.fase("login"):
+            if not realizar_login_completo(page, timestamp_inicio=timestamp_inicio_programa):
+                raise Exception("Login falló")
         escribirLog("Login exitoso", id_ejecucion, "Success", "Login")
         # Navegar a movimientos
-        if not navegar_a_movimientos(page):
-            raise Exception("Navegación a movimientos falló")
+        with timeout_manager.fase("navegacion"):
+            if not navegar_a_movimientos(page):
+                raise Exception("Navegación a movimientos falló")
         escribirLog("Navegación exitosa", id_ejecucion,
                     "Success", "Navegación")
         # Obtener y procesar movimientos
-        if not obtener_y_procesar_movimientos(page, id_ejecucion):
+        if not obtener_y_procesar_movimientos(page, id_ejecucion, reanudar):
             raise Exception("Procesamiento de movimientos falló")
         escribirLog("Movimientos procesados exitosamente",
                     id_ejecucion, "Success", "Procesamiento")
@@ -1671,15 +1700,36 @@ def main():
                 "WARNING", f"Error deteniendo playwright: {str(e)}")
 
 
-if __name__ == "__main__":
+# ==================== PUNTO DE ENTRADA ====================
+def ejecutar(argumentos=None):
+    """
+    Punto de entrada de línea de comandos (usado también por orquestador.py)
+
+    Args:
+        argumentos: Lista de argumentos al estilo sys.argv (por defecto sys.argv)
+
+    Returns:
+        int: Código de salida del proceso (0 = éxito)
+    """
+    argumentos = sys.argv if argumentos is None else argumentos
     try:
-        if "--solo-login" in sys.argv:
-            test_solo_login()
+        if "--solo-login" in argumentos:
+            exito = test_solo_login()
         else:
-            main()
+            exito = main(reanudar="--resume" in argumentos)
+        return 0 if exito else 1
+    except CancelacionPorTiempo as e:
+        LogManager.finalizar_proceso(NOMBRE_BANCO, False, f"Proceso cancelado: {str(e)}")
+        return 1
     except KeyboardInterrupt:
         LogManager.escribir_log("WARNING", "Proceso interrumpido por usuario")
+        return 1
     except Exception as e:
         LogManager.escribir_log("ERROR", f"Error no controlado: {str(e)}")
+        return 1
     finally:
-        LogManager.escribir_log("INFO", "Finalizando aplicación")
\ No newline at end of file
+        LogManager.escribir_log("INFO", "Finalizando aplicación")
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
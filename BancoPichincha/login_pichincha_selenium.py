@@ -30,7 +30,7 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 # Ajusta el import según dónde hayas dejado la carpeta token_web/
 from selenium_utils import cerrar_modales_bloqueantes
-from componentes_comunes import (LectorArchivos, 
+from componentes_comunes import (LectorArchivos, PantallaVirtual,
     RUTAS_CONFIG)
 import telegram_2fa
 
@@ -52,6 +52,9 @@ def crear_driver(headless=False, ruta_descargas=None):
 
     if headless:
         opciones.add_argument("--headless=new")
+    elif not PantallaVirtual.asegurar():
+        # Sin DISPLAY utilizable: Xvfb propio de esta ejecución
+        raise RuntimeError("No hay DISPLAY para Chrome con ventana")
 
     opciones.add_argument("--disable-blink-features=AutomationControlled")
     opciones.add_argument("--disable-dev-shm-usage")  # evita crashes de renderer por memoria compartida limitada
@@ -1,17 +1,20 @@
 # -*- coding: utf-8 -*-
 """
 BANCO PRODUBANCO - AUTOMATIZACIÓN COMPLETA OPTIMIZADA
+
+Uso:
+    python BancoProdubanco_Final.py                                    # ventana de configuraciones.csv
+    python BancoProdubanco_Final.py --resume                           # solo empresas fallidas
+    python BancoProdubanco_Final.py --backfill 01/09/2026 30/09/2026   # carga histórica por tramos
 """
 import os
 import sys
 import time
 import json
-import threading
 import re
 import subprocess
 import csv
 from datetime import datetime, date, timedelta, timezone
-from functools import wraps
 
 from componentes_comunes import (
     PlaywrightManager,
@@ -23,86 +26,24 @@ from componentes_comunes import (
     CorreoManager,
     ConfiguracionManager,
     SubprocesoManager,
+    CheckpointManager,
+    TimeoutManager,
+    CancelacionPorTiempo,
+    formatear_tiempo_ejecucion,
+    MedidorTiempos,
+    MetricasEjecucion,
+    NormalizadorMovimientos,
+    DescargaEnMemoria,
+    EspacioTrabajo,
     RUTAS_CONFIG
 )
 
 # ==================== CONTEXTO DE TIMEOUT ====================
+# Instancia global del timeout manager (presupuestos por fase en componentes_comunes)
+timeout_manager = TimeoutManager(900)  # 15 minutos
+with_timeout_check = timeout_manager.verificar
 
 
-class TimeoutManager:
-    """Maneja timeouts globales de manera automática"""
-
-    def __init__(self, timeout_seconds=300):
-        self.timeout_seconds = timeout_seconds
-        self.start_time = None
-        self.timer = None
-        self.is_timeout = False
-
-    def start(self):
-        """Inicia el timer de timeout"""
-        self.start_time = datetime.now()
-        self.is_timeout = False
-        LogManager.escribir_log(
-            "INFO", f"Timeout manager iniciado: {self.timeout_seconds//60} minutos")
-
-        # Configurar timer
-        self.timer = threading.Timer(
-            self.timeout_seconds, self._timeout_callback)
-        self.timer.daemon = True
-        self.timer.start()
-
-    def _timeout_callback(self):
-        """Callback que se ejecuta cuando se alcanza el timeout"""
-        self.is_timeout = True
-        tiempo_str = formatear_tiempo_ejecucion(
-            datetime.now() - self.start_time)
-        LogManager.escribir_log(
-            "ERROR", f"TIMEOUT GLOBAL ALCANZADO: {tiempo_str}")
-
-        # Forzar salida del programa
-        os._exit(1)
-
-    def check(self):
-        """Verifica si se ha alcanzado el timeout"""
-        if self.is_timeout:
-            tiempo_str = formatear_tiempo_ejecucion(
-                datetime.now() - self.start_time)
-            raise TimeoutError(
-                f"Proceso terminado por timeout global ({tiempo_str})")
-
-    def get_elapsed_time(self):
-        """Obtiene el tiempo transcurrido"""
-        if self.start_time:
-            return datetime.now() - self.start_time
-        return timedelta(0)
-
-    def stop(self):
-        """Detiene el timer"""
-        if self.timer:
-            self.timer.cancel()
-            self.timer = None
-
-
-# Instancia global del timeout manager
-timeout_manager = TimeoutManager(900)  # 5 minutos
-
-
-def with_timeout_check(func):
-    """Decorator que verifica timeout antes de ejecutar funciones críticas"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        timeout_manager.check()
-        return func(*args, **kwargs)
-    return wrapper
-
-
-def formatear_tiempo_ejecucion(tiempo_delta):
-    """Formatea un timedelta a string legible"""
-    total_seconds = int(tiempo_delta.total_seconds())
-    minutos = total_seconds // 60
-    segundos = total_seconds % 60
-    return f"{minutos}m {segundos}s"
-
 # ==================== CONFIGURACIÓN GLOBAL ====================
 
 # DATABASE = "RegistrosBancosPRUEBA"
@@ -120,24 +61,36 @@ URLS = {
 # Configuración específica de Produbanco
 CONFIG_PRODUBANCO = {
     'banco_codigo': "Produbanco",
-    'dias_consulta_default': 1
+    'dias_consulta_default': 1,
+    # El portal devuelve como máximo este número de movimientos por consulta
+    'registros_por_consulta': 300,
+    # Carga histórica por tramos (--backfill o ventana explícita)
+    'dias_tramo_inicial': 7,
+    'dias_tramo_maximo': 31,
+    'ocupacion_objetivo': 0.7,  # fracción del tope que se busca llenar con cada tramo
 }
 
-# ==================== FUNCIONES DE BASE DE DATOS ====================
-
+# Timeout global de una carga histórica lanzada con --backfill (segundos)
+TIMEOUT_HISTORICO = int(os.environ.get("RPA_BACKFILL_TIMEOUT", "14400"))
+
+# Estructura del Excel de movimientos (datos desde la fila 14) para NormalizadorMovimientos
+ESQUEMA_ARCHIVO_PRODUBANCO = {
+    'fila_inicio': 13,
+    'columnas': {
+        'fecha': 3, 'concepto': 7, 'signo': 8, 'valor': 10, 'saldo': 13,
+        'disponible': 14, 'oficina': 15, 'ref1': 18, 'ref2': 19,
+    },
+    'min_columnas': 16,
+    'requeridas': ('fecha', 'valor'),
+    'fechas': {
+        'fecha_sql': {'columna': 'fecha', 'recorte': 10,
+                      'formatos': ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y']},
+    },
+    'montos': ('valor', 'saldo', 'disponible'),
+    'tipo': {'columna': 'signo', 'valor': "(-)", 'si_coincide': "D", 'si_no': "C"},
+}
 
-def obtenerIDEjecucion():
-    """Obtiene el siguiente ID de ejecución de la BD"""
-    try:
-        sql = f"SELECT MAX(idAutomationRun) FROM {DATABASE_RUNS}"
-        resultado = BaseDatos.consultarBD(sql)
-        if resultado and resultado[0] and resultado[0][0]:
-            return resultado[0][0] + 1
-        return 1
-    except Exception as e:
-        LogManager.escribir_log(
-            "ERROR", f"Error obteniendo ID ejecución: {str(e)}")
-        return int(time.time())  # Fallback
+# ==================== FUNCIONES DE BASE DE DATOS ====================
 
 
 def datosEjecucion(sql):
@@ -296,6 +249,7 @@ def iniciar_sesion(page):
 
         usuario = credenciales_banco[0][1]
         password = credenciales_banco[0][2]
+        PlaywrightManager.registrar_secreto(password)
         LogManager.escribir_log(
             "INFO", f"Credenciales cargadas para usuario: {usuario}")
 
@@ -306,6 +260,8 @@ def iniciar_sesion(page):
             intento += 1
             LogManager.escribir_log(
                 "INFO", f"Intento de login {intento}/{max_intentos}")
+            if intento > 1:
+                MetricasEjecucion.incrementar("login_reintentos")
 
             # Escribir credenciales usando selectores proporcionados
             selector_usuario = "//input[@id='username']"
@@ -364,18 +320,19 @@ def iniciar_sesion(page):
 
 
 @with_timeout_check
-def obtener_y_procesar_movimientos(page, id_ejecucion):
+def obtener_y_procesar_movimientos(page, id_ejecucion, reanudar=False, historico=None):
     """Obtiene y procesa los movimientos de todas las cuentas disponibles"""
     try:
         LogManager.escribir_log(
             "INFO", "Iniciando obtención de movimientos...")
 
         # Navegar a movimientos
-        if not navegar_a_movimientos(page):
-            return False
+        with timeout_manager.fase("navegacion"):
+            if not navegar_a_movimientos(page):
+                return False
 
         # Procesar todas las cuentas
-        return obtener_y_seleccionar_empresas(page, id_ejecucion)
+        return obtener_y_seleccionar_empresas(page, id_ejecucion, reanudar, historico)
 
     except Exception as e:
         LogManager.escribir_log(
@@ -392,8 +349,15 @@ def obtener_y_procesar_movimientos(page, id_ejecucion):
 
 
 @with_timeout_check
-def obtener_y_seleccionar_empresas(page, id_ejecucion):
-    """Obtiene empresas disponibles y las procesa una por una (similar a Pichincha)"""
+def obtener_y_seleccionar_empresas(page, id_ejecucion, reanudar=False, historico=None):
+    """
+    Obtiene empresas disponibles y las procesa una por una (similar a Pichincha)
+
+    Las empresas ya completadas en la ventana de fechas actual (según el
+    checkpoint) se omiten; con reanudar=True solo se reintentan las fallidas.
+    Con historico=(desde, hasta) cada empresa se procesa por tramos
+    (procesar_empresa_por_tramos).
+    """
     try:
         LogManager.escribir_log("INFO", "Obteniendo y procesando empresas...")
 
@@ -420,6 +384,21 @@ def obtener_y_seleccionar_empresas(page, id_ejecucion):
             # XPath, usar sintaxis XPath para las opciones
             opciones_data = ComponenteInteraccion.obtener_opciones_select(page, selector_empresas, "select empresas")
             empresas_procesadas = 0
+            empresas_omitidas = 0
+            empresas_ventana = []
+
+            if historico:
+                fecha_desde, fecha_hasta = (fecha.strftime("%d/%m/%Y") for fecha in historico)
+                ventana = f"historico_{fecha_desde}_{fecha_hasta}"
+            else:
+                fecha_desde, fecha_hasta = obtener_fechas_consulta()
+                ventana = f"{fecha_desde}_{fecha_hasta}"
+            filtro_empresas = ConfiguracionManager.empresas_filtro()
+            if filtro_empresas:
+                # Trabajo de la cola por empresa: checkpoint propio
+                ventana = f"{ventana}_{'_'.join(filtro_empresas)}"
+            checkpoint = CheckpointManager(
+                NOMBRE_BANCO, ventana, solo_fallidos=reanudar)
 
             # Procesar cada empresa por índice
             for i, opcion_data in enumerate(opciones_data):
@@ -433,6 +412,34 @@ def obtener_y_seleccionar_empresas(page, id_ejecucion):
                             "DEBUG", f"Saltando opción vacía: '{texto_empresa}'")
                         continue
 
+                    if not ConfiguracionManager.incluir_empresa(texto_empresa):
+                        LogManager.escribir_log(
+                            "DEBUG", f"Empresa '{texto_empresa}' fuera del filtro RPA_EMPRESAS")
+                        continue
+
+                    empresas_ventana.append(texto_empresa)
+                    if not checkpoint.debe_procesar(texto_empresa):
+                        LogManager.escribir_log(
+                            "INFO", f"⏭️ Empresa '{texto_empresa}' omitida por checkpoint (estado: {checkpoint.estado(texto_empresa) or 'sin procesar'})")
+                        empresas_omitidas += 1
+                        continue
+
+                    # Archivo descargado en una ejecución anterior pero no ingerido
+                    ruta_pendiente = checkpoint.archivo_descargado(texto_empresa)
+                    if ruta_pendiente:
+                        LogManager.escribir_log(
+                            "INFO", f"📌 Reutilizando archivo ya descargado de {texto_empresa}: {ruta_pendiente}")
+                        if procesar_archivo_excel(ruta_pendiente, id_ejecucion, texto_empresa):
+                            checkpoint.marcar(texto_empresa, "ingerido")
+                            empresas_procesadas += 1
+                        else:
+                            checkpoint.marcar(texto_empresa, "fallido")
+                        continue
+
+                    if not historico:
+                        # En la carga histórica el estado lo lleva cada tramo (con su avance)
+                        checkpoint.marcar(texto_empresa, "en_proceso")
+
                     tiempo_transcurrido = formatear_tiempo_ejecucion(
                         timeout_manager.get_elapsed_time())
                     print("=" * 125)
@@ -445,7 +452,13 @@ def obtener_y_seleccionar_empresas(page, id_ejecucion):
                             "SUCCESS", f"Empresa seleccionada: {texto_empresa}")
 
                         # Procesar la empresa seleccionada
-                        if procesar_empresa_individual(page, texto_empresa, id_ejecucion):
+                        if historico:
+                            exito_empresa = procesar_empresa_por_tramos(
+                                page, texto_empresa, id_ejecucion, checkpoint, historico[0], historico[1])
+                        else:
+                            exito_empresa = procesar_empresa_individual(
+                                page, texto_empresa, id_ejecucion, checkpoint)
+                        if exito_empresa:
                             empresas_procesadas += 1
                             LogManager.escribir_log(
                                 "SUCCESS", f"Empresa {texto_empresa} procesada exitosamente")
@@ -453,6 +466,7 @@ def obtener_y_seleccionar_empresas(page, id_ejecucion):
                             LogManager.escribir_log(
                                 "ERROR", f"Error procesando empresa: {texto_empresa}")
                     else:
+                        checkpoint.marcar(texto_empresa, "fallido")
                         LogManager.escribir_log(
                             "ERROR", f"No se pudo seleccionar empresa: {texto_empresa}")
 
@@ -461,9 +475,11 @@ def obtener_y_seleccionar_empresas(page, id_ejecucion):
                     LogManager.escribir_log("ERROR", error_msg)
                     continue
 
+            checkpoint.finalizar(empresas_ventana)
+
             LogManager.escribir_log(
-                "SUCCESS", f"Procesadas {empresas_procesadas} empresas exitosamente")
-            return empresas_procesadas > 0
+                "SUCCESS", f"Procesadas {empresas_procesadas} empresas exitosamente ({empresas_omitidas} omitidas por checkpoint)")
+            return empresas_procesadas + empresas_omitidas > 0
 
         except Exception as e:
             LogManager.escribir_log(
@@ -486,48 +502,32 @@ def obtener_y_seleccionar_empresas(page, id_ejecucion):
 
 
 @with_timeout_check
-def procesar_empresa_individual(page, nombre_empresa, id_ejecucion):
+def procesar_empresa_individual(page, nombre_empresa, id_ejecucion, checkpoint=None):
     """Procesa una empresa individual después de haberla seleccionado"""
     try:
         LogManager.escribir_log(
             "INFO", f"Procesando empresa individual: {nombre_empresa}")
 
-        # PASO 1: Hacer clic en botón "Consultar" para desplegar formulario
-        selector_consultar = "//button[@data-ng-click='easyfiltros.preBtnProcesarClick(false)']"
-
-        ComponenteInteraccion.clickComponente(
-            page, selector_consultar, descripcion=f"botón consultar 1", intentos=1, timeout=3000)
-
-        # PASO 2: Configurar fechas de consulta
-        if not configurar_fechas_consulta(page):
-            LogManager.escribir_log(
-                "ERROR", "No se pudieron configurar las fechas de consulta")
+        # PASOS 1 a 4: Consultar la ventana de fechas y verificar que hay resultados
+        resultado = ejecutar_consulta(page, nombre_empresa)
+        if resultado is None:
             return False
 
-        # PASO 3: Hacer clic en botón "Consultar" para ejecutar consulta
-        selector_ejecutar = "//button[@data-ng-click='inicializarValoresBusquedaMasDatos(); ejecutarClick()']"
-
-        ComponenteInteraccion.clickComponente(
-            page, selector_ejecutar, descripcion=f"botón ejecutar consulta", intentos=1, timeout=3000)
-
-        # Aumentar tiempo de espera para que se procese la consulta
-        EsperasInteligentes.esperar_con_loader(10, f"Ejecutando consulta para {nombre_empresa}")
-
-        # PASO 4: Verificar que hay resultados y descargar Excel
-        selector_descarga = "//a[contains(@class, 'btn-xls') and contains(@data-ng-click, \"exportar('excel')\")]"
-
-        # Esperar que el botón de descarga aparezca con un timeout más generoso
-        if not ComponenteInteraccion.esperarElemento(page, selector_descarga, timeout=10000, descripcion=f"botón descargar"):
+        if not resultado:
             LogManager.escribir_log(
                 "WARNING", f"No se encontraron datos para descargar en empresa: {nombre_empresa}")
             # Actualizar fechas incluso cuando no hay datos, ya que es normal
             ConfiguracionManager.actualizar_configuraciones_fecha()
+            if checkpoint:
+                checkpoint.marcar(nombre_empresa, "sin_datos")
             return False
 
         # PASO 5: Descargar y procesar archivo
-        return descargar_y_procesar_archivo_empresa(page, nombre_empresa, id_ejecucion)
+        return descargar_y_procesar_archivo_empresa(page, nombre_empresa, id_ejecucion, checkpoint)
 
     except Exception as e:
+        if checkpoint:
+            checkpoint.marcar(nombre_empresa, "fallido")
         LogManager.escribir_log(
             "ERROR", f"Error procesando empresa individual {nombre_empresa}: {str(e)}")
         try:
@@ -541,27 +541,86 @@ def procesar_empresa_individual(page, nombre_empresa, id_ejecucion):
         return False
 
 
-def configurar_fechas_consulta(page):
-    """Configura las fechas de consulta y parámetros"""
-    try:
-        fecha_desde_config = ConfiguracionManager.leer_configuracion(
-            RUTAS_CONFIG['configuraciones'],
-            "Fecha desde"
-        )
-        fecha_hasta_config = ConfiguracionManager.leer_configuracion(
-            RUTAS_CONFIG['configuraciones'],
-            "Fecha hasta"
-        )
+def ejecutar_consulta(page, nombre_empresa, fecha_desde=None, fecha_hasta=None):
+    """
+    Ejecuta la consulta de movimientos de la empresa ya seleccionada
 
-        if not fecha_desde_config or not fecha_hasta_config:
-            # Usar fechas por defecto (ayer y hoy)
-            hoy = date.today()
-            ayer = hoy - timedelta(days=1)
-            fecha_desde = ayer.strftime("%d/%m/%Y")
-            fecha_hasta = hoy.strftime("%d/%m/%Y")
-        else:
-            fecha_desde = fecha_desde_config[1]
-            fecha_hasta = fecha_hasta_config[1]
+    Args:
+        fecha_desde, fecha_hasta: Ventana dd/mm/yyyy (por defecto obtener_fechas_consulta)
+
+    Returns:
+        bool: True si hay resultados para descargar, False si no hay datos,
+            None si no se pudo configurar la consulta
+    """
+    # PASO 1: Hacer clic en botón "Consultar" para desplegar formulario
+    selector_consultar = "//button[@data-ng-click='easyfiltros.preBtnProcesarClick(false)']"
+
+    ComponenteInteraccion.clickComponente(
+        page, selector_consultar, descripcion=f"botón consultar 1", intentos=1, timeout=3000)
+
+    # PASO 2: Configurar fechas de consulta
+    if not configurar_fechas_consulta(page, fecha_desde, fecha_hasta):
+        LogManager.escribir_log(
+            "ERROR", "No se pudieron configurar las fechas de consulta")
+        return None
+
+    # PASO 3: Hacer clic en botón "Consultar" para ejecutar consulta
+    selector_ejecutar = "//button[@data-ng-click='inicializarValoresBusquedaMasDatos(); ejecutarClick()']"
+
+    ComponenteInteraccion.clickComponente(
+        page, selector_ejecutar, descripcion=f"botón ejecutar consulta", intentos=1, timeout=3000)
+
+    # Aumentar tiempo de espera para que se procese la consulta
+    EsperasInteligentes.esperar_con_loader(10, f"Ejecutando consulta para {nombre_empresa}")
+
+    # PASO 4: Verificar que hay resultados (botón de descarga Excel)
+    selector_descarga = "//a[contains(@class, 'btn-xls') and contains(@data-ng-click, \"exportar('excel')\")]"
+
+    # Esperar que el botón de descarga aparezca con un timeout más generoso
+    return ComponenteInteraccion.esperarElemento(page, selector_descarga, timeout=10000, descripcion=f"botón descargar")
+
+
+def obtener_fechas_consulta():
+    """
+    Obtiene la ventana de fechas de consulta desde configuraciones.csv, salvo
+    que se indique una explícita (RPA_FECHA_DESDE / RPA_FECHA_HASTA)
+
+    Returns:
+        tuple: (fecha_desde, fecha_hasta) en formato dd/mm/yyyy (ayer y hoy por defecto)
+    """
+    ventana = ConfiguracionManager.ventana_fechas()
+    if ventana:
+        return ventana
+
+    fecha_desde_config = ConfiguracionManager.leer_configuracion(
+        RUTAS_CONFIG['configuraciones'],
+        "Fecha desde"
+    )
+    fecha_hasta_config = ConfiguracionManager.leer_configuracion(
+        RUTAS_CONFIG['configuraciones'],
+        "Fecha hasta"
+    )
+
+    if not fecha_desde_config or not fecha_hasta_config:
+        # Usar fechas por defecto (ayer y hoy)
+        hoy = date.today()
+        ayer = hoy - timedelta(days=1)
+        return ayer.strftime("%d/%m/%Y"), hoy.strftime("%d/%m/%Y")
+
+    return fecha_desde_config[1], fecha_hasta_config[1]
+
+
+def configurar_fechas_consulta(page, fecha_desde=None, fecha_hasta=None):
+    """
+    Configura las fechas de consulta y parámetros
+
+    Args:
+        fecha_desde, fecha_hasta: Ventana dd/mm/yyyy (por defecto obtener_fechas_consulta)
+    """
+    try:
+        if not fecha_desde or not fecha_hasta:
+            fecha_desde, fecha_hasta = obtener_fechas_consulta()
+        registros = CONFIG_PRODUBANCO['registros_por_consulta']
 
         LogManager.escribir_log(
             "INFO", f"Configurando fechas: {fecha_desde} - {fecha_hasta}")
@@ -578,14 +637,14 @@ def configurar_fechas_consulta(page):
         ComponenteInteraccion.escribirComponente(
             page, selector_fecha_hasta, fecha_hasta, descripcion=f"fecha hasta", intentos=1)
 
-        # Configurar número de registros (300)
+        # Configurar número de registros (tope del portal)
         selector_registros = "//input[@name='paginado']"
 
         ComponenteInteraccion.escribirComponente(
-            page, selector_registros, "300", descripcion=f"número de registros", intentos=1)
+            page, selector_registros, str(registros), descripcion=f"número de registros", intentos=1)
 
         LogManager.escribir_log(
-            "SUCCESS", f"Consulta configurada desde {fecha_desde} hasta {fecha_hasta} con 300 registros")
+            "SUCCESS", f"Consulta configurada desde {fecha_desde} hasta {fecha_hasta} con {registros} registros")
         return True
 
     except Exception as e:
@@ -594,10 +653,11 @@ def configurar_fechas_consulta(page):
         return False
 
 
-def descargar_archivo_produbanco(page, selector_boton, timeout=60000, adicional=""):
+def descargar_archivo_produbanco(page, selector_boton, timeout=60000, adicional="", en_memoria=False):
     """
     Descarga de forma robusta el archivo de movimientos de Produbanco
     esperando loaders y reintentando sin force=True para auto-esperar overlays.
+    Con en_memoria=True devuelve una DescargaEnMemoria en lugar de una ruta.
     """
     try:
         # Esperar presencia del elemento
@@ -631,7 +691,6 @@ def descargar_archivo_produbanco(page, selector_boton, timeout=60000, adicional=
                 page.locator(selector_boton).first.click(force=True)
             download = download_info.value
 
-        ruta_temporal = download.path()
         nombre_archivo = download.suggested_filename
         nombre = nombre_archivo.split('.')[0]
         extension = nombre_archivo.split('.')[-1]
@@ -639,7 +698,13 @@ def descargar_archivo_produbanco(page, selector_boton, timeout=60000, adicional=
         if adicional:
             nombre_archivo = f"{nombre}_{adicional}.{extension}"
 
-        ruta_descarga = os.path.join(RUTAS_CONFIG['descargas'], nombre_archivo)
+        if en_memoria:
+            descarga = DescargaEnMemoria.desde_descarga(download, nombre_archivo)
+            LogManager.escribir_log("SUCCESS", f"Descarga completada exitosamente: {descarga}")
+            return descarga
+
+        ruta_temporal = download.path()
+        ruta_descarga = os.path.join(EspacioTrabajo.actual(), nombre_archivo)
         download.save_as(ruta_descarga)
 
         # Eliminar temporal
@@ -666,71 +731,272 @@ def descargar_archivo_produbanco(page, selector_boton, timeout=60000, adicional=
         return None
 
 
-def descargar_y_procesar_archivo_empresa(page, nombre_empresa, id_ejecucion):
+def descargar_excel_empresa(page, nombre_empresa):
+    """
+    Descarga en memoria el Excel de la consulta actual, con un reintento
+
+    Returns:
+        DescargaEnMemoria: Archivo descargado, o None si falló
+    """
+    LogManager.escribir_log(
+        "INFO", f"Descargando archivo para empresa: {nombre_empresa}")
+
+    # Selectores para el botón de descarga
+    selector_descarga = "//a[contains(@class, 'btn-xls') and contains(@data-ng-click, \"exportar('excel')\")]"
+
+    # Generar adicional con fecha/hora y primeras letras de empresa
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    prefijo_empresa = nombre_empresa[:2].upper() if len(nombre_empresa) >= 2 else "XX"
+    adicional_nombre = f"{prefijo_empresa}_{timestamp}"
+
+    # Lógica de reintento para la descarga (en memoria: solo se escribe a disco si falla la ingesta)
+    descarga = None
+    for intento in range(2):
+        if intento > 0:
+            LogManager.escribir_log("WARNING", f"Reintentando descarga para {nombre_empresa} (intento {intento + 1})")
+            page.wait_for_timeout(3000)
+            # Intentar forzar la visibilidad por si acaso
+            try:
+                page.locator(selector_descarga).scroll_into_view_if_needed()
+            except:
+                pass
+
+        descarga = descargar_archivo_produbanco(
+            page,
+            selector_descarga,
+            timeout=60000,
+            adicional=adicional_nombre,
+            en_memoria=True
+        )
+
+        if descarga:
+            break
+
+    return descarga
+
+
+def descargar_y_procesar_archivo_empresa(page, nombre_empresa, id_ejecucion, checkpoint=None):
     """Descarga el archivo Excel de la empresa y lo procesa"""
     try:
-        LogManager.escribir_log(
-            "INFO", f"Descargando archivo para empresa: {nombre_empresa}")
-
-        # Selectores para el botón de descarga
-        selector_descarga = "//a[contains(@class, 'btn-xls') and contains(@data-ng-click, \"exportar('excel')\")]"
-
-        # Generar adicional con fecha/hora y primeras letras de empresa
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        prefijo_empresa = nombre_empresa[:2].upper() if len(nombre_empresa) >= 2 else "XX"
-        adicional_nombre = f"{prefijo_empresa}_{timestamp}"
-
-        # Lógica de reintento para la descarga
-        ruta_archivo = None
-        for intento in range(2):
-            if intento > 0:
-                LogManager.escribir_log("WARNING", f"Reintentando descarga para {nombre_empresa} (intento {intento + 1})")
-                page.wait_for_timeout(3000)
-                # Intentar forzar la visibilidad por si acaso
-                try:
-                    page.locator(selector_descarga).scroll_into_view_if_needed()
-                except:
-                    pass
-
-            ruta_archivo = descargar_archivo_produbanco(
-                page,
-                selector_descarga,
-                timeout=60000,
-                adicional=adicional_nombre
-            )
-            
-            if ruta_archivo:
-                break
+        with timeout_manager.fase(f"descarga:{nombre_empresa}"):
+            descarga = descargar_excel_empresa(page, nombre_empresa)
 
-        if not ruta_archivo:
+        if not descarga:
+            if checkpoint:
+                checkpoint.marcar(nombre_empresa, "fallido")
             LogManager.escribir_log(
                 "ERROR", f"No se pudo descargar archivo para empresa: {nombre_empresa} tras varios intentos")
             return False
 
+        if checkpoint:
+            if checkpoint.solo_fallidos:
+                # Con --resume se guarda en disco antes de ingerir: si la ejecución
+                # vuelve a cortarse, la siguiente reutiliza el archivo
+                LectorArchivos.conservar(descarga)
+            checkpoint.marcar(nombre_empresa, "descargado", ruta=descarga.ruta)
+
         # Procesar archivo descargado usando la función existente
-        if not procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
+        with timeout_manager.fase(f"ingesta:{nombre_empresa}"):
+            procesado = procesar_archivo_excel(descarga, id_ejecucion, nombre_empresa)
+        if not procesado:
+            # Conservar el archivo en disco para revisión (si no se guardó ya)
+            ruta_fallida = descarga.ruta or LectorArchivos.conservar(descarga)
+            if checkpoint:
+                checkpoint.marcar(nombre_empresa, "fallido", ruta=ruta_fallida)
             LogManager.escribir_log(
                 "ERROR", f"Error procesando archivo de empresa: {nombre_empresa}")
             return False
 
+        if checkpoint:
+            checkpoint.marcar(nombre_empresa, "ingerido")
         return True
 
     except Exception as e:
+        if checkpoint:
+            checkpoint.marcar(nombre_empresa, "fallido")
         LogManager.escribir_log(
             "ERROR", f"Error descargando archivo para empresa {nombre_empresa}: {str(e)}")
         return False
 
+# ==================== CARGA HISTÓRICA POR TRAMOS ====================
+
+
+def leer_rango_historico(argumentos):
+    """
+    Lee `--backfill DESDE HASTA` (dd/mm/yyyy) de la línea de comandos
+
+    Returns:
+        tuple: (desde, hasta) como date, o None si no se indicó
+
+    Raises:
+        ValueError: Si faltan las fechas, no son válidas o el rango está invertido
+    """
+    if "--backfill" not in argumentos:
+        return None
+    posicion = argumentos.index("--backfill")
+    if len(argumentos) < posicion + 3:
+        raise ValueError("Uso: --backfill DESDE HASTA (dd/mm/yyyy)")
+    desde, hasta = (datetime.strptime(texto.strip(), "%d/%m/%Y").date()
+                    for texto in argumentos[posicion + 1:posicion + 3])
+    if desde > hasta:
+        raise ValueError(f"Rango invertido: {desde:%d/%m/%Y} > {hasta:%d/%m/%Y}")
+    return desde, hasta
+
+
+def contar_movimientos(contenido):
+    """Filas de movimientos con fecha en el Excel (desde la fila 14)"""
+    columna = ESQUEMA_ARCHIVO_PRODUBANCO['columnas']['fecha']
+    return sum(1 for fila in contenido[ESQUEMA_ARCHIVO_PRODUBANCO['fila_inicio']:]
+               if len(fila) > columna and str(fila[columna]).strip())
+
+
+def dias_siguiente_tramo(dias, filas):
+    """
+    Estima cuántos días caben en el siguiente tramo según la densidad del anterior
+    (como mucho el doble del anterior, para no saltar sobre días muy cargados)
+
+    Args:
+        dias: Días del tramo recién procesado
+        filas: Movimientos que devolvió
+
+    Returns:
+        int: Días del siguiente tramo (entre 1 y dias_tramo_maximo)
+    """
+    maximo = min(dias * 2, CONFIG_PRODUBANCO['dias_tramo_maximo'])
+    if filas <= 0:
+        return maximo
+    objetivo = CONFIG_PRODUBANCO['registros_por_consulta'] * CONFIG_PRODUBANCO['ocupacion_objetivo']
+    return max(1, min(int(dias * objetivo / filas), maximo))
+
+
+@with_timeout_check
+def procesar_empresa_por_tramos(page, nombre_empresa, id_ejecucion, checkpoint, desde, hasta):
+    """
+    Carga histórica de una empresa: recorre [desde, hasta] en tramos que
+    quedan bajo el tope de registros_por_consulta filas por consulta
+
+    - Un tramo que llega al tope puede venir truncado: se descarta y se divide
+      a la mitad. Si un solo día llega al tope se ingiere con advertencia.
+    - El tamaño de cada tramo se estima con la densidad del anterior.
+    - Los tramos no se solapan y procesar_archivo_excel omite los documentos
+      que ya están en la BD, así que los bordes no duplican movimientos.
+    - El último día ingerido queda en el checkpoint ('avance'): una nueva
+      ejecución con el mismo rango continúa desde el día siguiente.
+
+    Args:
+        desde, hasta: Rango a cargar (date)
+
+    Returns:
+        bool: True si se cargó el rango completo
+    """
+    tope = CONFIG_PRODUBANCO['registros_por_consulta']
+    avance = checkpoint.empresas.get(nombre_empresa, {}).get("avance")
+    inicio = desde
+    if avance:
+        inicio = max(desde, datetime.strptime(avance, "%d/%m/%Y").date() + timedelta(days=1))
+        LogManager.escribir_log(
+            "INFO", f"📌 {nombre_empresa}: continuando carga histórica desde {inicio:%d/%m/%Y}")
+
+    dias = CONFIG_PRODUBANCO['dias_tramo_inicial']
+    tramos = 0
+    total_filas = 0
+
+    try:
+        while inicio <= hasta:
+            fin = min(hasta, inicio + timedelta(days=dias - 1))
+            dias_tramo = (fin - inicio).days + 1
+            texto_desde, texto_hasta = inicio.strftime("%d/%m/%Y"), fin.strftime("%d/%m/%Y")
+            checkpoint.marcar(nombre_empresa, "en_proceso", avance=avance, tramo=f"{texto_desde}-{texto_hasta}")
+
+            descarga = None
+            with timeout_manager.fase(f"descarga:{nombre_empresa}"):
+                resultado = ejecutar_consulta(page, nombre_empresa, texto_desde, texto_hasta)
+                if resultado is None:
+                    checkpoint.marcar(nombre_empresa, "fallido", avance=avance)
+                    return False
+                if resultado:
+                    descarga = descargar_excel_empresa(page, nombre_empresa)
+                    if not descarga:
+                        checkpoint.marcar(nombre_empresa, "fallido", avance=avance)
+                        LogManager.escribir_log(
+                            "ERROR", f"No se pudo descargar el tramo {texto_desde} - {texto_hasta} de {nombre_empresa}")
+                        return False
+
+            contenido = LectorArchivos.leerExcel(descarga) if descarga else []
+            if contenido is None:
+                ruta_fallida = LectorArchivos.conservar(descarga)
+                checkpoint.marcar(nombre_empresa, "fallido", avance=avance, ruta=ruta_fallida)
+                LogManager.escribir_log(
+                    "ERROR", f"No se pudo leer el tramo {texto_desde} - {texto_hasta} de {nombre_empresa}")
+                return False
+            filas = contar_movimientos(contenido)
+
+            if filas >= tope and dias_tramo > 1:
+                # Posible truncado: repetir la consulta con la mitad de días
+                LectorArchivos.eliminar_procesado(descarga)
+                dias = dias_tramo // 2
+                LogManager.escribir_log(
+                    "WARNING", f"✂️ Tramo {texto_desde} - {texto_hasta} con {filas} filas (tope {tope}), se divide en tramos de {dias} días")
+                continue
+
+            if filas >= tope:
+                LogManager.escribir_log(
+                    "WARNING", f"⚠️ El día {texto_desde} tiene {filas} filas (tope {tope}): pueden faltar movimientos de ese día")
+
+            if filas:
+                with timeout_manager.fase(f"ingesta:{nombre_empresa}"):
+                    procesado = procesar_archivo_excel(descarga, id_ejecucion, nombre_empresa, contenido=contenido)
+                if not procesado:
+                    ruta_fallida = LectorArchivos.conservar(descarga)
+                    checkpoint.marcar(nombre_empresa, "fallido", avance=avance, ruta=ruta_fallida)
+                    LogManager.escribir_log(
+                        "ERROR", f"Error procesando el tramo {texto_desde} - {texto_hasta} de {nombre_empresa}")
+                    return False
+            else:
+                if descarga:
+                    LectorArchivos.eliminar_procesado(descarga)
+                LogManager.escribir_log(
+                    "INFO", f"Tramo {texto_desde} - {texto_hasta} sin movimientos")
+
+            tramos += 1
+            total_filas += filas
+            avance = texto_hasta
+            LogManager.escribir_log(
+                "SUCCESS", f"📆 Tramo {tramos} de {nombre_empresa}: {texto_desde} - {texto_hasta} ({dias_tramo} días, {filas} filas)")
+
+            dias = dias_siguiente_tramo(dias_tramo, filas)
+            inicio = fin + timedelta(days=1)
+
+        checkpoint.marcar(nombre_empresa, "ingerido", avance=avance)
+        LogManager.escribir_log(
+            "SUCCESS", f"✅ Carga histórica de {nombre_empresa} completa: {tramos} tramos, {total_filas} filas")
+        return True
+
+    except Exception as e:
+        checkpoint.marcar(nombre_empresa, "fallido", avance=avance)
+        LogManager.escribir_log(
+            "ERROR", f"Error en carga histórica de {nombre_empresa}: {str(e)}")
+        return False
+
 # ==================== FUNCIONES DE PROCESAMIENTO DE ARCHIVOS ====================
 
 
-def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
-    """Procesa el archivo Excel descargado de Produbanco"""
+@MedidorTiempos.medido()
+def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa, contenido=None):
+    """
+    Procesa el archivo Excel descargado de Produbanco
+
+    Args:
+        contenido: Filas ya leídas del archivo (la carga histórica lo lee antes
+            para contar movimientos); si es None se lee aquí
+    """
     try:
         LogManager.escribir_log(
             "INFO", f"Procesando archivo Excel: {ruta_archivo}")
 
         # Leer el archivo Excel usando componentes comunes
-        contenido = LectorArchivos.leerExcel(ruta_archivo)
+        if contenido is None:
+            contenido = LectorArchivos.leerExcel(ruta_archivo)
         if contenido is None:
             LogManager.escribir_log(
                 "ERROR", f"No se pudo leer el archivo: {ruta_archivo}")
@@ -763,37 +1029,23 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
                 "WARNING", "No se pudo extraer número de cuenta")
             cuenta = "SIN_CUENTA"
 
-        # Obtener rango de fechas del archivo para la consulta previa
-        fechas_archivo = []
+        # Normalizar las filas de movimientos (fila 14 en adelante) en columnas tipadas
+        movimientos = NormalizadorMovimientos.normalizar(contenido, ESQUEMA_ARCHIVO_PRODUBANCO)
 
-        # Los datos empiezan en la fila 14 (índice 13)
-        for i in range(13, len(contenido)):
-            fila = contenido[i]
-            if fila and len(fila) > 0 and fila[3]:
-                # Solo los primeros 10 caracteres (fecha)
-                fecha_str = str(fila[3])[:10]
-                if fecha_str and fecha_str not in fechas_archivo:
-                    fechas_archivo.append(fecha_str)
-
-        if not fechas_archivo:
+        # Rango de fechas del archivo para la consulta previa
+        fechas_convertidas = movimientos["fecha_sql"].dropna()
+        if not (movimientos["fecha"] != "").any():
             LogManager.escribir_log(
                 "WARNING", "No se encontraron fechas válidas en el archivo")
             return False
 
-        # Convertir fechas y obtener rango
-        fechas_convertidas = []
-        for fecha_str in fechas_archivo:
-            fecha_sql = convertir_fecha_sql(fecha_str)
-            if fecha_sql:
-                fechas_convertidas.append(fecha_sql)
-
-        if not fechas_convertidas:
+        if fechas_convertidas.empty:
             LogManager.escribir_log(
                 "WARNING", "No se pudieron convertir las fechas")
             return False
 
-        fecha_min = min(fechas_convertidas)
-        fecha_max = max(fechas_convertidas)
+        fecha_min = fechas_convertidas.min()
+        fecha_max = fechas_convertidas.max()
         LogManager.escribir_log(
             "INFO", f"📅 Rango de fechas: {fecha_min} a {fecha_max}")
 
@@ -826,71 +1078,35 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
         LogManager.escribir_log(
             "INFO", f"📋 Se encontraron {len(combinaciones_existentes)} combinaciones existentes")
 
+        # Número de documento: empresa + fecha/hora + saldo + largo de referencias + referencia 2
+        # (map(str) y no astype(str): astype redondea los float y el número cambiaría)
+        prefijo_empresa = empresa_final[:2] if len(empresa_final) >= 2 else "XX"
+        fecha_codigo = movimientos["fecha"].str.replace(r"[-: ]", "", regex=True)
+        movimientos["num_documento"] = (
+            prefijo_empresa + fecha_codigo + movimientos["saldo"].map(str)
+            + movimientos["ref1"].str.len().astype(str) + movimientos["ref2"].str.len().astype(str)
+            + "-n | " + movimientos["ref2"])
+
         # Procesar movimientos del archivo
         movimientos_insertados = 0
         movimientos_omitidos = 0
-        filas_procesadas = 0
         documentos_procesados_en_memoria = set()
 
-        for i in range(13, len(contenido)):  # Empezar desde fila 14 (índice 13)
-            fila = contenido[i]
-
-            if not fila or len(fila) < 16:  # Asegurar que hay suficientes columnas
-                continue
-
-            # Extraer datos básicos según el formato de Produbanco
-            fecha_str = str(fila[3]) if fila[3] else ""
-            concepto = str(fila[7]) if fila[7] else ""
-            signo = str(fila[8]) if fila[8] else ""
-            valor_str = str(fila[10]) if fila[10] else ""
-            saldo_str = str(fila[13]) if fila[13] else ""
-            disponible_str = str(fila[14]) if fila[14] else ""
-            oficina = str(fila[15]) if fila[15] else ""
-
-            ref1 = str(fila[18]) if len(fila) > 8 and fila[18] else ""  # Referencia 1
-            ref2 = str(fila[19]) if len(fila) > 9 and fila[19] else ""  # Referencia 2
-
-            if not fecha_str or not valor_str:
-                continue
-
-            filas_procesadas += 1
+        completos = movimientos[movimientos["_completa"]]
+        filas_procesadas = len(completos)
 
+        for registro in NormalizadorMovimientos.filas(completos):
             try:
-                # Convertir fecha (solo la parte de fecha)
-                fecha_solo = fecha_str[:10]  # YYYY-MM-DD
-                fecha_convertida = convertir_fecha_sql(fecha_solo)
+                fecha_convertida = registro["fecha_sql"]
                 if not fecha_convertida:
-                    LogManager.escribir_log("WARNING", f"Fecha inválida en fila {i+1}: {fecha_str}")
+                    LogManager.escribir_log("WARNING", f"Fecha inválida en fila {registro['fila']+1}: {registro['fecha']}")
                     continue
 
                 # Filtrar por fecha (solo registros posteriores a 2024-02-28)
-                if datetime.strptime(fecha_convertida, "%Y-%m-%d") <= datetime.strptime("2024-02-28", "%Y-%m-%d"):
+                if fecha_convertida <= "2024-02-28":
                     continue
 
-                # Determinar tipo basado en el signo
-                tipo_trx = "D" if signo == "(-)" else "C"
-
-                # Limpiar valores monetarios
-                valor = limpiar_valor_monetario(valor_str)
-                saldo = limpiar_valor_monetario(saldo_str)
-                disponible = limpiar_valor_monetario(disponible_str)
-
-                 # Generar número de documento
-                prefijo_empresa = empresa_final[:2] if len(empresa_final) >= 2 else "XX"
-                fecha_codigo = fecha_str.replace(
-                    "-", "").replace(":", "").replace(" ", "")
-                saldo_codigo = str(saldo).replace(
-                    '$', '').replace(',', '').replace(' ', '')
-                # valor_codigo = str(valor).replace(
-                #     '$', '').replace(',', '').replace(' ', '')
-                len_referencia = str(len(ref1))
-                len_descripcion = str(len(ref2))
-
-                # fecha_codigo_aux = fecha_solo.replace("-", "").replace(":", "").replace(" ", "")
-
-                # num_documento_baseAux = f"{prefijo_empresa}{fecha_codigo_aux}{valor_codigo}{len_referencia}{len_descripcion}-n | {ref2}"
-                
-                num_documento_base = f"{prefijo_empresa}{fecha_codigo}{saldo_codigo}{len_referencia}{len_descripcion}-n | {ref2}"
+                num_documento_base = registro["num_documento"]
 
                 # Verificar si el documento ya existe en BD o en memoria
                 if num_documento_base in documentos_existentes_en_bd or num_documento_base in documentos_procesados_en_memoria:
@@ -904,7 +1120,7 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
                     cuenta, empresa_final, fecha_convertida)
                 
                 # Preparar descripción completa
-                descripcion_completa = concepto.replace("'", "''")
+                descripcion_completa = registro["concepto"].replace("'", "''")
 
                 # Insertar en base de datos
                 sql_insert = f"""
@@ -913,8 +1129,8 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
                      tipo, valor, saldoContable, disponible, oficina, referencia, contFecha, conceptoTransaccion)
                     VALUES ('{cuenta}', '{CONFIG_PRODUBANCO['banco_codigo']}', '{empresa_final.replace("'", "''")}', 
                             '{num_documento_base}', {id_ejecucion}, '{fecha_convertida}', 
-                            '{tipo_trx}', {valor}, {saldo}, {disponible}, '{oficina.replace("'", "''")}', 
-                            '{ref1.replace("'", "''")}', {cont_fecha}, '{descripcion_completa.replace("'", "''")}')
+                            '{registro["tipo"]}', {registro["valor"]}, {registro["saldo"]}, {registro["disponible"]}, '{registro["oficina"].replace("'", "''")}', 
+                            '{registro["ref1"].replace("'", "''")}', {cont_fecha}, '{descripcion_completa.replace("'", "''")}')
                 """
 
                 if datosEjecucion(sql_insert):
@@ -926,9 +1142,12 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
 
             except Exception as e:
                 LogManager.escribir_log(
-                    "ERROR", f"Error procesando fila {i+1}: {str(e)}")
+                    "ERROR", f"Error procesando fila {registro['fila']+1}: {str(e)}")
                 continue
 
+        MetricasEjecucion.registrar_filas(
+            filas_procesadas, movimientos_insertados, movimientos_omitidos)
+
         # Resumen final
         LogManager.escribir_log("INFO", f"=== RESUMEN PROCESAMIENTO ===")
         LogManager.escribir_log("INFO", f"🏢 Empresa: {empresa_final}")
@@ -949,14 +1168,8 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, nombre_empresa):
             LogManager.escribir_log(
                 "SUCCESS", f"✅ Procesamiento exitoso: No se encontraron registros nuevos")
 
-        # Eliminar archivo después de procesarlo
-        try:
-            os.remove(ruta_archivo)
-            LogManager.escribir_log(
-                "INFO", f"Archivo eliminado: {ruta_archivo}")
-        except Exception as e:
-            LogManager.escribir_log(
-                "WARNING", f"No se pudo eliminar archivo: {str(e)}")
+        # Eliminar archivo (o liberar la descarga en memoria) después de procesarlo
+        LectorArchivos.eliminar_procesado(ruta_archivo)
 
         return True
 
@@ -1006,84 +1219,49 @@ def asegurar_numero_unico(num_documento_base, documentos_bd, documentos_memoria)
             "ERROR", f"Error asegurando número único: {str(e)}")
         return f"{num_documento_base}_{int(time.time())}"
 
-# ==================== FUNCIONES AUXILIARES ====================
-
-
-def convertir_fecha_sql(fecha_str):
-    """Convierte string de fecha a formato SQL Server"""
-    try:
-        if not fecha_str:
-            return None
-
-        # Intentar diferentes formatos de fecha
-        formatos = ['%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y']
-
-        for formato in formatos:
-            try:
-                fecha_obj = datetime.strptime(fecha_str, formato)
-                return fecha_obj.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-
-        LogManager.escribir_log(
-            "WARNING", f"No se pudo convertir fecha: {fecha_str}")
-        return None
-
-    except Exception as e:
-        LogManager.escribir_log(
-            "WARNING", f"Error convirtiendo fecha {fecha_str}: {str(e)}")
-        return None
-
-
-def limpiar_valor_monetario(valor_str):
-    """Limpia y convierte valores monetarios a float"""
-    try:
-        if not valor_str:
-            return 0.0
-
-        # Limpiar caracteres no numéricos excepto punto y coma
-        valor_limpio = str(valor_str).replace(
-            '$', '').replace(',', '').replace(' ', '').strip()
-
-        # Manejar valores negativos entre paréntesis
-        if valor_limpio.startswith('(') and valor_limpio.endswith(')'):
-            valor_limpio = '-' + valor_limpio[1:-1]
-
-        return float(valor_limpio) if valor_limpio and valor_limpio != '-' else 0.0
-
-    except (ValueError, TypeError):
-        return 0.0
-
 # ==================== FUNCIÓN PRINCIPAL ====================
 
 
 @with_timeout_check
-def main():
-    """Función principal del robot Produbanco"""
+def main(reanudar=False, historico=None):
+    """
+    Función principal del robot Produbanco
+
+    Args:
+        reanudar: Si True (--resume), solo reintenta las empresas fallidas
+            según el checkpoint de la ventana de fechas actual
+        historico: (desde, hasta) como date para una carga histórica por tramos
+            (--backfill). Una ventana explícita (RPA_FECHA_DESDE/HASTA, trabajos
+            de la cola) también se procesa por tramos.
+    """
 
     id_ejecucion = None
     inicio_ejecucion = datetime.now()
 
+    ventana = ConfiguracionManager.ventana_fechas()
+    if historico is None and ventana:
+        try:
+            historico = tuple(datetime.strptime(fecha, "%d/%m/%Y").date() for fecha in ventana)
+        except ValueError:
+            LogManager.escribir_log(
+                "WARNING", f"Ventana explícita inválida {ventana}, se consulta tal cual")
+
     try:
-        # Obtener ID de ejecución
-        id_ejecucion = obtenerIDEjecucion()
+        # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+        id_ejecucion = BaseDatos.registrar_ejecucion(
+            DATABASE_RUNS, f"Descarga comprobantes-{NOMBRE_BANCO}")
 
         LogManager.iniciar_proceso(NOMBRE_BANCO, id_ejecucion, f"Automatización Banco Produbanco - ID: {id_ejecucion}")
         # Iniciar timeout manager
+        timeout_manager.configurar_ejecucion(DATABASE_RUNS, id_ejecucion)
         timeout_manager.start()
 
-        # Registrar inicio de ejecución
-        sql_inicio = f"""
-            INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) 
-            VALUES ({id_ejecucion}, 'Descarga comprobantes-{NOMBRE_BANCO}', SYSDATETIME(), 'Running')
-        """
-        datosEjecucion(sql_inicio)
         escribirLog(
             f"Iniciando automatización {NOMBRE_BANCO}", id_ejecucion, "INFO", "INICIO")
 
         # Inicializar Playwright
         manager = PlaywrightManager(
-            headless=True, download_path=RUTAS_CONFIG['descargas'])
+            headless=True, download_path=EspacioTrabajo.actual())
         playwright, browser, context, page = manager.iniciar_navegador()
         
         # Añadir medidas anti-detección
@@ -1146,16 +1324,26 @@ def main():
         """)
 
         try:
-            # Navegar a login
-            if not navegar_a_login(page):
-                return False
-
-            # Iniciar sesión
-            if not iniciar_sesion(page):
-                return False
+            with timeout_manager.fase("login"):
+                # Navegar a login
+                if not navegar_a_login(page):
+                    LogManager.finalizar_proceso(
+                        NOMBRE_BANCO, False, "No se pudo abrir la página de login")
+                    return False
+
+                # Iniciar sesión
+                if not iniciar_sesion(page):
+                    LogManager.finalizar_proceso(
+                        NOMBRE_BANCO, False, "Inicio de sesión falló")
+                    return False
 
             # Obtener y procesar movimientos
-            if not obtener_y_procesar_movimientos(page, id_ejecucion):
+            if historico:
+                LogManager.escribir_log(
+                    "INFO", f"📚 Carga histórica por tramos: {historico[0]:%d/%m/%Y} - {historico[1]:%d/%m/%Y}")
+            if not obtener_y_procesar_movimientos(page, id_ejecucion, reanudar, historico):
+                LogManager.finalizar_proceso(
+                    NOMBRE_BANCO, False, "Procesamiento de movimientos falló")
                 return False
 
             # Registrar éxito
@@ -1173,13 +1361,16 @@ def main():
             escribirLog(
                 f"Automatización {NOMBRE_BANCO} completada exitosamente", id_ejecucion, "SUCCESS", "FIN")
             
-            # Actualizar configuraciones de fecha
-            ConfiguracionManager.actualizar_configuraciones_fecha()
+            # Actualizar configuraciones de fecha (la carga histórica no mueve la ventana diaria)
+            if not historico:
+                ConfiguracionManager.actualizar_configuraciones_fecha()
 
             # Ejecutar BAT final
             LogManager.escribir_log("INFO", "🔧 Ejecutando proceso final...")
             SubprocesoManager.ejecutar_bat_final()
 
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, True, f"Automatización completada en {tiempo_total}")
             return True
 
         finally:
@@ -1211,6 +1402,8 @@ def main():
             "INFO", "🔧 Ejecutando proceso final de emergencia...")
         SubprocesoManager.ejecutar_bat_final()
 
+        LogManager.finalizar_proceso(
+            NOMBRE_BANCO, False, f"Error en proceso principal: {str(e)}")
         return False
 
     finally:
@@ -1224,25 +1417,52 @@ def main():
         LogManager.escribir_log("INFO", "=" * 60)
 
 
-if __name__ == "__main__":
+# ==================== PUNTO DE ENTRADA ====================
+def ejecutar(argumentos=None):
+    """
+    Punto de entrada de línea de comandos (usado también por orquestador.py)
+
+    Args:
+        argumentos: Lista de argumentos al estilo sys.argv (por defecto sys.argv)
+
+    Returns:
+        int: Código de salida del proceso (0 = éxito)
+    """
+    argumentos = sys.argv if argumentos is None else argumentos
     try:
-        exito = main()
+        try:
+            rango_historico = leer_rango_historico(argumentos)
+        except ValueError as e:
+            LogManager.escribir_log("ERROR", f"--backfill inválido: {str(e)}")
+            return 2
+        if rango_historico:
+            timeout_manager.timeout_seconds = TIMEOUT_HISTORICO
+
+        exito = main(reanudar="--resume" in argumentos, historico=rango_historico)
         if exito:
             LogManager.escribir_log(
                 "SUCCESS", f"Robot {NOMBRE_BANCO} finalizado exitosamente")
-            sys.exit(0)
+            return 0
         else:
             # Actualizar configuraciones de fecha
-            ConfiguracionManager.actualizar_configuraciones_fecha()
+            if not rango_historico:
+                ConfiguracionManager.actualizar_configuraciones_fecha()
             LogManager.escribir_log(
                 "ERROR", f"Robot {NOMBRE_BANCO} finalizado con errores")
-            sys.exit(1)
+            return 1
+    except CancelacionPorTiempo as e:
+        LogManager.finalizar_proceso(NOMBRE_BANCO, False, f"Proceso cancelado: {str(e)}")
+        return 1
     except KeyboardInterrupt:
         LogManager.escribir_log(
             "WARNING", f"Robot {NOMBRE_BANCO} interrumpido por el usuario")
-        sys.exit(1)
+        LogManager.finalizar_proceso(NOMBRE_BANCO, False, "Proceso interrumpido por el usuario")
+        return 1
     except Exception as e:
         LogManager.escribir_log(
             "ERROR", f"Error fatal en robot {NOMBRE_BANCO}: {str(e)}")
-        sys.exit(1)
-    
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
@@ -6,12 +6,10 @@ import os
 import sys
 import time
 import json
-import threading
 import re
 import subprocess
 import csv
 from datetime import datetime, date, timedelta, timezone
-from functools import wraps
 
 from componentes_comunes import (
     PlaywrightManager,
@@ -25,92 +23,19 @@ from componentes_comunes import (
     ConfiguracionManager,
     esperarConLoader,
     esperarConLoaderSimple,
+    TimeoutManager,
+    CancelacionPorTiempo,
+    formatear_tiempo_ejecucion,
+    MedidorTiempos,
+    MetricasEjecucion,
+    EspacioTrabajo,
     RUTAS_CONFIG
 )
 
 # ==================== CONTEXTO DE TIMEOUT ====================
-
-
-class TimeoutManager:
-    """Maneja timeouts globales de manera automática"""
-
-    def __init__(self, timeout_seconds=600):
-        self.timeout_seconds = timeout_seconds
-        self.start_time = None
-        self.timer = None
-        self.is_timeout = False
-
-    def start(self):
-        """Inicia el timer de timeout"""
-        self.start_time = datetime.now()
-        self.is_timeout = False
-        LogManager.escribir_log(
-            "INFO", f"Timeout manager iniciado: {self.timeout_seconds//60} minutos")
-
-        # Configurar timer
-        self.timer = threading.Timer(
-            self.timeout_seconds, self._timeout_callback)
-        self.timer.daemon = True
-        self.timer.start()
-
-    def _timeout_callback(self):
-        """Callback que se ejecuta cuando se alcanza el timeout"""
-        self.is_timeout = True
-        tiempo_str = formatear_tiempo_ejecucion(
-            datetime.now() - self.start_time)
-        LogManager.escribir_log(
-            "ERROR", f"TIMEOUT GLOBAL ALCANZADO: {tiempo_str}")
-
-        # Forzar salida del programa
-        os._exit(1)
-
-    def check(self):
-        """Verifica si se ha alcanzado el timeout"""
-        if self.is_timeout:
-            tiempo_str = formatear_tiempo_ejecucion(
-                datetime.now() - self.start_time)
-            raise TimeoutError(
-                f"Proceso terminado por timeout global ({tiempo_str})")
-
-    def get_elapsed_time(self):
-        """Obtiene el tiempo transcurrido"""
-        if self.start_time:
-            return datetime.now() - self.start_time
-        return timedelta(0)
-
-    def stop(self):
-        """Detiene el timer"""
-        if self.timer:
-            self.timer.cancel()
-            self.timer = None
-
-
-# Instancia global del timeout manager
+# Instancia global del timeout manager (presupuestos por fase en componentes_comunes)
 timeout_manager = TimeoutManager(600)  # 10 minutos
-
-
-def with_timeout_check(func):
-    """Decorator que verifica timeout antes de ejecutar funciones críticas"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        timeout_manager.check()
-        return func(*args, **kwargs)
-    return wrapper
-
-
-def formatear_tiempo_ejecucion(tiempo_delta):
-    """Formatea la duración de tiempo en formato legible"""
-    total_seconds = int(tiempo_delta.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-
-    if hours > 0:
-        return f"{hours}h {minutes}m {seconds}s"
-    elif minutes > 0:
-        return f"{minutes}m {seconds}s"
-    else:
-        return f"{seconds}s"
+with_timeout_check = timeout_manager.verificar
 
 
 # ==================== CONFIGURACIÓN GLOBAL ====================
@@ -136,20 +61,6 @@ CONFIG_CREA = {
 # ==================== FUNCIONES DE BASE DE DATOS ====================
 
 
-def obtenerIDEjecucion():
-    """Obtiene el siguiente ID de ejecución de la BD"""
-    try:
-        sql = f"SELECT MAX(idAutomationRun) FROM {DATABASE_RUNS}"
-        resultado = BaseDatos.consultarBD(sql)
-        if resultado and resultado[0] and resultado[0][0]:
-            return resultado[0][0] + 1
-        return 1
-    except Exception as e:
-        LogManager.escribir_log(
-            "ERROR", f"Error obteniendo ID ejecución: {str(e)}")
-        return int(time.time())  # Fallback
-
-
 def datosEjecucion(sql):
     """Ejecuta una consulta en la BD"""
     try:
@@ -172,7 +83,7 @@ def escribirLog(estado, mensaje, id_ejecucion, accion):
     """
     try:
         if not id_ejecucion:
-            id_ejecucion = obtenerIDEjecucion()
+            id_ejecucion = "NULL"  # Log sin ejecución asociada
 
         texto_limpio = mensaje.replace("'", "''")
         sql = f"""
@@ -273,7 +184,7 @@ def inicializar_navegacion():
 
         # Inicializar Playwright
         manager = PlaywrightManager(
-            headless=False, download_path=RUTAS_CONFIG['descargas'])
+            headless=False, download_path=EspacioTrabajo.actual())
         playwright, browser, context, page = manager.iniciar_navegador()
 
         LogManager.escribir_log("INFO", f"Navegando a: {URLS['login']}")
@@ -294,6 +205,7 @@ def realizar_login(page, usuario, clave):
     """Realiza el proceso de login en CREA usando componentes modernos"""
     try:
         LogManager.escribir_log("INFO", "Iniciando proceso de login...")
+        PlaywrightManager.registrar_secreto(clave)
 
         # ✅ USAR ComponenteInteraccion existente
         if not ComponenteInteraccion.escribirComponente(page, "#identificacionLogin", usuario, descripcion="Usuario"):
@@ -470,8 +382,8 @@ def descargar_excel(page, iframe, adicional=""):
         excel_locator = iframe.locator(boton_excel)
         excel_locator.wait_for(timeout=30000)
 
-        # Configurar la escucha de descargas
-        download_path = RUTAS_CONFIG['descargas']
+        # Configurar la escucha de descargas (carpeta propia de esta ejecución)
+        download_path = EspacioTrabajo.actual()
 
         with page.expect_download() as download_info:
             # ✅ Hacer clic en descarga usando locator
@@ -557,6 +469,7 @@ def cerrar_sesion(page, iframe):
 
 # ==================== FUNCIONES DE PROCESAMIENTO DE ARCHIVOS ====================
 
+@MedidorTiempos.medido()
 def procesar_archivo_excel(ruta_archivo, id_ejecucion):
     """Procesa el archivo Excel descargado de CREA"""
     try:
@@ -833,6 +746,9 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion):
                 movimientos_omitidos += 1
                 continue
 
+        MetricasEjecucion.registrar_filas(
+            len(movimientos_datos), movimientos_insertados, movimientos_omitidos)
+
         # Resumen final
         LogManager.escribir_log("INFO", f"=== RESUMEN PROCESAMIENTO ===")
         LogManager.escribir_log("INFO", f"🏢 Empresa: {empresa}")
@@ -900,10 +816,13 @@ def asegurar_numero_unico(num_documento_base, documentos_bd, documentos_memoria)
 @with_timeout_check
 def ejecutar_proceso_crea():
     """Función principal que ejecuta todo el proceso de CREA"""
-    id_ejecucion = obtenerIDEjecucion()
+    # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+    id_ejecucion = BaseDatos.registrar_ejecucion(
+        DATABASE_RUNS, f"Descarga Transacciones-{NOMBRE_BANCO}")
 
     LogManager.iniciar_proceso(NOMBRE_BANCO, id_ejecucion, f"Automatización {NOMBRE_BANCO} - Id de ejecución: {id_ejecucion}")
     # Inicializar timeout
+    timeout_manager.configurar_ejecucion(DATABASE_RUNS, id_ejecucion)
     timeout_manager.start()
     tiempo_inicio = datetime.now()
 
@@ -936,19 +855,7 @@ def ejecutar_proceso_crea():
             "INFO", "✅ Configuraciones cargadas correctamente")
 
         # ===== 2. ID DE EJECUCIÓN =====
-
-        # Registrar inicio de ejecución (si la tabla existe)
-        try:
-            sql_inicio = f"""
-                INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) 
-                VALUES ('{id_ejecucion}', 'Descarga Transacciones-{NOMBRE_BANCO}', GETDATE(), 'Running')
-            """
-            BaseDatos.insertarBD(sql_inicio)
-        except Exception as e:
-            LogManager.escribir_log(
-                "WARNING", f"No se pudo registrar en tabla de ejecuciones: {e}")
-            LogManager.escribir_log(
-                "INFO", f"Continuando con ejecución local: {id_ejecucion}")
+        # Ya registrado al inicio con BaseDatos.registrar_ejecucion
 
         # ===== 3. INICIALIZACIÓN =====
         LogManager.escribir_log("INFO", "🚀 Inicializando componentes...")
@@ -960,18 +867,21 @@ def ejecutar_proceso_crea():
         # ===== 4. PROCESO DE LOGIN =====
         LogManager.escribir_log("INFO", "🔐 Ejecutando proceso de login...")
 
-        if not realizar_login(page, USUARIO, CLAVE):
-            raise Exception("Error en el proceso de login")
+        with timeout_manager.fase("login"):
+            if not realizar_login(page, USUARIO, CLAVE):
+                raise Exception("Error en el proceso de login")
 
-        if not procesar_token_correo(page):
-            raise Exception("Error procesando token del correo")
+        with timeout_manager.fase("otp"):
+            if not procesar_token_correo(page):
+                raise Exception("Error procesando token del correo")
 
         LogManager.escribir_log("INFO", "✅ Login completado exitosamente")
 
         # ===== 5. NAVEGACIÓN A ESTADO DE CUENTA =====
         LogManager.escribir_log("INFO", "📊 Navegando a estado de cuenta...")
 
-        iframe = navegar_a_estado_cuenta(page)
+        with timeout_manager.fase("navegacion"):
+            iframe = navegar_a_estado_cuenta(page)
         if not iframe:
             raise Exception("Error navegando a estado de cuenta")
 
@@ -986,7 +896,8 @@ def ejecutar_proceso_crea():
          # Generar adicional para nombre de archivo
         adicional = f"{mes_seleccionado}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
-        archivo_descargado = descargar_excel(page, iframe, adicional=adicional)
+        with timeout_manager.fase("descarga"):
+            archivo_descargado = descargar_excel(page, iframe, adicional=adicional)
         if not archivo_descargado:
             raise Exception("Error descargando archivo Excel")
 
@@ -995,8 +906,9 @@ def ejecutar_proceso_crea():
 
         # ===== 7. PROCESAMIENTO DE DATOS =====
 
-        movimientos_procesados, movimientos_omitidos = procesar_archivo_excel(
-            archivo_descargado, id_ejecucion)
+        with timeout_manager.fase("ingesta"):
+            movimientos_procesados, movimientos_omitidos = procesar_archivo_excel(
+                archivo_descargado, id_ejecucion)
 
         LogManager.escribir_log(
             "INFO", f"✅ Movimientos procesados: {movimientos_procesados}")
@@ -1079,6 +991,13 @@ def ejecutar_proceso_crea():
         # ===== LIMPIEZA FINAL =====
         timeout_manager.stop()
 
+        if context:
+            try:
+                # Cerrar el contexto primero: escribe el HAR si se está grabando
+                context.close()
+            except Exception:
+                pass
+
         if browser:
             try:
                 browser.close()
@@ -1203,25 +1122,43 @@ def main():
             "INFO", f"Tiempo total de ejecución: {tiempo_total}")
         LogManager.escribir_log("INFO", "=" * 60)
 
-# ==================== SCRIPT PRINCIPAL ====================
+# ==================== PUNTO DE ENTRADA ====================
+def ejecutar(argumentos=None):
+    """
+    Punto de entrada de línea de comandos (usado también por orquestador.py)
 
+    Args:
+        argumentos: Lista de argumentos al estilo sys.argv (por defecto sys.argv)
 
-if __name__ == "__main__":
+    Returns:
+        int: Código de salida del proceso (0 = éxito)
+    """
+    argumentos = sys.argv if argumentos is None else argumentos
     try:
         exito = main()
         if exito:
             LogManager.escribir_log(
                 "SUCCESS", f"Robot {NOMBRE_BANCO} finalizado exitosamente")
-            sys.exit(0)
+            return 0
         else:
             LogManager.escribir_log(
                 "ERROR", f"Robot {NOMBRE_BANCO} finalizado con errores")
-            sys.exit(1)
+            return 1
+    except CancelacionPorTiempo as e:
+        LogManager.finalizar_proceso(NOMBRE_BANCO, False, f"Proceso cancelado: {str(e)}")
+        return 1
     except KeyboardInterrupt:
         LogManager.escribir_log(
             "WARNING", f"Robot {NOMBRE_BANCO} interrumpido por el usuario")
-        sys.exit(1)
+        return 1
     except Exception as e:
         LogManager.escribir_log(
             "ERROR", f"Error fatal en robot {NOMBRE_BANCO}: {str(e)}")
-        sys.exit(1)
+        return 1
+
+
+# ==================== SCRIPT PRINCIPAL ====================
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
@@ -8,13 +8,11 @@ import os
 import sys
 import time
 import json
-import threading
 import re
 import email
 import email.utils
 import imaplib
 from datetime import datetime, date, timedelta, timezone
-from functools import wraps
 from email.header import decode_header
 
 from componentes_comunes import (
@@ -24,6 +22,13 @@ from componentes_comunes import (
     LectorArchivos,
     LogManager,
     BaseDatos,
+    TimeoutManager,
+    CancelacionPorTiempo,
+    formatear_tiempo_ejecucion,
+    MedidorTiempos,
+    MetricasEjecucion,
+    NormalizadorMovimientos,
+    EspacioTrabajo,
     RUTAS_CONFIG,
     CorreoManager,
     ConfiguracionManager,
@@ -34,82 +39,11 @@ from componentes_comunes import (
 
 
 # ==================== CONTEXTO DE TIMEOUT ====================
-
-
-class TimeoutManager:
-    """Maneja timeouts globales de manera automática"""
-
-    def __init__(self, timeout_seconds=600):
-        self.timeout_seconds = timeout_seconds
-        self.start_time = None
-        self.timer = None
-        self.is_timeout = False
-
-    def start(self):
-        """Inicia el timer de timeout"""
-        self.start_time = datetime.now()
-        self.is_timeout = False
-        LogManager.escribir_log(
-            "INFO", f"Timeout manager iniciado: {self.timeout_seconds//60} minutos")
-
-        # Configurar timer
-        self.timer = threading.Timer(
-            self.timeout_seconds, self._timeout_callback)
-        self.timer.daemon = True
-        self.timer.start()
-
-    def _timeout_callback(self):
-        """Callback que se ejecuta cuando se alcanza el timeout"""
-        self.is_timeout = True
-        tiempo_str = formatear_tiempo_ejecucion(
-            datetime.now() - self.start_time)
-        LogManager.escribir_log(
-            "ERROR", f"TIMEOUT GLOBAL ALCANZADO: {tiempo_str}")
-
-        # Forzar salida del programa
-        os._exit(1)
-
-    def check(self):
-        """Verifica si se ha alcanzado el timeout"""
-        if self.is_timeout:
-            tiempo_str = formatear_tiempo_ejecucion(
-                datetime.now() - self.start_time)
-            raise TimeoutError(
-                f"Proceso terminado por timeout global ({tiempo_str})")
-
-    def get_elapsed_time(self):
-        """Obtiene el tiempo transcurrido"""
-        if self.start_time:
-            return datetime.now() - self.start_time
-        return timedelta(0)
-
-    def stop(self):
-        """Detiene el timer"""
-        if self.timer:
-            self.timer.cancel()
-            self.timer = None
-
-
-# Instancia global del timeout manager
+# Instancia global del timeout manager (presupuestos por fase en componentes_comunes)
 timeout_manager = TimeoutManager(600)  # 10 minutos
+with_timeout_check = timeout_manager.verificar
 
 
-def with_timeout_check(func):
-    """Decorator que verifica timeout antes de ejecutar funciones críticas"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        timeout_manager.check()
-        return func(*args, **kwargs)
-    return wrapper
-
-
-def formatear_tiempo_ejecucion(tiempo_delta):
-    """Formatea un timedelta a string legible"""
-    total_seconds = int(tiempo_delta.total_seconds())
-    minutos = total_seconds // 60
-    segundos = total_seconds % 60
-    return f"{minutos}m {segundos}s"
-
 # ==================== CONFIGURACIÓN GLOBAL ====================
 # source /home/administrador/Escritorio/venv/bin/activate
 # ejecucion manual python CooperativaJEP_Final.py --manual
@@ -139,21 +73,23 @@ CONFIG_JEP = {
     'tiempo_espera_descarga': 15
 }
 
-# ==================== FUNCIONES DE BASE DE DATOS ====================
-
+# Estructura del Excel de movimientos (datos desde la fila 8) para NormalizadorMovimientos
+ESQUEMA_ARCHIVO_JEP = {
+    'fila_inicio': 7,
+    'columnas': {
+        'fecha': 0, 'tipo_trx': 1, 'num_documento': 2, 'descripcion': 3,
+        'oficina': 4, 'valor': 5, 'saldo': 6,
+    },
+    'min_columnas': 7,
+    'requeridas': ('fecha', 'valor'),
+    'fechas': {
+        'fecha_sql': {'columna': 'fecha', 'formatos': ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y']},
+    },
+    'montos': ('valor', 'saldo'),
+    'tipo': {'columna': 'tipo_trx', 'valor': "CREDITO", 'si_coincide': "C", 'si_no': "D", 'mayusculas': True},
+}
 
-def obtenerIDEjecucion():
-    """Obtiene el siguiente ID de ejecución de la BD"""
-    try:
-        sql = f"SELECT MAX(idAutomationRun) FROM {DATABASE_RUNS}"
-        resultado = BaseDatos.consultarBD(sql)
-        if resultado and resultado[0] and resultado[0][0]:
-            return resultado[0][0] + 1
-        return 1
-    except Exception as e:
-        LogManager.escribir_log(
-            "ERROR", f"Error obteniendo ID ejecución: {str(e)}")
-        return int(time.time())  # Fallback
+# ==================== FUNCIONES DE BASE DE DATOS ====================
 
 
 def datosEjecucion(sql):
@@ -436,6 +372,7 @@ def iniciar_sesion(page, usuario, password):
             if manejar_sesion_activa(page, login_button):
                 LogManager.escribir_log(
                     "INFO", "Sesión activa previa detectada, reingresando credenciales")
+                MetricasEjecucion.incrementar("login_reintentos")
 
                 # Reingresar credenciales
                 realizar_login()
@@ -443,7 +380,9 @@ def iniciar_sesion(page, usuario, password):
                 break
 
         # Código de seguridad
-        if not manejar_codigo_seguridad_jep(page, timestamp_inicio_login):
+        with timeout_manager.fase("otp"):
+            codigo_validado = manejar_codigo_seguridad_jep(page, timestamp_inicio_login)
+        if not codigo_validado:
             LogManager.escribir_log(
                 "ERROR", "Falló la validación del código de seguridad")
             return False
@@ -676,21 +615,25 @@ def descargar_y_procesar_archivo(page, id_ejecucion, posicion):
         descargar_xpath = "//div/form/div[1]/div/div[3]/div[1]/button"
         habilitar_campo_si_es_necesario(page, descargar_xpath)
 
-        # Usar esperarDescarga para obtener la ruta del archivo descargado
-        ruta_archivo = ComponenteInteraccion.esperarDescarga(
-            page,
-            descargar_xpath,
-            timeout=30000,
-            descripcion="botón descargar movimientos JEP"
-        )
-
-        if not ruta_archivo:
+        # Usar esperarDescarga para obtener el archivo descargado (en memoria)
+        with timeout_manager.fase(f"descarga:empresa {posicion}"):
+            descarga = ComponenteInteraccion.esperarDescarga(
+                page,
+                descargar_xpath,
+                timeout=30000,
+                descripcion="botón descargar movimientos JEP",
+                en_memoria=True
+            )
+
+        if not descarga:
             LogManager.escribir_log(
                 "ERROR", f"No se pudo descargar archivo para empresa {posicion}")
             return False
 
         # Procesar archivo descargado
-        if procesar_archivo_excel(ruta_archivo, id_ejecucion, posicion):
+        with timeout_manager.fase(f"ingesta:empresa {posicion}"):
+            procesado = procesar_archivo_excel(descarga, id_ejecucion, posicion)
+        if procesado:
             LogManager.escribir_log(
                 "SUCCESS", f"Movimientos de empresa {posicion} procesados exitosamente")
 
@@ -698,6 +641,8 @@ def descargar_y_procesar_archivo(page, id_ejecucion, posicion):
             regresar_seleccion(page)
             return True
         else:
+            # Conservar el archivo en disco para revisión
+            LectorArchivos.conservar(descarga)
             LogManager.escribir_log(
                 "ERROR", f"Error procesando archivo de empresa {posicion}")
             return False
@@ -725,6 +670,7 @@ def regresar_seleccion(page):
 # ==================== FUNCIONES DE PROCESAMIENTO DE ARCHIVOS ====================
 
 
+@MedidorTiempos.medido()
 def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa_posicion):
     """Procesa el archivo Excel descargado de JEP"""
     try:
@@ -766,37 +712,27 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa_posicion):
                 "WARNING", "No se pudo extraer número de cuenta")
             cuenta = "SIN_CUENTA"
 
-        # Obtener rango de fechas del archivo para la consulta previa
+        # Normalizar las filas de movimientos (fila 8 en adelante) en columnas tipadas
+        movimientos = NormalizadorMovimientos.normalizar(contenido, ESQUEMA_ARCHIVO_JEP)
+
+        # Obtener rango de fechas del archivo para la consulta previa (filas con tipo de transacción)
         LogManager.escribir_log(
             "INFO", "🔍 Analizando rango de fechas en el archivo...")
-        fechas_archivo = []
-
-        # Los datos empiezan en la fila 8 (índice 7)
-        for i in range(7, len(contenido)):
-            fila = contenido[i]
-            if fila and len(fila) > 1 and fila[1]:
-                fecha_str = str(fila[0])
-                if fecha_str not in fechas_archivo:
-                    fechas_archivo.append(fecha_str)
-
-        if not fechas_archivo:
+        con_tipo = movimientos["tipo_trx"] != ""
+        if not con_tipo.any():
             LogManager.escribir_log(
                 "WARNING", "No se encontraron fechas válidas en el archivo")
             return False
 
-        fechas_convertidas = []
-        for fecha_str in fechas_archivo:
-            fecha_sql = convertir_fecha_sql(fecha_str)
-            if fecha_sql:
-                fechas_convertidas.append(fecha_sql)
-        if not fechas_convertidas:
+        fechas_convertidas = movimientos.loc[con_tipo, "fecha_sql"].dropna()
+        if fechas_convertidas.empty:
             LogManager.escribir_log(
                 "WARNING", "No se pudieron convertir las fechas")
             return False
 
         # Determinar rango de fechas
-        fecha_min = min(fechas_convertidas)
-        fecha_max = max(fechas_convertidas)
+        fecha_min = fechas_convertidas.min()
+        fecha_max = fechas_convertidas.max()
         LogManager.escribir_log(
             "INFO", f"📅 Rango de fechas en archivo: {fecha_min} a {fecha_max}")
 
@@ -854,64 +790,47 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa_posicion):
             LogManager.escribir_log(
                 "INFO", "📋 No se encontraron registros existentes en el rango de fechas")
 
+        # PASO 1: Número de documento BASE (necesario para la combinación); si el
+        # archivo no lo trae se genera con fecha + largos de tipo/descripción/oficina + valor + saldo
+        # (map(str) y no astype(str): astype redondea los float y el número cambiaría)
+        documento_archivo = movimientos["num_documento"].str.strip()
+        documento_generado = (
+            movimientos["fecha"].str.replace("/", "", regex=False)
+            + movimientos["tipo_trx"].str.len().astype(str)
+            + movimientos["descripcion"].str.len().astype(str)
+            + movimientos["oficina"].str.len().astype(str)
+            + movimientos["valor"].map(str).str.replace(r"[.,]", "", regex=True)
+            + movimientos["saldo"].map(str).str.replace(r"[.,]", "", regex=True)
+            + "G")
+        movimientos["num_documento_base"] = documento_archivo.where(documento_archivo != "", documento_generado)
+
+        # Aplicar prefijo si es TECNICENTRO
+        prefijo = CONFIG_JEP['prefijo_tecnicentro'] if cuenta == NUM_CUENTA_TECNICENTRO else ""
+        movimientos["descripcion_final"] = (prefijo + movimientos["descripcion"]).str.strip()
+
         # Procesar movimientos del archivo
         movimientos_insertados = 0
         movimientos_omitidos = 0
-        filas_procesadas = 0
         documentos_procesados_en_memoria = set()
         combinaciones_procesadas_memoria = set()
 
-        for i in range(7, len(contenido)):  # Empezar desde fila 8 (índice 7)
-            fila = contenido[i]
-
-            if not fila or len(fila) < 7:
-                continue
-
-            # Extraer datos básicos
-            fecha_str = str(fila[0]) if fila[0] else ""
-            tipo_trx_raw = str(fila[1]) if fila[1] else ""
-            num_documento_raw = str(fila[2]) if fila[2] else ""
-            descripcion = str(fila[3]) if fila[3] else ""
-            oficina = str(fila[4]) if fila[4] else ""
-            valor_str = str(fila[5]) if fila[5] else ""
-            saldo_str = str(fila[6]) if fila[6] else ""
-
-            if not fecha_str or not valor_str:
-                continue
-
-            filas_procesadas += 1
+        completos = movimientos[movimientos["_completa"]]
+        filas_procesadas = len(completos)
 
+        for registro in NormalizadorMovimientos.filas(completos):
             try:
-                # Convertir fecha
-                fecha_convertida = convertir_fecha_sql(fecha_str)
+                fecha_convertida = registro["fecha_sql"]
                 if not fecha_convertida:
                     LogManager.escribir_log(
-                        "WARNING", f"Fecha inválida en fila {i+1}: {fecha_str}")
+                        "WARNING", f"Fecha inválida en fila {registro['fila']+1}: {registro['fecha']}")
                     continue
 
-                # Determinar tipo
-                tipo_trx = "C" if tipo_trx_raw.upper() == "CREDITO" else "D"
-
-                # Limpiar valores monetarios
-                valor = limpiar_valor_monetario(valor_str)
-                saldo = limpiar_valor_monetario(saldo_str)
-
-                # Aplicar prefijo si es TECNICENTRO
-                prefijo = CONFIG_JEP['prefijo_tecnicentro'] if cuenta == NUM_CUENTA_TECNICENTRO else ""
-                descripcion_final = f"{prefijo}{descripcion}".strip()
-
-                # PASO 1: Procesar número de documento BASE primero (necesario para la combinación)
-                if num_documento_raw and num_documento_raw.strip():
-                    num_documento_base = num_documento_raw.strip()
-                else:
-                    # Generar número de documento si no existe
-                    fecha_codigo = fecha_str.replace("/", "")
-                    tipo_codigo = str(len(tipo_trx_raw))
-                    concepto_codigo = str(len(descripcion))
-                    agencia_codigo = str(len(oficina))
-                    monto_codigo = str(valor).replace('.', '').replace(',', '')
-                    saldo_codigo = str(saldo).replace('.', '').replace(',', '')
-                    num_documento_base = f"{fecha_codigo}{tipo_codigo}{concepto_codigo}{agencia_codigo}{monto_codigo}{saldo_codigo}G"
+                tipo_trx = registro["tipo"]
+                valor = registro["valor"]
+                saldo = registro["saldo"]
+                oficina = registro["oficina"]
+                descripcion_final = registro["descripcion_final"]
+                num_documento_base = registro["num_documento_base"]
 
                 # Crear combinación única usando el número BASE (sin sufijo): numDocumentoBase + fecha + valor + tipo + concepto
                 # Usar el número base permite detectar duplicados incluso si en BD tienen sufijos (_1, _2, etc.)
@@ -1023,9 +942,12 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa_posicion):
 
             except Exception as e:
                 LogManager.escribir_log(
-                    "ERROR", f"Error procesando fila {i+1}: {str(e)}")
+                    "ERROR", f"Error procesando fila {registro['fila']+1}: {str(e)}")
                 continue
 
+        MetricasEjecucion.registrar_filas(
+            filas_procesadas, movimientos_insertados, movimientos_omitidos)
+
         # Resumen final detallado
         LogManager.escribir_log("INFO", f"=== RESUMEN PROCESAMIENTO ===")
         LogManager.escribir_log("INFO", f"🏢 Empresa: {empresa}")
@@ -1053,14 +975,8 @@ def procesar_archivo_excel(ruta_archivo, id_ejecucion, empresa_posicion):
             LogManager.escribir_log(
                 "SUCCESS", f"✅ Procesamiento exitoso: No se encontraron registros nuevos para {empresa} (todos ya existen)")
 
-        # Eliminar archivo después de procesarlo
-        try:
-            os.remove(ruta_archivo)
-            LogManager.escribir_log(
-                "INFO", f"Archivo eliminado: {ruta_archivo}")
-        except Exception as e:
-            LogManager.escribir_log(
-                "WARNING", f"No se pudo eliminar archivo: {str(e)}")
+        # Eliminar archivo (o liberar la descarga en memoria) después de procesarlo
+        LectorArchivos.eliminar_procesado(ruta_archivo)
 
         return True
 
@@ -1292,51 +1208,6 @@ def click_opcional_con_habilitacion(page, selector, descripcion="elemento", inte
         return False
 
 
-def convertir_fecha_sql(fecha_str):
-    """Convierte string de fecha a formato SQL Server"""
-    try:
-        if not fecha_str:
-            return None
-
-        # Intentar diferentes formatos de fecha
-        formatos = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y']
-
-        for formato in formatos:
-            try:
-                fecha_obj = datetime.strptime(fecha_str, formato)
-                return fecha_obj.strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-
-        LogManager.escribir_log(
-            "WARNING", f"No se pudo convertir fecha: {fecha_str}")
-        return None
-
-    except Exception as e:
-        LogManager.escribir_log(
-            "WARNING", f"Error convirtiendo fecha {fecha_str}: {str(e)}")
-        return None
-
-
-def limpiar_valor_monetario(valor_str):
-    """Limpia y convierte valores monetarios a float"""
-    try:
-        if not valor_str:
-            return 0.0
-
-        # Limpiar caracteres no numéricos excepto punto y coma
-        valor_limpio = str(valor_str).replace(
-            '$', '').replace(',', '').replace(' ', '').strip()
-
-        # Manejar valores negativos entre paréntesis
-        if valor_limpio.startswith('(') and valor_limpio.endswith(')'):
-            valor_limpio = '-' + valor_limpio[1:-1]
-
-        return float(valor_limpio) if valor_limpio and valor_limpio != '-' else 0.0
-
-    except (ValueError, TypeError):
-        return 0.0
-
 # ==================== FUNCIONES DE PROCESAMIENTO MANUAL ====================
 
 
@@ -1384,7 +1255,11 @@ def identificar_empresa_desde_archivo(ruta_archivo):
 
 
 def buscar_archivos_jep_en_descargas():
-    """Busca archivos Excel de JEP en la carpeta de descargas por nombres específicos"""
+    """
+    Busca archivos Excel de JEP en la carpeta de descargas por nombres específicos
+    y los reclama para esta ejecución (se mueven a su EspacioTrabajo), así otra
+    ejecución simultánea no procesa los mismos archivos
+    """
     try:
         carpeta_descargas = RUTAS_CONFIG['descargas']
         if not os.path.exists(carpeta_descargas):
@@ -1422,6 +1297,10 @@ def buscar_archivos_jep_en_descargas():
                     
                     # Verificar que el archivo existe y es válido
                     if os.path.isfile(ruta_completa):
+                        ruta_completa = LectorArchivos.reclamar(ruta_completa)
+                        if not ruta_completa:
+                            continue
+
                         # Obtener cuenta desde el archivo para validación
                         _, cuenta = identificar_empresa_desde_archivo(ruta_completa)
                         
@@ -1446,21 +1325,17 @@ def buscar_archivos_jep_en_descargas():
 
 def procesar_archivos_manuales():
     """Procesa archivos de JEP manualmente desde la carpeta de descargas"""
+    archivos = []
     try:
         LogManager.escribir_log("INFO", "=" * 60)
         LogManager.escribir_log("INFO", "📁 MODO MANUAL: Procesamiento de archivos JEP")
         LogManager.escribir_log("INFO", "=" * 60)
         
-        # Obtener ID de ejecución
-        id_ejecucion = obtenerIDEjecucion()
+        # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+        id_ejecucion = BaseDatos.registrar_ejecucion(
+            DATABASE_RUNS, "Procesamiento Manual JEP")
         LogManager.iniciar_proceso(NOMBRE_BANCO, id_ejecucion, f"Procesamiento Manual JEP - ID: {id_ejecucion}")
         
-        # Registrar inicio de ejecución
-        sql_inicio = f"""
-            INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) 
-            VALUES ({id_ejecucion}, 'Procesamiento Manual JEP', SYSDATETIME(), 'Running')
-        """
-        datosEjecucion(sql_inicio)
         escribirLog(
             f"Iniciando procesamiento manual {NOMBRE_BANCO}", id_ejecucion, "INFO", "INICIO")
         
@@ -1481,6 +1356,8 @@ def procesar_archivos_manuales():
                 "ERROR", "No se encontraron archivos Excel de JEP en la carpeta de descargas")
             LogManager.escribir_log(
                 "ERROR", "Asegúrate de que los archivos tengan los nombres: jepAutollanta, jepAutollantaT, jepMaxximundo")
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, False, "No se encontraron archivos para el procesamiento manual")
             return False
         
         # Empresas objetivo
@@ -1567,6 +1444,8 @@ def procesar_archivos_manuales():
             LogManager.escribir_log("INFO", "🔧 Ejecutando proceso final...")
             SubprocesoManager.ejecutar_bat_final()
             
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, True, f"Procesamiento manual: {empresas_exitosas}/{empresas_procesadas} empresas exitosas")
             return True
         else:
             sql_error = f"""
@@ -1578,13 +1457,23 @@ def procesar_archivos_manuales():
             escribirLog(
                 f"Error: Procesamiento manual {NOMBRE_BANCO} falló",
                 id_ejecucion, "ERROR", "FIN")
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, False, "Ninguna empresa se procesó correctamente")
             return False
             
     except Exception as e:
         LogManager.escribir_log(
             "ERROR", f"❌ Error en procesamiento manual: {str(e)}")
+        LogManager.finalizar_proceso(
+            NOMBRE_BANCO, False, f"Error en procesamiento manual: {str(e)}")
         return False
 
+    finally:
+        # Los procesados con éxito ya se eliminaron; el resto vuelve a descargas
+        for archivo_info in archivos:
+            if os.path.exists(archivo_info['ruta']):
+                LectorArchivos.conservar(archivo_info['ruta'])
+
 
 # ==================== FUNCIÓN PRINCIPAL ====================
 
@@ -1595,16 +1484,17 @@ def procesar_cuenta_individual(page, usuario, password, id_ejecucion, numero_cue
         LogManager.escribir_log(
             "INFO", f"🔑 Iniciando sesión para cuenta {numero_cuenta}: {usuario}")
 
-        # Navegar a login
-        if not navegar_a_login(page):
-            LogManager.escribir_log(
-                "ERROR", f"Error navegando a login para {usuario}")
-            return False
+        with timeout_manager.fase(f"login:{numero_cuenta}"):
+            # Navegar a login
+            if not navegar_a_login(page):
+                LogManager.escribir_log(
+                    "ERROR", f"Error navegando a login para {usuario}")
+                return False
 
-        # Iniciar sesión
-        if not iniciar_sesion(page, usuario, password):
-            LogManager.escribir_log("ERROR", f"Error en login para {usuario}")
-            return False
+            # Iniciar sesión
+            if not iniciar_sesion(page, usuario, password):
+                LogManager.escribir_log("ERROR", f"Error en login para {usuario}")
+                return False
 
         # Obtener y procesar movimientos
         if not obtener_y_procesar_movimientos(page, id_ejecucion):
@@ -1644,19 +1534,15 @@ def main():
     inicio_ejecucion = datetime.now()
 
     try:
-        # Obtener ID de ejecución
-        id_ejecucion = obtenerIDEjecucion()
+        # Registrar la ejecución: el ID y la fila de inicio en una sola sentencia
+        id_ejecucion = BaseDatos.registrar_ejecucion(
+            DATABASE_RUNS, "Descarga comprobantes-Cooperativa JEP")
         
         LogManager.iniciar_proceso(NOMBRE_BANCO, id_ejecucion, f"Automatización Cooperativa JEP - ID: {id_ejecucion}")
         # Iniciar timeout manager
+        timeout_manager.configurar_ejecucion(DATABASE_RUNS, id_ejecucion)
         timeout_manager.start()
 
-        # Registrar inicio de ejecución
-        sql_inicio = f"""
-            INSERT INTO {DATABASE_RUNS} (idAutomationRun, processName, startDate, finalizationStatus) 
-            VALUES ({id_ejecucion}, 'Descarga comprobantes-Cooperativa JEP', SYSDATETIME(), 'Running')
-        """
-        datosEjecucion(sql_inicio)
         escribirLog(
             f"Iniciando automatización {NOMBRE_BANCO}", id_ejecucion, "INFO", "INICIO")
 
@@ -1670,6 +1556,8 @@ def main():
         if not credenciales_banco:
             LogManager.escribir_log(
                 "ERROR", f"No se encontraron credenciales para {CONFIG_JEP['banco_codigo']}")
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, False, "No se encontraron credenciales")
             return False
 
         LogManager.escribir_log(
@@ -1683,13 +1571,14 @@ def main():
 
             usuario = credencial[1]
             password = credencial[2]
+            PlaywrightManager.registrar_secreto(password)
             LogManager.escribir_log(
                 "INFO", f"🔄 Procesando cuenta {i+1}/{len(credenciales_banco)}: {usuario}")
             LogManager.escribir_log("INFO", "=" * 40)
 
             # Inicializar Playwright con timeout aumentado (la página tarda ~85 segundos)
             manager = PlaywrightManager(
-                headless=True, download_path=RUTAS_CONFIG['descargas'], timeout=100000)
+                headless=True, download_path=EspacioTrabajo.actual(), timeout=100000)
             playwright, browser, context, page = manager.iniciar_navegador()
 
             try:
@@ -1765,6 +1654,8 @@ def main():
             LogManager.escribir_log("INFO", "🔧 Ejecutando proceso final...")
             SubprocesoManager.ejecutar_bat_final()
 
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, True, f"{cuentas_exitosas}/{len(credenciales_banco)} cuentas exitosas ({estado_final})")
             return True
         else:
             LogManager.escribir_log(
@@ -1784,6 +1675,8 @@ def main():
             LogManager.escribir_log("INFO", "🔧 Ejecutando proceso final...")
             SubprocesoManager.ejecutar_bat_final()
 
+            LogManager.finalizar_proceso(
+                NOMBRE_BANCO, False, "Todas las cuentas fallaron")
             return False
 
     except Exception as e:
@@ -1806,6 +1699,8 @@ def main():
             LogManager.escribir_log("INFO", "🔧 Ejecutando proceso final de emergencia...")
             SubprocesoManager.ejecutar_bat_final()
 
+        LogManager.finalizar_proceso(
+            NOMBRE_BANCO, False, f"Error en proceso principal: {str(e)}")
         return False
 
     finally:
@@ -1819,12 +1714,23 @@ def main():
         LogManager.escribir_log("INFO", "=" * 60)
 
 
-if __name__ == "__main__":
+# ==================== PUNTO DE ENTRADA ====================
+def ejecutar(argumentos=None):
+    """
+    Punto de entrada de línea de comandos (usado también por orquestador.py)
+
+    Args:
+        argumentos: Lista de argumentos al estilo sys.argv (por defecto sys.argv)
+
+    Returns:
+        int: Código de salida del proceso (0 = éxito)
+    """
+    argumentos = sys.argv if argumentos is None else argumentos
     try:
         # Verificar si se solicita modo manual
         modo_manual = False
-        if len(sys.argv) > 1:
-            if sys.argv[1] in ['--manual', '-m', 'manual']:
+        if len(argumentos) > 1:
+            if argumentos[1] in ['--manual', '-m', 'manual']:
                 modo_manual = True
                 LogManager.escribir_log(
                     "INFO", "🔧 Modo manual activado: Procesando archivos desde carpeta de descargas")
@@ -1835,27 +1741,35 @@ if __name__ == "__main__":
             if exito:
                 LogManager.escribir_log(
                     "SUCCESS", f"Procesamiento manual {NOMBRE_BANCO} finalizado exitosamente")
-                sys.exit(0)
+                return 0
             else:
                 LogManager.escribir_log(
                     "ERROR", f"Procesamiento manual {NOMBRE_BANCO} finalizado con errores")
-                sys.exit(1)
+                return 1
         else:
             # Ejecutar proceso normal
             exito = main()
             if exito:
                 LogManager.escribir_log(
                     "SUCCESS", f"Robot {NOMBRE_BANCO} finalizado exitosamente")
-                sys.exit(0)
+                return 0
             else:
                 LogManager.escribir_log(
                     "ERROR", f"Robot {NOMBRE_BANCO} finalizado con errores")
-                sys.exit(1)
+                return 1
+    except CancelacionPorTiempo as e:
+        LogManager.finalizar_proceso(NOMBRE_BANCO, False, f"Proceso cancelado: {str(e)}")
+        return 1
     except KeyboardInterrupt:
         LogManager.escribir_log(
             "WARNING", f"Robot {NOMBRE_BANCO} interrumpido por el usuario")
-        sys.exit(1)
+        LogManager.finalizar_proceso(NOMBRE_BANCO, False, "Proceso interrumpido por el usuario")
+        return 1
     except Exception as e:
         LogManager.escribir_log(
             "ERROR", f"Error fatal en robot {NOMBRE_BANCO}: {str(e)}")
-        sys.exit(1)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(ejecutar())
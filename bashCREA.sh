@@ -1,34 +1,13 @@
 #!/bin/bash
 
-# Configurar variables de entorno para headless
-export DISPLAY=:99
+# Sin DISPLAY fijo: los navegadores con ventana levantan su propio Xvfb en un
+# display libre (PantallaVirtual en componentes_comunes.py), que muere con el
+# proceso; los headless no usan display. Así varios bots pueden solaparse.
 export XVFB_WHD=${XVFB_WHD:-1920x1080x24}
 
-# Función para verificar si xvfb está corriendo
-check_xvfb() {
-    if pgrep -f "Xvfb :99" > /dev/null; then
-        echo "✅ Xvfb ya está corriendo en :99"
-        return 0
-    else
-        echo "🚀 Iniciando Xvfb en :99"
-        # Configuración mejorada para Xvfb
-        Xvfb :99 -screen 0 $XVFB_WHD -ac +extension GLX +render -noreset -dpi 96 2>/dev/null &
-        sleep 3
-        
-        if pgrep -f "Xvfb :99" > /dev/null; then
-            echo "✅ Xvfb iniciado correctamente"
-            return 0
-        else
-            echo "❌ Error iniciando Xvfb"
-            return 1
-        fi
-    fi
-}
-
 # Función de limpieza
 cleanup() {
     echo "🧹 Limpiando procesos..."
-    pkill -f "Xvfb :99" 2>/dev/null
     pkill -f "python.*CooperativaCREA" 2>/dev/null
 }
 
@@ -41,12 +20,6 @@ cd /home/administrador/Escritorio/bancos || exit 1
 # Activar entorno virtual
 source ../venv/bin/activate || exit 1
 
-# Verificar/iniciar Xvfb
-if ! check_xvfb; then
-    echo "❌ No se pudo iniciar Xvfb"
-    exit 1
-fi
-
 echo "🚀 Iniciando automatización en modo headless..."
 
 # Ejecutar el script con timeout de 15 minutos
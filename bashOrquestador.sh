@@ -0,0 +1,27 @@
+#!/bin/bash
+
+# Lanzador del orquestador: ejecuta varios robots en paralelo desde un solo proceso.
+# El orquestador aplica el timeout de cada robot; los robots con navegador visible
+# inician su propio Xvfb (o uno compartido en :99 con --xvfb-compartido).
+# Uso: ./bashOrquestador.sh [--bancos guayaquil produbanco] [--concurrencia 2] [--xvfb-compartido]
+
+# Cambiar al directorio
+cd /home/administrador/Escritorio/bancos || exit 1
+
+# Activar entorno virtual
+source ../venv/bin/activate || exit 1
+
+echo "🚀 Iniciando orquestador de robots..."
+
+python orquestador.py "$@"
+
+# Capturar código de salida
+exit_code=$?
+
+if [ $exit_code -eq 0 ]; then
+    echo "✅ Todos los robots terminaron exitosamente"
+else
+    echo "❌ Algún robot terminó con error (código $exit_code)"
+fi
+
+exit $exit_code
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+BASE DE DATOS LOCAL PARA BENCHMARKS
+
+Usa el motor SQLite de BaseDatos (mismo esquema RegistrosBancos /
+AutomationRun / AutomationLog) sobre un archivo temporal. consultarBD y
+ejecutarSQL siguen siendo los reales (una conexión por consulta), de modo que
+el costo medido por viaje refleja el del código de producción sin la red.
+El registro de archivos ingeridos (LedgerArchivos) también se redirige al
+directorio temporal y se vacía con la base, para que cada medición procese
+el archivo completo.
+"""
+import os
+
+from componentes_comunes import BaseDatos
+
+
+class BDLocal:
+    """Base SQLite temporal para un benchmark"""
+
+    def __init__(self, directorio):
+        self.ruta = os.path.join(directorio, "bench.sqlite")
+        self.ruta_ledger = os.path.join(directorio, "ledger.sqlite")
+        self._anterior = None
+
+    def reiniciar(self):
+        """Borra la base y el registro de archivos; el esquema se recrea en la siguiente conexión"""
+        for ruta in (self.ruta, self.ruta_ledger):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        BaseDatos._esquemas_creados.discard(self.ruta)
+
+    def instalar(self):
+        """Selecciona el motor SQLite apuntando a la base temporal"""
+        self._anterior = (BaseDatos.motor, BaseDatos.ruta_sqlite, os.environ.get("RPA_LEDGER"))
+        BaseDatos.configurar_motor("sqlite", self.ruta)
+        os.environ["RPA_LEDGER"] = self.ruta_ledger
+
+    def desinstalar(self):
+        """Restaura el motor anterior"""
+        if self._anterior:
+            motor, ruta_sqlite, ledger = self._anterior
+            BaseDatos.configurar_motor(motor, ruta_sqlite)
+            if ledger is None:
+                os.environ.pop("RPA_LEDGER", None)
+            else:
+                os.environ["RPA_LEDGER"] = ledger
+            self._anterior = None
+
+    def contar_registros(self):
+        """Filas en RegistrosBancos"""
+        resultado = BaseDatos.consultarBD("SELECT COUNT(*) FROM RegistrosBancos")
+        return resultado[0][0] if resultado else 0
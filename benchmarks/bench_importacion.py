@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK DE IMPORTACIÓN
+
+Mide el costo de arranque (tiempo de import y memoria residente) de
+componentes_comunes y de cada bot, cada medición en un intérprete nuevo, y
+lista qué dependencias pesadas quedaron cargadas. Los bots que solo leen
+archivos (Bolivariano, Pichincha) no deberían cargar ninguna.
+
+    - La fila "(intérprete)" es la línea base de un Python vacío.
+    - Se reporta la mediana de --repeticiones ejecuciones.
+    - Con --estricto el proceso termina con código 1 si un bot de solo archivos
+      carga una dependencia pesada o si algún módulo supera --max-ms.
+
+Uso:
+    python benchmarks/bench_importacion.py
+    python benchmarks/bench_importacion.py --modulos componentes_comunes BancoBolivariano_Final --repeticiones 10
+    python benchmarks/bench_importacion.py --estricto --max-ms 300 --json importacion.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_POR_DEFECTO = [
+    'componentes_comunes',
+    'BancoBolivariano_Final',
+    '2BancoPichincha_Final',
+    'BancoProdubanco_Final',
+    'BancoGuayaquil_Final',
+    'CooperativaJEP_Final',
+    'CooperativaCREA_Final',
+]
+MODULOS_SOLO_ARCHIVOS = {'BancoBolivariano_Final', '2BancoPichincha_Final'}
+DEPENDENCIAS_PESADAS = ['pandas', 'numpy', 'openpyxl', 'pyodbc', 'playwright', 'imaplib', 'email']
+
+# Se ejecuta en un intérprete nuevo: argv[1] = módulo ("" para la línea base)
+CODIGO_MEDICION = """
+import sys, time, json, resource, importlib
+inicio = time.perf_counter()
+if sys.argv[1]:
+    importlib.import_module(sys.argv[1])
+duracion = time.perf_counter() - inicio
+print(json.dumps({
+    "ms": duracion * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "pesados": [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def medir_una_vez(modulo):
+    """
+    Importa el módulo en un proceso nuevo
+
+    Returns:
+        dict: ms, rss_mb, pesados; o error si la importación falló
+    """
+    proceso = subprocess.run(
+        [sys.executable, "-c", CODIGO_MEDICION, modulo, json.dumps(DEPENDENCIAS_PESADAS)],
+        cwd=RAIZ, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        ultima_linea = (proceso.stderr.strip().splitlines() or ["error desconocido"])[-1]
+        return {"error": ultima_linea}
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def medir(modulo, repeticiones):
+    """
+    Mediana de varias importaciones del módulo
+
+    Returns:
+        dict: modulo, ms, rss_mb, pesados, error
+    """
+    muestras = []
+    for _ in range(repeticiones):
+        muestra = medir_una_vez(modulo)
+        if "error" in muestra:
+            return {"modulo": modulo or "(intérprete)", "ms": None, "rss_mb": None,
+                    "pesados": [], "error": muestra["error"]}
+        muestras.append(muestra)
+    return {
+        "modulo": modulo or "(intérprete)",
+        "ms": round(statistics.median(m["ms"] for m in muestras), 1),
+        "rss_mb": round(statistics.median(m["rss_mb"] for m in muestras), 1),
+        "pesados": muestras[-1]["pesados"],
+        "error": None,
+    }
+
+
+def imprimir_tabla(resultados):
+    """Muestra los resultados en formato tabla"""
+    print(f"{'Módulo':<24} {'ms':>9} {'RSS MB':>8}  Dependencias pesadas cargadas")
+    for r in resultados:
+        if r["error"]:
+            print(f"{r['modulo']:<24} {'-':>9} {'-':>8}  ERROR: {r['error']}")
+            continue
+        print(f"{r['modulo']:<24} {r['ms']:>9.1f} {r['rss_mb']:>8.1f}  {', '.join(r['pesados']) or '-'}")
+
+
+def infracciones(resultados, max_ms=None):
+    """
+    Reglas de --estricto
+
+    Returns:
+        list: Descripción de cada infracción
+    """
+    encontradas = []
+    for r in resultados:
+        if r["error"]:
+            continue
+        if r["modulo"] in MODULOS_SOLO_ARCHIVOS and r["pesados"]:
+            encontradas.append(f"{r['modulo']} carga {', '.join(r['pesados'])}")
+        if max_ms is not None and r["ms"] > max_ms:
+            encontradas.append(f"{r['modulo']} tarda {r['ms']} ms (máximo {max_ms} ms)")
+    return encontradas
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark del tiempo de importación de los bots")
+    parser.add_argument("--modulos", nargs="+", default=MODULOS_POR_DEFECTO,
+                        help="Módulos a importar (por defecto componentes_comunes y todos los bots)")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Importaciones por módulo (se usa la mediana)")
+    parser.add_argument("--max-ms", type=float, help="Tiempo máximo de importación aceptado con --estricto")
+    parser.add_argument("--estricto", action="store_true",
+                        help="Salir con código 1 si hay infracciones (para CI)")
+    parser.add_argument("--json", help="Ruta donde guardar los resultados en JSON")
+    args = parser.parse_args(argumentos)
+
+    resultados = [medir(modulo, args.repeticiones) for modulo in [""] + args.modulos]
+    imprimir_tabla(resultados)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+
+    encontradas = infracciones(resultados, args.max_ms)
+    if encontradas:
+        print("\n⚠️ " + "\n⚠️ ".join(encontradas))
+        if args.estricto:
+            sys.exit(1)
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
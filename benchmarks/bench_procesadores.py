@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+BENCHMARK DE PROCESADORES DE ARCHIVOS
+
+Mide la velocidad (filas/s) y la memoria pico de cada función procesar_*
+con archivos sintéticos de distintos tamaños contra una base SQLite local.
+
+    - Cada medición usa un archivo y una base recién creados (los procesadores
+      eliminan el archivo de entrada al terminar).
+    - El tiempo se mide sin tracemalloc; la memoria pico se mide en una
+      segunda pasada con tracemalloc (--sin-memoria la omite).
+    - Los logs de los procesadores van a un directorio temporal y no a consola.
+
+Uso:
+    python benchmarks/bench_procesadores.py
+    python benchmarks/bench_procesadores.py --bancos produbanco jep --filas 100 1000
+    python benchmarks/bench_procesadores.py --filas 100 1000 10000 100000 --json resultados.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from componentes_comunes import LogManager, MedidorTiempos, MetricasEjecucion  # noqa: E402
+from generadores import GENERADORES  # noqa: E402
+from bd_local import BDLocal  # noqa: E402
+
+ID_EJECUCION = 1
+FILAS_POR_DEFECTO = [100, 1000, 10000, 100000]
+
+# banco: (módulo, función, argumentos adicionales después de (ruta, id_ejecucion))
+PROCESADORES = {
+    'produbanco': ('BancoProdubanco_Final', 'procesar_archivo_excel', ("EMPRESA BENCH",)),
+    'jep': ('CooperativaJEP_Final', 'procesar_archivo_excel', (1,)),
+    'guayaquil': ('BancoGuayaquil_Final', 'procesar_archivo_excel', ("EMPRESA BENCH",)),
+    'crea': ('CooperativaCREA_Final', 'procesar_archivo_excel', ()),
+    'bolivariano': ('BancoBolivariano_Final', 'procesar_archivo', ()),
+    'pichincha': ('2BancoPichincha_Final', 'procesar_csv_pichincha', ()),
+}
+
+
+def _ejecutar(funcion, ruta, extras, medir_memoria):
+    """Ejecuta el procesador una vez y devuelve (segundos, pico_bytes, resultado)"""
+    MedidorTiempos.reiniciar()
+    MetricasEjecucion.reiniciar()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        if medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(ruta, ID_EJECUCION, *extras)
+        finally:
+            duracion = time.perf_counter() - inicio
+            pico = tracemalloc.get_traced_memory()[1] if medir_memoria else None
+            if medir_memoria:
+                tracemalloc.stop()
+    return duracion, pico, resultado
+
+
+def medir(banco, filas, directorio, bd, medir_memoria=True):
+    """
+    Mide un procesador con un archivo de `filas` filas
+
+    Returns:
+        dict: banco, filas, segundos, filas_por_segundo, memoria_pico_mb,
+              viajes_bd, registros_insertados, resultado
+    """
+    modulo, nombre_funcion, extras = PROCESADORES[banco]
+    funcion = getattr(importlib.import_module(modulo), nombre_funcion)
+
+    bd.reiniciar()
+    ruta = GENERADORES[banco](directorio, filas)
+    duracion, _, resultado = _ejecutar(funcion, ruta, extras, False)
+    viajes = sum(veces for nombre, veces, *_ in MedidorTiempos.resumen()
+                 if nombre in ("bd.consultar", "bd.ejecutar"))
+    insertados = bd.contar_registros()
+
+    pico = None
+    if medir_memoria:
+        bd.reiniciar()
+        ruta = GENERADORES[banco](directorio, filas)
+        _, pico, _ = _ejecutar(funcion, ruta, extras, True)
+
+    if os.path.exists(ruta):
+        os.remove(ruta)
+
+    return {
+        "banco": banco,
+        "filas": filas,
+        "segundos": round(duracion, 3),
+        "filas_por_segundo": round(filas / duracion, 1) if duracion else None,
+        "memoria_pico_mb": round(pico / 1048576, 2) if pico is not None else None,
+        "viajes_bd": viajes,
+        "registros_insertados": insertados,
+        "resultado": bool(resultado),
+    }
+
+
+def imprimir_tabla(resultados):
+    """Muestra los resultados en formato tabla"""
+    print(f"{'Banco':<12} {'Filas':>8} {'Seg':>9} {'Filas/s':>10} {'Pico MB':>9} "
+          f"{'Viajes BD':>10} {'Insertadas':>11} {'OK':>3}")
+    for r in resultados:
+        pico = f"{r['memoria_pico_mb']:.2f}" if r['memoria_pico_mb'] is not None else "-"
+        print(f"{r['banco']:<12} {r['filas']:>8} {r['segundos']:>9.3f} {r['filas_por_segundo'] or 0:>10.1f} "
+              f"{pico:>9} {r['viajes_bd']:>10} {r['registros_insertados']:>11} {'sí' if r['resultado'] else 'no':>3}")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark de los procesadores procesar_*")
+    parser.add_argument("--bancos", nargs="+", choices=sorted(PROCESADORES),
+                        default=list(PROCESADORES), help="Bancos a medir (por defecto todos)")
+    parser.add_argument("--filas", nargs="+", type=int, default=FILAS_POR_DEFECTO,
+                        help=f"Tamaños de archivo (por defecto {FILAS_POR_DEFECTO})")
+    parser.add_argument("--sin-memoria", action="store_true",
+                        help="No medir memoria pico (evita la segunda pasada)")
+    parser.add_argument("--json", help="Ruta donde guardar los resultados en JSON")
+    args = parser.parse_args(argumentos)
+
+    directorio = tempfile.mkdtemp(prefix="rpa_bench_")
+    LogManager._ruta_logs = directorio
+    LogManager.configurar_banco("BENCHMARK")
+    bd = BDLocal(directorio)
+    bd.instalar()
+
+    resultados = []
+    try:
+        for banco in args.bancos:
+            for filas in args.filas:
+                print(f"▶️ {banco} - {filas} filas...", flush=True)
+                resultados.append(medir(banco, filas, directorio, bd, not args.sin_memoria))
+    finally:
+        bd.desinstalar()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    print()
+    imprimir_tabla(resultados)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, ensure_ascii=False, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
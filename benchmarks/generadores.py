@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+GENERADORES DE ARCHIVOS SINTÉTICOS
+
+Reproducen la estructura de los archivos que descarga cada banco (filas de
+encabezado, fila donde empiezan los datos y columnas que lee cada
+procesador), con datos aleatorios reproducibles (semilla fija).
+
+    Produbanco  -> Excel, datos desde la fila 14, columnas hasta la 19 (T)
+    JEP         -> Excel, datos desde la fila 8
+    Guayaquil   -> Excel, datos desde la fila 15
+    CREA        -> Excel, datos desde la fila 9
+    Bolivariano -> TXT separado por tabulaciones, datos tras la línea 7
+    Pichincha   -> CSV con encabezado
+
+Uso:
+    from generadores import GENERADORES
+    ruta = GENERADORES['produbanco'](directorio, 10000)
+"""
+import os
+import csv
+import random
+from datetime import datetime, timedelta
+
+import openpyxl
+
+CUENTA_BENCH = "9990001111"
+EMPRESA_BENCH = "EMPRESA BENCH CIA LTDA"
+DIAS_VENTANA = 25  # Los movimientos caen en los últimos N días
+
+
+# ==================== UTILIDADES ====================
+def _escribir_excel(ruta, filas):
+    """Escribe las filas en un .xlsx (modo write_only, apto para 100k filas)"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for fila in filas:
+        ws.append(fila)
+    wb.save(ruta)
+    wb.close()
+    return ruta
+
+
+def _fila_vacia(columnas):
+    return [""] * columnas
+
+
+def _movimientos(filas, semilla):
+    """
+    Genera movimientos base ordenados por fecha
+
+    Returns:
+        list: [(fecha, es_credito, valor, saldo, secuencia)]
+    """
+    aleatorio = random.Random(semilla)
+    inicio = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(days=DIAS_VENTANA)
+    paso = (DIAS_VENTANA * 86400) / max(filas, 1)
+    saldo = 50000.0
+    movimientos = []
+    for i in range(filas):
+        fecha = inicio + timedelta(seconds=int(i * paso))
+        es_credito = aleatorio.random() < 0.45
+        valor = round(aleatorio.uniform(1, 5000), 2)
+        saldo = round(saldo + valor if es_credito else saldo - valor, 2)
+        movimientos.append((fecha, es_credito, valor, saldo, i + 1))
+    return movimientos
+
+
+# ==================== GENERADORES POR BANCO ====================
+def generar_produbanco(directorio, filas, semilla=0):
+    """Excel Produbanco: empresa en M9, cuenta en F9, datos desde la fila 14 (20 columnas)"""
+    contenido = [_fila_vacia(20) for _ in range(13)]
+    contenido[0][0] = "PRODUBANCO - ESTADO DE CUENTA"
+    contenido[8][5] = CUENTA_BENCH
+    contenido[8][12] = EMPRESA_BENCH
+    contenido[12] = [f"COL{i}" for i in range(20)]
+
+    for fecha, es_credito, valor, saldo, secuencia in _movimientos(filas, semilla):
+        fila = _fila_vacia(20)
+        fila[3] = fecha.strftime("%Y-%m-%d %H:%M:%S")
+        fila[7] = f"TRANSFERENCIA {secuencia}"
+        fila[8] = "(+)" if es_credito else "(-)"
+        fila[10] = f"{valor:,.2f}"
+        fila[13] = f"{saldo:,.2f}"
+        fila[14] = f"{saldo:,.2f}"
+        fila[15] = "MATRIZ"
+        fila[18] = f"REF{secuencia}"
+        fila[19] = f"DOC{secuencia:08d}"
+        contenido.append(fila)
+
+    return _escribir_excel(os.path.join(directorio, f"produbanco_{filas}.xlsx"), contenido)
+
+
+def generar_jep(directorio, filas, semilla=0):
+    """Excel JEP: cuenta en A4, empresa en A5, datos desde la fila 8 (7 columnas)"""
+    contenido = [_fila_vacia(7) for _ in range(7)]
+    contenido[0][0] = "COOPERATIVA JEP"
+    contenido[3][0] = f"Cuenta: {CUENTA_BENCH}"
+    contenido[4][0] = EMPRESA_BENCH
+    contenido[6] = ["FECHA", "TIPO", "DOCUMENTO", "DESCRIPCION", "AGENCIA", "MONTO", "SALDO"]
+
+    for fecha, es_credito, valor, saldo, secuencia in _movimientos(filas, semilla):
+        contenido.append([
+            fecha.strftime("%d/%m/%Y"),
+            "CREDITO" if es_credito else "DEBITO",
+            f"{secuencia:09d}",
+            f"DEPOSITO {secuencia}" if es_credito else f"PAGO {secuencia}",
+            "MATRIZ",
+            f"{valor:.2f}",
+            f"{saldo:.2f}",
+        ])
+
+    return _escribir_excel(os.path.join(directorio, f"jep_{filas}.xlsx"), contenido)
+
+
+def generar_guayaquil(directorio, filas, semilla=0):
+    """Excel Guayaquil: cuenta en A7 ('Cuenta: N'), datos desde la fila 15 (14 columnas)"""
+    contenido = [_fila_vacia(14) for _ in range(14)]
+    contenido[0][0] = "BANCO GUAYAQUIL"
+    contenido[6][0] = f"Cuenta: {CUENTA_BENCH}"
+    contenido[13] = [f"COL{i}" for i in range(14)]
+
+    for fecha, es_credito, valor, saldo, secuencia in _movimientos(filas, semilla):
+        fila = _fila_vacia(14)
+        fila[1] = fecha.strftime("%Y-%m-%d")
+        fila[4] = f"{secuencia:010d}"
+        fila[5] = f"TRANSFERENCIA {secuencia}"
+        fila[6] = "MATRIZ"
+        fila[7] = f"{valor:,.2f}"
+        fila[9] = f"{saldo:,.2f}"
+        fila[10] = f"REF{secuencia}"
+        fila[13] = "+" if es_credito else "-"
+        contenido.append(fila)
+
+    return _escribir_excel(os.path.join(directorio, f"guayaquil_{filas}.xlsx"), contenido)
+
+
+def generar_crea(directorio, filas, semilla=0):
+    """Excel CREA: cuenta en G2, empresa en C3, datos desde la fila 9 (10 columnas)"""
+    contenido = [_fila_vacia(10) for _ in range(8)]
+    contenido[0][0] = "COOPERATIVA CREA"
+    contenido[1][6] = CUENTA_BENCH
+    contenido[2][2] = f"001 - {EMPRESA_BENCH}"
+    contenido[7] = ["#", "FECHA", "TIPO", "CREDITO", "DEBITO", "", "SALDO", "OBSERVACIONES", "DOCUMENTO", "ORDENANTE"]
+
+    for fecha, es_credito, valor, saldo, secuencia in _movimientos(filas, semilla):
+        contenido.append([
+            secuencia,
+            fecha,
+            "N/C TRANSFERENCIA" if es_credito else "N/D PAGO",
+            valor if es_credito else 0,
+            0 if es_credito else valor,
+            "",
+            saldo,
+            f"OBS {secuencia}",
+            secuencia,
+            "ORDENANTE BENCH",
+        ])
+
+    return _escribir_excel(os.path.join(directorio, f"crea_{filas}.xlsx"), contenido)
+
+
+def generar_bolivariano(directorio, filas, semilla=0):
+    """TXT Bolivariano: cuenta en la línea 2, empresa en la 5, encabezado en la 7"""
+    ruta = os.path.join(directorio, f"bolivariano_{filas}.txt")
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        archivo.write("BANCO BOLIVARIANO\tESTADO DE CUENTA\n")
+        archivo.write(f"Cuenta:\t{CUENTA_BENCH}\n")
+        archivo.write("Desde:\t-\n")
+        archivo.write("Hasta:\t-\n")
+        archivo.write(f"Empresa:\t***{EMPRESA_BENCH}***\n")
+        archivo.write("Moneda:\tUSD\n")
+        archivo.write("\t".join(["#", "FECHA", "HORA", "OFICINA", "REFERENCIA", "DOCUMENTO",
+                                 "SIGNO", "VALOR", "DISPONIBLE", "SALDO"]) + "\n")
+        for fecha, es_credito, valor, saldo, secuencia in _movimientos(filas, semilla):
+            archivo.write("\t".join([
+                str(secuencia),
+                fecha.strftime("%m/%d/%Y"),
+                fecha.strftime("%H:%M"),
+                "MATRIZ",
+                f"REF{secuencia}",
+                f"{secuencia:010d}",
+                "+" if es_credito else "-",
+                f"{valor:,.2f}",
+                f"{saldo:,.2f}",
+                f"{saldo:,.2f}",
+            ]) + "\n")
+    return ruta
+
+
+def generar_pichincha(directorio, filas, semilla=0):
+    """
+    CSV Pichincha (nombre 'au...' -> AUTOLLANTA). Un 5% de las filas tiene más
+    de 30 días para que el archivo no sea rechazado por tener 0 omitidos.
+    """
+    ruta = os.path.join(directorio, f"au_bench_{filas}.csv")
+    antigua = datetime.now() - timedelta(days=40)
+    with open(ruta, 'w', encoding='utf-8', newline='') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(["Fecha", "Documento", "Tipo", "Monto", "Saldo", "Oficina", "Concepto"])
+        for fecha, es_credito, valor, saldo, secuencia in _movimientos(filas, semilla):
+            if secuencia % 20 == 0:
+                fecha = antigua
+            escritor.writerow([
+                fecha.strftime("%d/%m/%Y"),
+                str(secuencia),
+                "C" if es_credito else "D",
+                f"{valor:,.2f}",
+                f"{saldo:,.2f}",
+                "MATRIZ",
+                f"TRANSFERENCIA {secuencia}",
+            ])
+    return ruta
+
+
+GENERADORES = {
+    'produbanco': generar_produbanco,
+    'jep': generar_jep,
+    'guayaquil': generar_guayaquil,
+    'crea': generar_crea,
+    'bolivariano': generar_bolivariano,
+    'pichincha': generar_pichincha,
+}
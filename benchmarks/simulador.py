@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+SIMULADOR DE PORTALES BANCARIOS E IMAP
+
+Servidor HTTP local que reproduce el login, el código de seguridad (OTP), el
+selector de empresas y la exportación de cada portal a partir de plantillas
+HTML (benchmarks/portal_simulado/), junto con un servidor IMAP falso donde
+llegan los correos con el código. Permite medir el tiempo de punta a punta de
+un bot y comparar estrategias de espera de forma reproducible.
+
+    - Los bots no cambian sus URLs: con RPA_PORTAL_SIMULADO, PlaywrightManager
+      reenvía https://host/ruta a {simulador}/host/ruta.
+    - Con RPA_IMAP_SIMULADO, CorreoManager se conecta a este IMAP sin SSL y con
+      cualquier usuario/clave.
+    - Cada respuesta HTTP se retrasa --latencia ms ± --jitter ms.
+    - El correo OTP es visible --retraso-otp segundos después del login.
+    - /__sim/descargar devuelve un archivo de benchmarks/generadores.py con
+      --filas movimientos por empresa.
+
+Uso:
+    python benchmarks/simulador.py --latencia 150 --jitter 50 --filas 500
+
+    # en otra terminal
+    export RPA_PORTAL_SIMULADO=http://127.0.0.1:8765
+    export RPA_IMAP_SIMULADO=127.0.0.1:8143
+    export RPA_BD_MOTOR=sqlite
+    python BancoGuayaquil_Final.py
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import tempfile
+import threading
+import unicodedata
+import socketserver
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generadores import GENERADORES  # noqa: E402
+
+DIRECTORIO_PLANTILLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "portal_simulado")
+
+# host del portal: (banco en GENERADORES, plantilla, asunto del correo OTP o None)
+PORTALES = {
+    'empresas.bancoguayaquil.com': ('guayaquil', 'guayaquil.html', "Código para ingresar a tu Banca Empresas"),
+    'cashmanagement.produbanco.com': ('produbanco', 'produbanco.html', None),
+}
+
+TIPOS_CONTENIDO = {
+    '.xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    '.csv': "text/csv",
+    '.txt': "text/plain",
+}
+
+
+# ==================== BUZÓN COMPARTIDO ====================
+class Buzon:
+    """Correos entregados por el portal y leídos por el IMAP falso"""
+
+    def __init__(self, retraso_otp=2.0):
+        self.retraso_otp = retraso_otp
+        self._lock = threading.Lock()
+        self._correos = []  # [(visible_desde, asunto_normalizado, bytes)]
+        self._codigos = {}
+
+    @staticmethod
+    def normalizar(texto):
+        """Minúsculas y sin tildes, para que SEARCH SUBJECT 'Codigo' encuentre 'Código'"""
+        descompuesto = unicodedata.normalize("NFKD", texto or "")
+        return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+    def enviar_otp(self, host, asunto):
+        """Genera un código de 6 dígitos y lo entrega tras el retraso configurado"""
+        codigo = f"{random.randint(0, 999999):06d}"
+        visible_desde = time.time() + self.retraso_otp
+
+        mensaje = EmailMessage()
+        mensaje["From"] = f"notificaciones@{host}"
+        mensaje["To"] = "rpa@simulador.local"
+        mensaje["Subject"] = asunto
+        # Redondeo hacia arriba: el bot descarta correos anteriores a su inicio
+        mensaje["Date"] = formatdate(int(visible_desde) + 1)
+        mensaje["Message-ID"] = make_msgid(domain="simulador.local")
+        mensaje.set_content(f"Tu código de seguridad es: {codigo}\nEste código vence en 5 minutos.")
+
+        with self._lock:
+            self._codigos[host] = codigo
+            self._correos.append((visible_desde, self.normalizar(asunto), mensaje.as_bytes()))
+        return codigo
+
+    def validar_otp(self, host, codigo):
+        with self._lock:
+            return bool(codigo) and self._codigos.get(host) == codigo
+
+    def visibles(self):
+        """Correos ya entregados; el número de secuencia IMAP es la posición + 1"""
+        ahora = time.time()
+        with self._lock:
+            return [(asunto, datos) for visible_desde, asunto, datos in self._correos if visible_desde <= ahora]
+
+
+# ==================== PORTAL HTTP ====================
+class ManejadorPortal(BaseHTTPRequestHandler):
+    """Atiende /{host}/{ruta}; cualquier ruta que no sea /__sim/* devuelve la plantilla del portal"""
+
+    protocol_version = "HTTP/1.1"
+    simulador = None
+
+    def log_message(self, formato, *args):
+        if self.simulador.verboso:
+            super().log_message(formato, *args)
+
+    def do_GET(self):
+        self._atender()
+
+    def do_POST(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        if longitud:
+            self.rfile.read(longitud)
+        self._atender()
+
+    def _atender(self):
+        self.simulador.esperar_latencia()
+        url = urlsplit(self.path)
+        host, _, ruta = url.path.lstrip("/").partition("/")
+        if host not in PORTALES:
+            self._responder(404, b"Portal no simulado", "text/plain; charset=utf-8")
+            return
+
+        banco, plantilla, asunto_otp = PORTALES[host]
+        parametros = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if ruta == "__sim/otp":
+            if asunto_otp:
+                self.simulador.buzon.enviar_otp(host, asunto_otp)
+            self._responder_json({"enviado": bool(asunto_otp)})
+        elif ruta == "__sim/otp/validar":
+            self._responder_json({"valido": self.simulador.buzon.validar_otp(host, parametros.get("codigo"))})
+        elif ruta == "__sim/consulta":
+            self._responder_json({"filas": self.simulador.filas})
+        elif ruta == "__sim/descargar":
+            nombre, datos = self.simulador.archivo(banco, parametros.get("empresa", ""))
+            extension = os.path.splitext(nombre)[1]
+            self._responder(200, datos, TIPOS_CONTENIDO.get(extension, "application/octet-stream"),
+                            {"Content-Disposition": f'attachment; filename="{nombre}"'})
+        else:
+            with open(os.path.join(DIRECTORIO_PLANTILLAS, plantilla), 'rb') as archivo:
+                self._responder(200, archivo.read(), "text/html; charset=utf-8")
+
+    def _responder_json(self, datos):
+        self._responder(200, json.dumps(datos).encode("utf-8"), "application/json")
+
+    def _responder(self, estado, cuerpo, tipo, cabeceras=None):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("Cache-Control", "no-store")
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+# ==================== IMAP FALSO ====================
+class ManejadorIMAP(socketserver.StreamRequestHandler):
+    """
+    Subconjunto de IMAP4rev1 que usa CorreoManager: CAPABILITY, LOGIN, SELECT,
+    SEARCH (ALL/SUBJECT), FETCH (RFC822), STORE, NOOP, CLOSE y LOGOUT.
+    Acepta cualquier usuario y clave.
+    """
+
+    buzon = None
+
+    def _enviar(self, linea):
+        self.wfile.write(linea.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        self._enviar("* OK [CAPABILITY IMAP4rev1] Simulador IMAP listo")
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                return
+            partes = linea.decode("utf-8", errors="replace").strip().split(" ", 2)
+            if len(partes) < 2:
+                continue
+            etiqueta, comando = partes[0], partes[1].upper()
+            argumentos = partes[2] if len(partes) > 2 else ""
+
+            if comando == "LOGOUT":
+                self._enviar("* BYE Simulador IMAP cerrando")
+                self._enviar(f"{etiqueta} OK LOGOUT completado")
+                return
+            if comando == "CAPABILITY":
+                self._enviar("* CAPABILITY IMAP4rev1")
+            elif comando in ("SELECT", "EXAMINE"):
+                self._enviar(f"* {len(self.buzon.visibles())} EXISTS")
+                self._enviar("* 0 RECENT")
+                self._enviar("* FLAGS (\\Seen)")
+                self._enviar(f"{etiqueta} OK [READ-WRITE] {comando} completado")
+                continue
+            elif comando == "SEARCH":
+                self._enviar("* SEARCH " + " ".join(self._buscar(argumentos)))
+            elif comando == "FETCH":
+                if not self._fetch(argumentos):
+                    self._enviar(f"{etiqueta} BAD FETCH inválido")
+                    continue
+            elif comando not in ("LOGIN", "NOOP", "STORE", "CLOSE", "EXPUNGE"):
+                self._enviar(f"{etiqueta} BAD Comando no soportado por el simulador")
+                continue
+            self._enviar(f"{etiqueta} OK {comando} completado")
+
+    def _buscar(self, argumentos):
+        correos = self.buzon.visibles()
+        criterio = argumentos.strip()
+        if criterio.upper().startswith("SUBJECT"):
+            buscado = Buzon.normalizar(criterio[len("SUBJECT"):].strip().strip('"'))
+            return [str(i + 1) for i, (asunto, _) in enumerate(correos) if buscado in asunto]
+        return [str(i + 1) for i in range(len(correos))]
+
+    def _fetch(self, argumentos):
+        numero = argumentos.split(" ", 1)[0]
+        correos = self.buzon.visibles()
+        if not numero.isdigit() or not 1 <= int(numero) <= len(correos):
+            return False
+        datos = correos[int(numero) - 1][1]
+        self.wfile.write(f"* {numero} FETCH (RFC822 {{{len(datos)}}}\r\n".encode("ascii") + datos + b")\r\n")
+        return True
+
+
+class ServidorIMAP(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+# ==================== SIMULADOR ====================
+class Simulador:
+    """Portal HTTP + IMAP falso compartiendo el mismo buzón"""
+
+    def __init__(self, host="127.0.0.1", puerto_http=8765, puerto_imap=8143,
+                 latencia=0, jitter=0, filas=200, retraso_otp=2.0, verboso=False):
+        self.host = host
+        self.puerto_http = puerto_http
+        self.puerto_imap = puerto_imap
+        self.latencia = latencia
+        self.jitter = jitter
+        self.filas = filas
+        self.verboso = verboso
+        self.buzon = Buzon(retraso_otp)
+        self._archivos = {}
+        self._lock = threading.Lock()
+        self._directorio = tempfile.mkdtemp(prefix="rpa_simulador_")
+        self._servidores = []
+
+    def esperar_latencia(self):
+        """Retraso de red simulado: latencia ± jitter (ms), nunca negativo"""
+        retraso = self.latencia + random.uniform(-self.jitter, self.jitter)
+        if retraso > 0:
+            time.sleep(retraso / 1000)
+
+    def archivo(self, banco, empresa):
+        """
+        Archivo exportado para la empresa (se genera una vez y se reutiliza)
+
+        Returns:
+            tuple: (nombre_sugerido, bytes)
+        """
+        clave = (banco, empresa)
+        with self._lock:
+            if clave not in self._archivos:
+                ruta = GENERADORES[banco](self._directorio, self.filas, semilla=zlib.crc32(empresa.encode("utf-8")))
+                with open(ruta, 'rb') as archivo:
+                    self._archivos[clave] = (os.path.basename(ruta), archivo.read())
+                os.remove(ruta)
+            return self._archivos[clave]
+
+    def iniciar(self):
+        """Levanta ambos servidores en hilos daemon"""
+        ManejadorPortal.simulador = self
+        ManejadorIMAP.buzon = self.buzon
+        http = ThreadingHTTPServer((self.host, self.puerto_http), ManejadorPortal)
+        http.daemon_threads = True
+        imap = ServidorIMAP((self.host, self.puerto_imap), ManejadorIMAP)
+        for servidor in (http, imap):
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self._servidores = [http, imap]
+        return self
+
+    def detener(self):
+        for servidor in self._servidores:
+            servidor.shutdown()
+            servidor.server_close()
+        self._servidores = []
+
+    @property
+    def url_portal(self):
+        return f"http://{self.host}:{self.puerto_http}"
+
+    @property
+    def direccion_imap(self):
+        return f"{self.host}:{self.puerto_imap}"
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Simulador local de portales bancarios e IMAP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto-http", type=int, default=8765)
+    parser.add_argument("--puerto-imap", type=int, default=8143)
+    parser.add_argument("--latencia", type=float, default=0, help="Latencia por respuesta HTTP en ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Variación aleatoria de la latencia en ms")
+    parser.add_argument("--filas", type=int, default=200, help="Movimientos por archivo exportado")
+    parser.add_argument("--retraso-otp", type=float, default=2.0,
+                        help="Segundos hasta que el correo OTP es visible en el IMAP")
+    parser.add_argument("--semilla", type=int, help="Semilla para la latencia y los códigos OTP")
+    parser.add_argument("--verboso", action="store_true", help="Registrar cada petición HTTP")
+    args = parser.parse_args(argumentos)
+
+    if args.semilla is not None:
+        random.seed(args.semilla)
+
+    simulador = Simulador(args.host, args.puerto_http, args.puerto_imap, args.latencia,
+                          args.jitter, args.filas, args.retraso_otp, args.verboso).iniciar()
+    print(f"Portal simulado: {simulador.url_portal} ({', '.join(PORTALES)})")
+    print(f"IMAP simulado:   {simulador.direccion_imap}")
+    print(f"\n    export RPA_PORTAL_SIMULADO={simulador.url_portal}")
+    print(f"    export RPA_IMAP_SIMULADO={simulador.direccion_imap}\n")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulador.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,45 @@ Centraliza todas las funciones de interacción, lectura de archivos y logs
 """
 
 import os
+import io
 import csv
 import time
 import subprocess
 import json
 import sys
 import re
-import imaplib
-import email
-import pyodbc
-import openpyxl
-import pandas as pd
+import fcntl
+import atexit
+import signal
+import _thread
+import threading
+import sqlite3
+import hashlib
+import shutil
+import tempfile
+import weakref
 from datetime import datetime, date, timedelta
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Dependencias pesadas (playwright, openpyxl, pyodbc, imaplib/email) se importan
+# en el primer uso dentro de la clase que las necesita: los bots que solo leen
+# archivos (Bolivariano, Pichincha) no pagan su costo de arranque.
+# benchmarks/bench_importacion.py vigila el tiempo de importación.
+
+
+def _timeout_playwright():
+    """
+    TimeoutError de Playwright importado al primer uso, para cláusulas except:
+
+        except _timeout_playwright():
+
+    Returns:
+        type: playwright.sync_api.TimeoutError
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+    return PlaywrightTimeoutError
 
 # ==================== ARCHIVOS ====================================
 
@@ -32,16 +58,484 @@ RUTAS_CONFIG = {
     'logs': "/home/administrador/configBancos/logs",
     'bolivariano': "/home/administrador/configBancos/Bolivariano",
     'pichincha': "/home/administrador/configBancos/Pichincha",
-    'bat_final': "/home/administrador/Escritorio/UNION_BANCOS_0.1/UNION_BANCOS/UNION_BANCOS_run.sh"
+    'bat_final': "/home/administrador/Escritorio/UNION_BANCOS_0.1/UNION_BANCOS/UNION_BANCOS_run.sh",
+    'union_estado': "/home/administrador/configBancos/union",
+    'checkpoints': "/home/administrador/configBancos/checkpoints",
+    'metricas': "/home/administrador/configBancos/metricas",
+    'bd_sqlite': "/home/administrador/configBancos/bd/rpa_local.sqlite",
+    'har': "/home/administrador/configBancos/har",
+    'ledger': "/home/administrador/configBancos/bd/ledger_archivos.sqlite",
+    'selectores': "/home/administrador/configBancos/selectores",
+    'navegador': "/home/administrador/configBancos/navegador"
 }
 
+# Ventana de agrupación (debounce) de solicitudes del script de unión, en segundos
+UNION_DEBOUNCE_SEGUNDOS = int(os.environ.get("RPA_UNION_DEBOUNCE", "60"))
+
+# ==================== MEDICIÓN DE TIEMPOS ====================
+
+
+class MedidorTiempos:
+    """
+    Registro de tramos medidos (spans) de la ejecución actual
+
+    Se usa como context manager o decorator:
+
+        with MedidorTiempos.medir("bd.consultar"):
+            ...
+
+        @MedidorTiempos.medido("procesar_archivo_excel")
+        def procesar_archivo_excel(...):
+            ...
+
+    LogManager.iniciar_proceso reinicia el registro y LogManager.finalizar_proceso
+    escribe el resumen en el log y la línea de tiempo (JSON) junto al log.
+    """
+
+    MAX_SPANS = 5000  # Límite de tramos individuales en la línea de tiempo
+
+    _lock = threading.Lock()
+    _local = threading.local()
+    _inicio = time.time()
+    _spans = []
+    _spans_omitidos = 0
+    _agregados = {}
+
+    @classmethod
+    def reiniciar(cls):
+        """Descarta los tramos registrados e inicia una nueva línea de tiempo"""
+        with cls._lock:
+            cls._inicio = time.time()
+            cls._spans = []
+            cls._spans_omitidos = 0
+            cls._agregados = {}
+
+    @classmethod
+    def registrar(cls, nombre, inicio, duracion, **atributos):
+        """
+        Registra un tramo ya medido
+
+        Args:
+            nombre: Nombre del tramo (ej: 'bd.consultar')
+            inicio: time.time() al inicio del tramo
+            duracion: Duración en segundos
+            **atributos: Datos adicionales para la línea de tiempo
+        """
+        MetricasEjecucion.registrar_tramo(nombre, duracion)
+        with cls._lock:
+            agregado = cls._agregados.setdefault(nombre, [0, 0.0, 0.0])
+            agregado[0] += 1
+            agregado[1] += duracion
+            agregado[2] = max(agregado[2], duracion)
+
+            if len(cls._spans) >= cls.MAX_SPANS:
+                cls._spans_omitidos += 1
+                return
+            span = {
+                "nombre": nombre,
+                "inicio": round(inicio - cls._inicio, 4),
+                "duracion": round(duracion, 4),
+                "profundidad": len(getattr(cls._local, "pila", [])),
+                "hilo": threading.current_thread().name,
+            }
+            if atributos:
+                span["atributos"] = atributos
+            cls._spans.append(span)
+
+    @classmethod
+    @contextmanager
+    def medir(cls, nombre, **atributos):
+        """Context manager que mide el bloque y lo registra como tramo"""
+        pila = getattr(cls._local, "pila", None)
+        if pila is None:
+            pila = cls._local.pila = []
+        inicio = time.time()
+        pila.append(nombre)
+        try:
+            yield
+        finally:
+            pila.pop()
+            cls.registrar(nombre, inicio, time.time() - inicio, **atributos)
+
+    @classmethod
+    def medido(cls, nombre=None):
+        """Decorator que mide cada llamada a la función (por defecto con su nombre)"""
+        def decorador(func):
+            nombre_tramo = nombre or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with cls.medir(nombre_tramo):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorador
+
+    @classmethod
+    def resumen(cls):
+        """
+        Resumen agregado por nombre de tramo
+
+        Returns:
+            list: [(nombre, veces, total_s, promedio_s, maximo_s)] ordenado por total
+        """
+        with cls._lock:
+            filas = [(nombre, veces, total, total / veces, maximo)
+                     for nombre, (veces, total, maximo) in cls._agregados.items()]
+        return sorted(filas, key=lambda fila: fila[2], reverse=True)
+
+    @classmethod
+    def guardar_linea_tiempo(cls, ruta, **metadatos):
+        """
+        Escribe la línea de tiempo de la ejecución en JSON
+
+        Args:
+            ruta: Ruta del archivo JSON
+            **metadatos: Datos de la ejecución (banco, id, ...)
+
+        Returns:
+            bool: True si se escribió
+        """
+        try:
+            with cls._lock:
+                datos = dict(metadatos)
+                datos.update({
+                    "inicio": datetime.fromtimestamp(cls._inicio).strftime("%Y-%m-%d %H:%M:%S"),
+                    "duracion": round(time.time() - cls._inicio, 3),
+                    "spans": list(cls._spans),
+                    "spans_omitidos": cls._spans_omitidos,
+                })
+            datos["resumen"] = [
+                {"nombre": n, "veces": v, "total": round(t, 4), "promedio": round(p, 4), "maximo": round(m, 4)}
+                for n, v, t, p, m in cls.resumen()]
+            with open(ruta, 'w', encoding='utf-8') as archivo:
+                json.dump(datos, archivo, ensure_ascii=False, indent=1)
+            return True
+        except Exception as e:
+            LogManager.escribir_log("WARNING", f"Error escribiendo línea de tiempo {ruta}: {str(e)}")
+            return False
+
+# ==================== MÉTRICAS (PROMETHEUS) ====================
+
+
+class MetricasEjecucion:
+    """
+    Métricas de la ejecución actual, exportadas al final en formato textfile
+    de Prometheus (node_exporter --collector.textfile.directory)
+
+    Se alimenta sola desde MedidorTiempos (tramos 'bd.*' y 'correo.*') y
+    TimeoutManager.fase; los scripts solo informan filas y reintentos:
+
+        MetricasEjecucion.registrar_filas(leidas, insertadas, omitidas)
+        MetricasEjecucion.incrementar("login_reintentos")
+
+    LogManager.finalizar_proceso escribe RUTAS_CONFIG['metricas']/rpa_{banco}.prom
+    """
+
+    BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    _lock = threading.Lock()
+    _inicio = time.time()
+    _contadores = {}
+    _fases = {}
+    _latencias = {}
+
+    @classmethod
+    def reiniciar(cls):
+        """Descarta las métricas de una ejecución anterior"""
+        with cls._lock:
+            cls._inicio = time.time()
+            cls._contadores = {}
+            cls._fases = {}
+            cls._latencias = {}
+
+    @classmethod
+    def incrementar(cls, nombre, valor=1):
+        """Suma un valor a un contador (ej: 'login_reintentos', 'otp_espera_segundos')"""
+        with cls._lock:
+            cls._contadores[nombre] = cls._contadores.get(nombre, 0) + valor
+
+    @classmethod
+    def registrar_filas(cls, leidas=0, insertadas=0, omitidas=0):
+        """Acumula las filas leídas, insertadas y omitidas de un archivo/empresa"""
+        cls.incrementar("filas_leidas", leidas or 0)
+        cls.incrementar("filas_insertadas", insertadas or 0)
+        cls.incrementar("filas_omitidas", omitidas or 0)
+
+    @classmethod
+    def registrar_fase(cls, nombre, duracion):
+        """Acumula la duración de una fase ('login', 'descarga:EMPRESA', ...)"""
+        with cls._lock:
+            cls._fases[nombre] = cls._fases.get(nombre, 0.0) + duracion
+
+    @classmethod
+    def registrar_tramo(cls, nombre, duracion):
+        """
+        Interpreta un tramo de MedidorTiempos: los 'bd.*' cuentan como viaje a
+        la base de datos (histograma de latencia) y la lectura del código del
+        correo como espera de OTP
+        """
+        if nombre.startswith("bd."):
+            operacion = nombre[3:]
+            with cls._lock:
+                buckets = cls._latencias.setdefault(
+                    operacion, [[0] * len(cls.BUCKETS_LATENCIA), 0, 0.0])
+                for i, limite in enumerate(cls.BUCKETS_LATENCIA):
+                    if duracion <= limite:
+                        buckets[0][i] += 1
+                buckets[1] += 1
+                buckets[2] += duracion
+        elif nombre == "correo.obtener_codigo":
+            cls.incrementar("otp_espera_segundos", duracion)
+
+    @staticmethod
+    def _etiquetas(**etiquetas):
+        """Formatea etiquetas Prometheus escapando los valores"""
+        partes = []
+        for clave, valor in etiquetas.items():
+            valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            partes.append(f'{clave}="{valor}"')
+        return "{" + ",".join(partes) + "}"
+
+    @classmethod
+    def generar_texto(cls, banco, exito):
+        """
+        Genera el contenido del archivo .prom de la ejecución
+
+        Args:
+            banco: Nombre del banco (etiqueta 'banco')
+            exito: Resultado de la ejecución
+
+        Returns:
+            str: Métricas en formato de exposición de texto
+        """
+        et = cls._etiquetas
+        with cls._lock:
+            duracion = time.time() - cls._inicio
+            contadores = dict(cls._contadores)
+            fases = dict(cls._fases)
+            latencias = {op: (list(b), n, s) for op, (b, n, s) in cls._latencias.items()}
+
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda, muestras):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for sufijo, etiquetas, valor in muestras:
+                lineas.append(f"{nombre}{sufijo}{et(**etiquetas)} {valor}")
+
+        metrica("rpa_ejecucion_duracion_segundos", "gauge",
+                "Duración de la última ejecución del robot",
+                [("", {"banco": banco}, round(duracion, 3))])
+        metrica("rpa_ejecucion_exito", "gauge",
+                "1 si la última ejecución terminó correctamente",
+                [("", {"banco": banco}, 1 if exito else 0)])
+        metrica("rpa_ejecucion_timestamp_segundos", "gauge",
+                "Momento (epoch) en que terminó la última ejecución",
+                [("", {"banco": banco}, int(time.time()))])
+        metrica("rpa_fase_duracion_segundos", "gauge",
+                "Duración por fase de la última ejecución",
+                [("", {"banco": banco, "fase": nombre.split(":")[0],
+                       "detalle": nombre.split(":", 1)[1] if ":" in nombre else ""},
+                  round(segundos, 3))
+                 for nombre, segundos in fases.items()])
+        metrica("rpa_filas", "gauge",
+                "Filas leídas, insertadas y omitidas en la última ejecución",
+                [("", {"banco": banco, "estado": estado}, contadores.get(f"filas_{estado}", 0))
+                 for estado in ("leidas", "insertadas", "omitidas")])
+        metrica("rpa_bd_roundtrips", "gauge",
+                "Viajes a la base de datos en la última ejecución",
+                [("", {"banco": banco, "operacion": op}, n)
+                 for op, (_, n, _) in latencias.items()])
+
+        muestras_latencia = []
+        for op, (buckets, n, suma) in latencias.items():
+            for limite, cantidad in zip(cls.BUCKETS_LATENCIA, buckets):
+                muestras_latencia.append(
+                    ("_bucket", {"banco": banco, "operacion": op, "le": limite}, cantidad))
+            muestras_latencia.append(
+                ("_bucket", {"banco": banco, "operacion": op, "le": "+Inf"}, n))
+            muestras_latencia.append(("_sum", {"banco": banco, "operacion": op}, round(suma, 6)))
+            muestras_latencia.append(("_count", {"banco": banco, "operacion": op}, n))
+        metrica("rpa_bd_latencia_segundos", "histogram",
+                "Latencia de las operaciones de base de datos", muestras_latencia)
+
+        metrica("rpa_login_reintentos", "gauge",
+                "Reintentos de login en la última ejecución",
+                [("", {"banco": banco}, contadores.get("login_reintentos", 0))])
+        metrica("rpa_otp_espera_segundos", "gauge",
+                "Tiempo esperando el código OTP por correo",
+                [("", {"banco": banco}, round(contadores.get("otp_espera_segundos", 0.0), 3))])
+        return "\n".join(lineas) + "\n"
+
+    @classmethod
+    def exportar(cls, banco, exito=True):
+        """
+        Escribe el archivo rpa_{banco}.prom de forma atómica (temporal + rename)
+        para que node_exporter nunca lea un archivo a medias
+
+        Returns:
+            str: Ruta escrita o None si falló
+        """
+        try:
+            directorio = RUTAS_CONFIG['metricas']
+            os.makedirs(directorio, exist_ok=True)
+            nombre = re.sub(r"[^a-z0-9]+", "_", banco.lower()).strip("_")
+            ruta = os.path.join(directorio, f"rpa_{nombre}.prom")
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                archivo.write(cls.generar_texto(banco, exito))
+            os.replace(temporal, ruta)
+            return ruta
+        except Exception as e:
+            LogManager.escribir_log("WARNING", f"Error exportando métricas de {banco}: {str(e)}")
+            return None
+
+# ==================== PANTALLA VIRTUAL (XVFB) ====================
+
+
+class PantallaVirtual:
+    """
+    Display X propio por ejecución para los navegadores con ventana
+    (headless=False) cuando no hay un DISPLAY utilizable.
+
+    Xvfb elige un número de display libre (-displayfd), así varios bots
+    pueden ejecutarse a la vez sin pisarse la pantalla, y recibe SIGTERM del
+    kernel si el bot muere por cualquier motivo (PR_SET_PDEATHSIG), incluso
+    con SIGKILL del `timeout` de los .sh. Los bots headless no lo necesitan.
+    """
+
+    RESOLUCION = os.environ.get("XVFB_WHD", "1920x1080x24")
+    _proceso = None
+
+    @staticmethod
+    def display_vivo(display):
+        """
+        Indica si un DISPLAY es utilizable: remoto (host:n) o con socket local
+
+        Args:
+            display: Valor de DISPLAY (ej: ':99', 'localhost:10.0')
+        """
+        if not display:
+            return False
+        host, _, numero = display.partition(":")
+        if host:
+            return True
+        return os.path.exists(f"/tmp/.X11-unix/X{numero.split('.')[0]}")
+
+    @staticmethod
+    def _morir_con_el_padre():
+        """preexec_fn de Xvfb: SIGTERM automático cuando termina el proceso del bot"""
+        try:
+            import ctypes
+            PR_SET_PDEATHSIG = 1
+            ctypes.CDLL(None, use_errno=True).prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+        except Exception:
+            pass
+
+    @classmethod
+    def asegurar(cls, espera=10):
+        """
+        Deja en os.environ['DISPLAY'] un display utilizable; si el actual no
+        lo es, inicia un Xvfb propio de este proceso
+
+        Args:
+            espera: Segundos máximos esperando a que Xvfb informe su display
+
+        Returns:
+            str: Display en uso o None si no se pudo iniciar Xvfb
+        """
+        actual = os.environ.get("DISPLAY")
+        if cls._proceso and cls._proceso.poll() is None:
+            return actual
+        if cls.display_vivo(actual):
+            return actual
+
+        import select
+        lectura, escritura = os.pipe()
+        try:
+            proceso = subprocess.Popen(
+                ["Xvfb", "-displayfd", str(escritura), "-screen", "0", cls.RESOLUCION,
+                 "-ac", "+extension", "GLX", "+render", "-noreset", "-dpi", "96", "-nolisten", "tcp"],
+                pass_fds=(escritura,),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                preexec_fn=cls._morir_con_el_padre,
+            )
+        except Exception as e:
+            os.close(lectura)
+            LogManager.escribir_log("ERROR", f"No se pudo iniciar Xvfb: {str(e)}")
+            return None
+        finally:
+            os.close(escritura)
+
+        try:
+            listo, _, _ = select.select([lectura], [], [], espera)
+            numero = os.read(lectura, 16).decode().strip() if listo else ""
+        finally:
+            os.close(lectura)
+
+        if not numero.isdigit():
+            LogManager.escribir_log("ERROR", "❌ Xvfb no informó un display libre")
+            cls._terminar(proceso)
+            return None
+
+        cls._proceso = proceso
+        os.environ["DISPLAY"] = f":{numero}"
+        atexit.register(cls.detener)
+        LogManager.escribir_log(
+            "INFO", f"🖥️ Xvfb propio en :{numero} (PID {proceso.pid})")
+        return os.environ["DISPLAY"]
+
+    @staticmethod
+    def _terminar(proceso):
+        try:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+        except Exception:
+            try:
+                proceso.kill()
+            except Exception:
+                pass
+
+    @classmethod
+    def detener(cls):
+        """Detiene el Xvfb de este proceso (no toca un DISPLAY heredado)"""
+        if cls._proceso is None:
+            return
+        cls._terminar(cls._proceso)
+        cls._proceso = None
+        os.environ.pop("DISPLAY", None)
+
 # ==================== COMPONENTES DE NAVEGADOR ====================
 
 
 class PlaywrightManager:
-    """Administrador central de Playwright"""
-
-    def __init__(self, headless=True, download_path=None, timeout=30000):
+    """
+    Administrador central de Playwright
+
+    Modos HAR (RPA_HAR_MODO o parámetro har_modo):
+        - "grabar": guarda la sesión completa en un HAR (RPA_HAR_RUTA o
+          configBancos/har/{banco}_{fecha}.har). Al cerrar el contexto se
+          redactan cabeceras de sesión, campos sensibles y las claves
+          registradas con registrar_secreto().
+        - "reproducir": sirve las respuestas del HAR con route_from_har, sin red.
+          Las peticiones que no estén en el HAR se abortan
+          (RPA_HAR_NO_ENCONTRADO=fallback para dejarlas salir).
+    """
+
+    HAR_MODOS = ("grabar", "reproducir")
+    HAR_REDACTADO = "[REDACTADO]"
+    HAR_CABECERAS_SENSIBLES = {"authorization", "proxy-authorization", "cookie", "set-cookie",
+                               "x-xsrf-token", "x-csrf-token"}
+    HAR_CAMPOS_SENSIBLES = re.compile(
+        r"pass|clave|contrase|pwd|secret|token|otp|code|codigo|auth|session|usuario|user|login", re.IGNORECASE)
+
+    _secretos = set()
+    # Contexto abierto en el navegador del servicio (CDP) -> carpeta de descargas de la ejecución
+    _carpetas_descarga = weakref.WeakKeyDictionary()
+
+    def __init__(self, headless=True, download_path=None, timeout=30000, har_modo=None, har_ruta=None,
+                 cdp_endpoint=None):
         self.headless = headless
         self.download_path = download_path
         self.timeout = timeout
@@ -49,11 +543,25 @@ class PlaywrightManager:
         self.browser = None
         self.context = None
         self.page = None
+        self.har_modo = (har_modo or os.environ.get("RPA_HAR_MODO") or "").lower() or None
+        self.har_ruta = har_ruta or os.environ.get("RPA_HAR_RUTA")
+        self._har_redactado = False
+        # Endpoint CDP de servicio_navegador.py: parámetro, RPA_NAVEGADOR_CDP o
+        # el estado publicado por el servicio; RPA_NAVEGADOR_CDP=0 lo desactiva
+        self.cdp_endpoint = cdp_endpoint or os.environ.get("RPA_NAVEGADOR_CDP")
+        self._lease = None
+        if self.har_modo and self.har_modo not in self.HAR_MODOS:
+            raise ValueError(f"Modo HAR no soportado: {self.har_modo} (usar {', '.join(self.HAR_MODOS)})")
 
-    def iniciar_navegador(self):
-        """Inicia un navegador con Playwright"""
-        self.playwright = sync_playwright().start()
+    @staticmethod
+    def argumentos_chromium(headless):
+        """
+        Argumentos de línea de comandos de Chromium (los mismos para el
+        navegador local y para servicio_navegador.py)
 
+        Returns:
+            list: Argumentos
+        """
         # Configuraciones específicas para Linux
         browser_args = [
             '--no-sandbox',
@@ -66,7 +574,7 @@ class PlaywrightManager:
             '--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         ]
 
-        if self.headless:
+        if headless:
             browser_args.extend([
                 '--disable-extensions',
                 '--disable-plugins',
@@ -75,14 +583,35 @@ class PlaywrightManager:
                 '--disable-backgrounding-occluded-windows',
                 '--disable-renderer-backgrounding'
             ])
+        return browser_args
 
-        # Configurar opciones del navegador
-        browser_options = {
-            'headless': self.headless,
-            'args': browser_args,
-        }
+    @MedidorTiempos.medido("navegador.iniciar")
+    def iniciar_navegador(self):
+        """
+        Inicia un navegador con Playwright. Si servicio_navegador.py está
+        activo se conecta a su Chromium por CDP (sin arranque en frío) y solo
+        crea un contexto propio; si no, lanza Chromium localmente.
+        """
+        from playwright.sync_api import sync_playwright
+
+        self.playwright = sync_playwright().start()
 
-        self.browser = self.playwright.chromium.launch(**browser_options)
+        self.browser = self._conectar_servicio()
+        if self.browser is None:
+            # Configurar opciones del navegador
+            browser_options = {
+                'headless': self.headless,
+                'args': self.argumentos_chromium(self.headless),
+            }
+            if self.download_path:
+                # Descargas temporales del navegador fuera del disco compartido
+                browser_options['downloads_path'] = self.download_path
+            if not self.headless:
+                if not PantallaVirtual.asegurar():
+                    raise RuntimeError("No hay DISPLAY para el navegador con ventana")
+                # El driver de Playwright ya arrancó: pasar el DISPLAY asignado
+                browser_options['env'] = dict(os.environ)
+            self.browser = self.playwright.chromium.launch(**browser_options)
 
         # Crear contexto con configuraciones específicas
         context_options = {
@@ -96,7 +625,44 @@ class PlaywrightManager:
         if self.download_path:
             context_options['accept_downloads'] = True
 
+        if self.har_modo == "grabar":
+            if not self.har_ruta:
+                self.har_ruta = os.path.join(
+                    RUTAS_CONFIG['har'], f"{LogManager._banco_actual.lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.har")
+            os.makedirs(os.path.dirname(self.har_ruta) or ".", exist_ok=True)
+            context_options['record_har_path'] = self.har_ruta
+            context_options['record_har_content'] = "embed"
+            context_options['record_har_mode'] = "full"
+
         self.context = self.browser.new_context(**context_options)
+        if self._lease is not None:
+            # Navegador del servicio (CDP): downloads_path no aplica y el archivo
+            # queda en los artefactos de Playwright; las descargas se guardan
+            # explícitamente en la carpeta de la ejecución (carpeta_descarga)
+            self._carpetas_descarga[self.context] = self.download_path or EspacioTrabajo.actual()
+
+        if self.har_modo == "grabar":
+            # El HAR se escribe al cerrar el contexto: redactar en ese momento
+            # (los bots cierran el contexto directamente) o, como respaldo, al salir
+            self.context.on("close", lambda _: self._redactar_har_grabado())
+            atexit.register(self._guardar_har_pendiente)
+            LogManager.escribir_log("INFO", f"Grabando sesión en HAR: {self.har_ruta}")
+        elif self.har_modo == "reproducir":
+            if not self.har_ruta or not os.path.exists(self.har_ruta):
+                raise FileNotFoundError(f"No existe el HAR a reproducir: {self.har_ruta}")
+            self.context.route_from_har(
+                self.har_ruta, not_found=os.environ.get("RPA_HAR_NO_ENCONTRADO", "abort"))
+            LogManager.escribir_log("WARNING", f"Reproduciendo sesión desde HAR (sin red): {self.har_ruta}")
+
+        # Portal simulado (benchmarks/simulador.py): todo el tráfico del contexto
+        # se reenvía al simulador local sin cambiar las URLs que usan los bots
+        portal_simulado = os.environ.get("RPA_PORTAL_SIMULADO")
+        if portal_simulado:
+            self.context.route(
+                "**/*", lambda route: self._enrutar_a_simulador(route, portal_simulado))
+            LogManager.escribir_log(
+                "WARNING", f"Usando portal simulado: {portal_simulado}")
+
         self.page = self.context.new_page()
 
         # Configurar timeout más alto para headless
@@ -106,13 +672,323 @@ class PlaywrightManager:
 
         return self.playwright, self.browser, self.context, self.page
 
+    def _conectar_servicio(self):
+        """
+        Se conecta por CDP al Chromium de servicio_navegador.py tomando un
+        lease (ServicioNavegador.tomar_lease) que impide reciclarlo mientras
+        este proceso lo use.
+
+        Returns:
+            Browser: Navegador conectado o None (usar el lanzamiento local)
+        """
+        if self.cdp_endpoint == "0":
+            return None
+        endpoint = self.cdp_endpoint
+        estado = None
+        if not endpoint:
+            estado = ServicioNavegador.leer_estado()
+            if not estado or bool(estado.get("headless", True)) != bool(self.headless):
+                return None
+            endpoint = estado["endpoint"]
+
+        self._lease = ServicioNavegador.tomar_lease()
+        if self._lease is None:
+            LogManager.escribir_log(
+                "WARNING", "Servicio de navegador ocupado reciclándose, se lanza Chromium local")
+            return None
+        try:
+            browser = self.playwright.chromium.connect_over_cdp(endpoint, timeout=10000)
+        except Exception as e:
+            ServicioNavegador.liberar_lease(self._lease)
+            self._lease = None
+            LogManager.escribir_log(
+                "WARNING", f"Servicio de navegador no disponible en {endpoint} ({str(e)}), se lanza Chromium local")
+            return None
+
+        if estado:
+            ServicioNavegador.registrar_uso(estado.get("generacion"))
+        browser.on("disconnected", lambda _: self._liberar_lease())
+        LogManager.escribir_log("INFO", f"Conectado al servicio de navegador: {endpoint}")
+        return browser
+
+    def _liberar_lease(self):
+        """Libera el lease del servicio de navegador (al desconectarse)"""
+        ServicioNavegador.liberar_lease(self._lease)
+        self._lease = None
+
+    @classmethod
+    def carpeta_descarga(cls, download):
+        """
+        Carpeta de la ejecución donde guardar una descarga hecha en el
+        navegador del servicio (CDP)
+
+        Args:
+            download: playwright Download
+
+        Returns:
+            str: Carpeta de descargas de la ejecución, o None si el navegador es local
+        """
+        try:
+            return cls._carpetas_descarga.get(download.page.context)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _enrutar_a_simulador(route, base):
+        """
+        Reenvía una petición al simulador: https://host/ruta -> {base}/host/ruta
+
+        Args:
+            route: Ruta interceptada de Playwright
+            base: URL del simulador (ej. http://127.0.0.1:8765)
+        """
+        url = urlsplit(route.request.url)
+        if url.scheme not in ("http", "https") or url.netloc == urlsplit(base).netloc:
+            route.continue_()
+            return
+
+        destino = f"{base.rstrip('/')}/{url.netloc}{url.path or '/'}"
+        if url.query:
+            destino += f"?{url.query}"
+        route.fulfill(response=route.fetch(url=destino))
+
+    @classmethod
+    def registrar_secreto(cls, valor):
+        """
+        Registra un valor (clave, token) que debe borrarse de cualquier HAR grabado
+
+        Args:
+            valor: Texto a redactar; se ignoran valores de menos de 4 caracteres
+        """
+        if valor and len(str(valor)) >= 4:
+            cls._secretos.add(str(valor))
+
+    @classmethod
+    def redactar_har(cls, ruta):
+        """
+        Redacta un HAR en sitio: cabeceras de sesión, cookies, parámetros y
+        campos de formulario/JSON con nombre sensible y cualquier secreto
+        registrado. Las peticiones cuyo cuerpo tenía datos sensibles pierden
+        el postData (route_from_har las empareja entonces solo por URL y método).
+
+        Args:
+            ruta: Ruta del archivo HAR
+
+        Returns:
+            int: Número de peticiones modificadas
+        """
+        with open(ruta, 'r', encoding='utf-8') as archivo:
+            har = json.load(archivo)
+
+        def sensible(nombre):
+            return bool(cls.HAR_CAMPOS_SENSIBLES.search(nombre or ""))
+
+        def redactar_json(valor):
+            if isinstance(valor, dict):
+                return {k: cls.HAR_REDACTADO if sensible(k) and not isinstance(v, (dict, list)) else redactar_json(v)
+                        for k, v in valor.items()}
+            if isinstance(valor, list):
+                return [redactar_json(v) for v in valor]
+            return valor
+
+        modificadas = 0
+        for entrada in har.get("log", {}).get("entries", []):
+            peticion = entrada.get("request", {})
+            respuesta = entrada.get("response", {})
+            original = json.dumps(peticion, sort_keys=True)
+
+            for mensaje in (peticion, respuesta):
+                for cabecera in mensaje.get("headers", []):
+                    if cabecera.get("name", "").lower() in cls.HAR_CABECERAS_SENSIBLES:
+                        cabecera["value"] = cls.HAR_REDACTADO
+                for cookie in mensaje.get("cookies", []):
+                    cookie["value"] = cls.HAR_REDACTADO
+
+            url = urlsplit(peticion.get("url", ""))
+            parametros = parse_qsl(url.query, keep_blank_values=True)
+            if any(sensible(nombre) for nombre, _ in parametros):
+                parametros = [(n, cls.HAR_REDACTADO if sensible(n) else v) for n, v in parametros]
+                peticion["url"] = url._replace(query=urlencode(parametros)).geturl()
+                for parametro in peticion.get("queryString", []):
+                    if sensible(parametro.get("name")):
+                        parametro["value"] = cls.HAR_REDACTADO
+
+            datos = peticion.get("postData")
+            if datos:
+                texto = datos.get("text") or ""
+                hay_secreto = any(secreto in texto for secreto in cls._secretos)
+                try:
+                    cuerpo = json.loads(texto)
+                    hay_campo = redactar_json(cuerpo) != cuerpo
+                except ValueError:
+                    hay_campo = any(sensible(n) for n, _ in parse_qsl(texto)) or \
+                        any(sensible(p.get("name")) for p in datos.get("params", []))
+                if hay_secreto or hay_campo:
+                    del peticion["postData"]
+                    peticion["comment"] = "postData redactado"
+
+            if json.dumps(peticion, sort_keys=True) != original:
+                modificadas += 1
+
+        texto = json.dumps(har, ensure_ascii=False)
+        for secreto in cls._secretos:
+            texto = texto.replace(json.dumps(secreto, ensure_ascii=False)[1:-1], cls.HAR_REDACTADO)
+
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            archivo.write(texto)
+        os.replace(temporal, ruta)
+        return modificadas
+
+    def _redactar_har_grabado(self):
+        """Redacta el HAR de esta sesión una sola vez, cuando ya está escrito"""
+        if self._har_redactado or not self.har_ruta or not os.path.exists(self.har_ruta):
+            return
+        try:
+            modificadas = self.redactar_har(self.har_ruta)
+            self._har_redactado = True
+            LogManager.escribir_log(
+                "INFO", f"HAR guardado y redactado ({modificadas} peticiones con datos sensibles): {self.har_ruta}")
+        except Exception as e:
+            LogManager.escribir_log("ERROR", f"Error redactando HAR {self.har_ruta}: {str(e)}")
+
+    def _guardar_har_pendiente(self):
+        """Respaldo al salir: cierra el contexto si nadie lo hizo para que el HAR se escriba"""
+        if self._har_redactado:
+            return
+        try:
+            if self.context:
+                self.context.close()
+        except Exception:
+            pass
+        self._redactar_har_grabado()
+
+    @MedidorTiempos.medido("navegador.cerrar")
     def cerrar_navegador(self):
         """Cierra el navegador y Playwright"""
+        if self.context:
+            try:
+                self.context.close()
+            except Exception:
+                pass
+        if self.har_modo == "grabar":
+            self._redactar_har_grabado()
         if self.browser:
+            # Conectado por CDP, close() solo desconecta: el Chromium del servicio sigue vivo
             self.browser.close()
+        self._liberar_lease()
         if self.playwright:
             self.playwright.stop()
 
+# ==================== SERVICIO DE NAVEGADOR ====================
+
+
+class ServicioNavegador:
+    """
+    Estado compartido entre servicio_navegador.py (Chromium residente con
+    puerto CDP) y los bots que se conectan a él vía PlaywrightManager
+
+    Archivos en RUTAS_CONFIG['navegador']:
+        servicio.json: endpoint, pid, generación y modo del Chromium activo
+                       (solo existe mientras el navegador está sano)
+        uso.lock:      cada bot conectado mantiene un flock compartido; el
+                       servicio solo recicla cuando obtiene el exclusivo
+        usos_<generación>: un byte por ejecución que usó esa generación
+    """
+
+    @staticmethod
+    def ruta(nombre):
+        """Ruta de un archivo del servicio"""
+        return os.path.join(RUTAS_CONFIG['navegador'], nombre)
+
+    @classmethod
+    def leer_estado(cls):
+        """
+        Estado publicado por el servicio
+
+        Returns:
+            dict: endpoint, pid, generacion, headless, inicio; None si no hay servicio
+        """
+        try:
+            with open(cls.ruta("servicio.json"), 'r', encoding='utf-8') as archivo:
+                estado = json.load(archivo)
+            os.kill(estado["pid"], 0)
+            return estado
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @classmethod
+    def publicar_estado(cls, estado):
+        """Escribe servicio.json de forma atómica (None lo elimina)"""
+        ruta = cls.ruta("servicio.json")
+        if estado is None:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            return
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            json.dump(estado, archivo, indent=2)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def tomar_lease(cls, exclusivo=False, espera=30):
+        """
+        Toma el flock de uso.lock (compartido para un bot, exclusivo para reciclar)
+
+        Args:
+            exclusivo: True para el servicio al reciclar (sin espera)
+            espera: Segundos máximos esperando un lease compartido
+
+        Returns:
+            int: Descriptor con el lock tomado o None si no se obtuvo
+        """
+        try:
+            os.makedirs(RUTAS_CONFIG['navegador'], exist_ok=True)
+            descriptor = os.open(cls.ruta("uso.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError as e:
+            LogManager.escribir_log("WARNING", f"No se pudo abrir el lock del servicio de navegador: {str(e)}")
+            return None
+        modo = fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH
+        limite = time.time() + (0 if exclusivo else espera)
+        while True:
+            try:
+                fcntl.flock(descriptor, modo | fcntl.LOCK_NB)
+                return descriptor
+            except BlockingIOError:
+                if time.time() >= limite:
+                    os.close(descriptor)
+                    return None
+                time.sleep(0.2)
+
+    @staticmethod
+    def liberar_lease(descriptor):
+        """Libera un lease tomado con tomar_lease"""
+        if descriptor is None:
+            return
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+        except OSError:
+            pass
+
+    @classmethod
+    def registrar_uso(cls, generacion):
+        """Suma una ejecución a la generación actual del navegador"""
+        try:
+            with open(cls.ruta(f"usos_{generacion}"), 'ab') as archivo:
+                archivo.write(b".")
+        except OSError:
+            pass
+
+    @classmethod
+    def usos(cls, generacion):
+        """Ejecuciones que usaron una generación del navegador"""
+        try:
+            return os.path.getsize(cls.ruta(f"usos_{generacion}"))
+        except OSError:
+            return 0
+
 # ==================== COMPONENTES DE INTERACCIÓN ====================
 
 
@@ -136,27 +1012,14 @@ class ComponenteInteraccion:
         """
         for intento in range(intentos):
             try:
-                # Esperar que el elemento sea visible y clickeable
-                page.wait_for_selector(
-                    selector, timeout=timeout, state='visible')
-
-                # Verificar si está deshabilitado
-                if page.is_disabled(selector):
-                    LogManager.escribir_log(
-                        "INFO", f"{descripcion} está deshabilitado. Intento {intento + 1}/{intentos}")
-                    time.sleep(2)
-                    continue
-
-                # Scroll al elemento si es necesario
-                page.locator(selector).scroll_into_view_if_needed()
-
-                # Hacer clic
-                page.click(selector)
+                # Un solo viaje al navegador: click() espera que el elemento esté
+                # visible, estable y habilitado, y hace scroll antes del clic
+                page.locator(selector).first.click(timeout=timeout)
                 LogManager.escribir_log(
                     "SUCCESS", f"Clic exitoso en {descripcion} (intento {intento + 1})")
                 return True
 
-            except PlaywrightTimeoutError:
+            except _timeout_playwright():
                 LogManager.escribir_log(
                     "WARNING", f"Timeout esperando {descripcion}. Intento {intento + 1}/{intentos}")
             except Exception as e:
@@ -188,16 +1051,14 @@ class ComponenteInteraccion:
         """
         for intento in range(intentos):
             try:
-                page.wait_for_selector(
-                    selector, timeout=timeout, state='visible')
-                page.fill(selector, "")  # Limpiar campo
-                page.fill(selector, valor)  # Escribir valor
+                # fill() espera que el campo sea editable y reemplaza su contenido
+                page.locator(selector).first.fill(valor, timeout=timeout)
 
                 LogManager.escribir_log(
                     "SUCCESS", f"Escritura exitosa en {descripcion}: '{valor}' (intento {intento + 1})")
                 return True
 
-            except PlaywrightTimeoutError:
+            except _timeout_playwright():
                 LogManager.escribir_log(
                     "WARNING", f"Timeout esperando {descripcion}. Intento {intento + 1}/{intentos}")
             except Exception as e:
@@ -236,7 +1097,7 @@ class ComponenteInteraccion:
                     "SUCCESS", f"Lectura exitosa de {descripcion}: '{texto}' (intento {intento + 1})")
                 return texto.strip() if texto else ""
 
-            except PlaywrightTimeoutError:
+            except _timeout_playwright():
                 LogManager.escribir_log(
                     "WARNING", f"Timeout esperando {descripcion}. Intento {intento + 1}/{intentos}")
             except Exception as e:
@@ -275,7 +1136,7 @@ class ComponenteInteraccion:
                     "SUCCESS", f"Lectura de valor exitosa de {descripcion}: '{valor}' (intento {intento + 1})")
                 return valor
 
-            except PlaywrightTimeoutError:
+            except _timeout_playwright():
                 LogManager.escribir_log(
                     "WARNING", f"Timeout esperando {descripcion}. Intento {intento + 1}/{intentos}")
             except Exception as e:
@@ -309,7 +1170,7 @@ class ComponenteInteraccion:
             # LogManager.escribir_log(
             #     "SUCCESS", f"{descripcion} apareció correctamente")
             return True
-        except PlaywrightTimeoutError:
+        except _timeout_playwright():
             LogManager.escribir_log(
                 "ERROR", f"Timeout esperando {descripcion}")
             return False
@@ -319,69 +1180,92 @@ class ComponenteInteraccion:
             return False
 
     @staticmethod
-    def esperarDescarga(page, selector_boton, timeout=60000, descripcion="descarga", adicional=""):
+    def esperarAlguno(page, selectores, timeout=30000, estado='visible', descripcion="elemento"):
         """
-        Espera y maneja una descarga
+        Espera a que aparezca cualquiera de varios selectores candidatos con
+        una sola espera (locator.or_), en lugar de agotar el timeout de cada
+        candidato por turno: el peor caso es un timeout y no uno por selector.
+        Con estado='visible' se espera la primera coincidencia visible, así un
+        elemento oculto que aparezca antes en el DOM no bloquea la espera.
 
         Args:
             page: Página de Playwright
-            selector_boton: Selector del botón de descarga
-            timeout: Timeout en milisegundos
-            descripcion: Descripción de la descarga para logs
+            selectores: Lista de selectores CSS o XPath, en orden de preferencia
+            timeout: Timeout en milisegundos para el conjunto
+            estado: Estado a esperar ('visible' o 'attached')
+            descripcion: Descripción del elemento para logs
 
         Returns:
-            str: Ruta del archivo descargado o None si falla
+            str: El primer selector de la lista que coincide (con 'visible', el
+                 primero que tiene alguna coincidencia visible), o None si
+                 ninguno apareció
         """
+        if not selectores:
+            return None
         try:
-             # PASO 1: Verificar que el elemento existe y es visible
-            if not ComponenteInteraccion.esperarElemento(page, selector_boton, timeout=timeout, descripcion=f"botón {descripcion}"):
-                LogManager.escribir_log(
-                    "ERROR", f"Elemento {descripcion} no encontrado")
-                return None
-
-            # PASO 2: Scroll al elemento
-            try:
-                elemento_locator = page.locator(selector_boton).first
-                elemento_locator.scroll_into_view_if_needed()
-                page.wait_for_timeout(1000)
-            except Exception as e:
-                LogManager.escribir_log(
-                    "WARNING", f"Error posicionando elemento: {str(e)}")
-
-            # PASO 3: Esperar que sea clickeable
-            try:
-                # XPath
-                page.wait_for_function(f"""
-                    () => {{
-                        const xpath = "{selector_boton.replace('"', '\\"')}";
-                        const result = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null);
-                        const elemento = result.singleNodeValue;
-
-                        if (!elemento) return false;
-
-                        const rect = elemento.getBoundingClientRect();
-                        const visible = rect.width > 0 && rect.height > 0;
-                        const enabled = !elemento.disabled && !elemento.hasAttribute('disabled') && !elemento.classList.contains('disabled');
-
-                        return visible && enabled;
-                    }}
-                """, timeout=15000)
+            combinado = page.locator(selectores[0])
+            for selector in selectores[1:]:
+                combinado = combinado.or_(page.locator(selector))
+            if estado == 'visible':
+                combinado = combinado.locator("visible=true")
+            combinado.first.wait_for(state=estado, timeout=timeout)
+
+            # Cuál coincidió (consultas sin espera, en orden de preferencia).
+            # Con 'visible' cuenta cualquier coincidencia visible, no solo la
+            # primera: el llamador debe usar locator(selector).locator("visible=true")
+            for selector in selectores:
+                candidato = page.locator(selector)
+                if estado == 'visible':
+                    candidato = candidato.locator("visible=true")
+                coincide = candidato.count() > 0
+                if coincide:
+                    LogManager.escribir_log(
+                        "DEBUG", f"{descripcion} encontrado con selector: {selector}")
+                    return selector
+            # El elemento desapareció entre la espera y la consulta
+            return None
+        except _timeout_playwright():
+            LogManager.escribir_log(
+                "WARNING", f"Timeout esperando {descripcion} ({len(selectores)} selectores candidatos)")
+            return None
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"Error esperando {descripcion}: {str(e)}")
+            return None
 
+    @staticmethod
+    @MedidorTiempos.medido("navegador.descarga")
+    def esperarDescarga(page, selector_boton, timeout=60000, descripcion="descarga", adicional="",
+                        en_memoria=False):
+        """
+        Espera y maneja una descarga
 
-                LogManager.escribir_log("SUCCESS", f"Elemento {descripcion} confirmado como clickeable")
-            except Exception as e:
-                LogManager.escribir_log("WARNING", f"No se pudo verificar clickeabilidad: {str(e)}")
-                EsperasInteligentes.esperar_con_loader_simple(2, "Esperando estabilización del elemento")
-            
+        Args:
+            page: Página de Playwright
+            selector_boton: Selector del botón de descarga
+            timeout: Timeout en milisegundos
+            descripcion: Descripción de la descarga para logs
+            en_memoria: Devolver una DescargaEnMemoria en lugar de guardar el archivo
+                        en el espacio de trabajo de la ejecución (EspacioTrabajo)
 
+        Returns:
+            str: Ruta del archivo descargado (o DescargaEnMemoria) o None si falla
+        """
+        try:
+            # El clic espera por sí mismo que el botón esté visible, estable y
+            # habilitado (y hace scroll): no hacen falta esperas previas. Si un
+            # overlay o spinner lo tapa, se fuerza el clic como antes.
+            boton = page.locator(selector_boton).locator("visible=true").first
             with page.expect_download(timeout=timeout) as download_info:
-                page.click(selector_boton, force=True)
+                try:
+                    boton.click(timeout=min(timeout, 12000))
+                except _timeout_playwright():
+                    LogManager.escribir_log(
+                        "WARNING", f"Botón de {descripcion} no accionable, reintentando con clic forzado")
+                    boton.click(force=True, timeout=min(timeout, 12000))
 
             download = download_info.value
 
-            # Obtener la ruta temporal original
-            ruta_temporal = download.path()
-
             # Usar el nombre sugerido tal como viene
             nombre_archivo = download.suggested_filename
             nombre = nombre_archivo.split('.')[0]  # Nombre sin extensión
@@ -391,25 +1275,45 @@ class ComponenteInteraccion:
                 # Si hay un adicional, agregarlo al nombre del archivo
                 nombre_archivo = f"{nombre}_{adicional}.{extension}"
 
+            if en_memoria:
+                descarga = DescargaEnMemoria.desde_descarga(download, nombre_archivo)
+                LogManager.escribir_log(
+                    "SUCCESS", f"{descripcion} completada: {descarga}")
+                return descarga
+
+            carpeta_remota = PlaywrightManager.carpeta_descarga(download)
             ruta_descarga = os.path.join(
-                RUTAS_CONFIG['descargas'], nombre_archivo)
+                carpeta_remota or EspacioTrabajo.actual(), nombre_archivo)
 
-            # Guardar archivo con el nombre original
-            download.save_as(ruta_descarga)
+            if carpeta_remota:
+                # Navegador del servicio: copiar a la carpeta de la ejecución y
+                # borrar el artefacto de Playwright
+                download.save_as(ruta_descarga)
+                try:
+                    download.delete()
+                except Exception as e:
+                    LogManager.escribir_log(
+                        "WARNING", f"No se pudo eliminar archivo temporal: {str(e)}")
+            else:
+                # Obtener la ruta temporal original
+                ruta_temporal = download.path()
 
-            # ELIMINAR EL ARCHIVO TEMPORAL
-            try:
-                if os.path.exists(ruta_temporal):
-                    os.remove(ruta_temporal)
-            except Exception as e:
-                LogManager.escribir_log(
-                    "WARNING", f"No se pudo eliminar archivo temporal: {str(e)}")
+                # Guardar archivo con el nombre original
+                download.save_as(ruta_descarga)
+
+                # ELIMINAR EL ARCHIVO TEMPORAL
+                try:
+                    if os.path.exists(ruta_temporal):
+                        os.remove(ruta_temporal)
+                except Exception as e:
+                    LogManager.escribir_log(
+                        "WARNING", f"No se pudo eliminar archivo temporal: {str(e)}")
 
             LogManager.escribir_log(
                 "SUCCESS", f"{descripcion} completada: {ruta_descarga}")
             return ruta_descarga
 
-        except PlaywrightTimeoutError:
+        except _timeout_playwright():
             LogManager.escribir_log("ERROR", f"Timeout en {descripcion}")
             return None
         except Exception as e:
@@ -435,27 +1339,13 @@ class ComponenteInteraccion:
         """
         for intento in range(intentos):
             try:
-                # Esperar que el elemento sea visible y clickeable
-                page.wait_for_selector(
-                    selector, timeout=timeout, state='visible')
-
-                # Verificar si está deshabilitado
-                if page.is_disabled(selector):
-                    LogManager.escribir_log(
-                        "INFO", f"{descripcion} está deshabilitado. Intento {intento + 1}/{intentos}")
-                    time.sleep(1)
-                    continue
-
-                # Scroll al elemento si es necesario
-                page.locator(selector).scroll_into_view_if_needed()
-
-                # Hacer clic
-                page.click(selector)
+                # click() espera visible/estable/habilitado dentro del timeout
+                page.locator(selector).first.click(timeout=timeout)
                 LogManager.escribir_log(
                     "SUCCESS", f"Clic exitoso en {descripcion} (elemento opcional encontrado)")
                 return True
 
-            except PlaywrightTimeoutError:
+            except _timeout_playwright():
                 # Para elementos opcionales, el timeout no es un error grave
                 LogManager.escribir_log(
                     "INFO", f"{descripcion} no encontrado. Intento {intento + 1}/{intentos}")
@@ -791,7 +1681,7 @@ class EsperasInteligentes:
             page.wait_for_load_state("networkidle", timeout=timeout)
             LogManager.escribir_log("SUCCESS", "Página cargada completamente")
             return True
-        except PlaywrightTimeoutError:
+        except _timeout_playwright():
             LogManager.escribir_log(
                 "WARNING", "Timeout esperando carga completa de página")
             return False
@@ -815,7 +1705,7 @@ class EsperasInteligentes:
             LogManager.escribir_log(
                 "SUCCESS", f"Condición cumplida: {descripcion}")
             return True
-        except PlaywrightTimeoutError:
+        except _timeout_playwright():
             LogManager.escribir_log(
                 "ERROR", f"Timeout esperando condición: {descripcion}")
             return False
@@ -828,7 +1718,7 @@ class EsperasInteligentes:
             # LogManager.escribir_log(
             #     "SUCCESS", f"{descripcion} desapareció correctamente")
             return True
-        except PlaywrightTimeoutError:
+        except _timeout_playwright():
             LogManager.escribir_log(
                 "WARNING", f"Timeout esperando que desaparezca {descripcion}")
             return False
@@ -953,6 +1843,185 @@ class EsperasInteligentes:
 # ==================== GESTIÓN DE ARCHIVOS ====================
 
 
+class EspacioTrabajo:
+    """
+    Carpeta temporal propia de cada ejecución para los archivos transitorios
+    (descargas del navegador, archivos tomados de una carpeta compartida)
+
+    Se crea al primer uso en tmpfs (/dev/shm) si está disponible, o en
+    RPA_ESPACIO_TRABAJO / el temporal del sistema, y se borra al terminar el
+    proceso; las de ejecuciones que murieron sin limpiar (SIGKILL, timeout)
+    se eliminan al crear la siguiente. Lo que deba sobrevivir a la ejecución
+    se mueve a RUTAS_CONFIG['descargas'] con LectorArchivos.conservar().
+    """
+
+    PREFIJO = "rpa_"
+    _ruta = None
+    _pid = None
+
+    @staticmethod
+    def base():
+        """Carpeta donde se crean los espacios de trabajo"""
+        configurada = os.environ.get("RPA_ESPACIO_TRABAJO")
+        if configurada:
+            return configurada
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            return "/dev/shm"
+        return tempfile.gettempdir()
+
+    @classmethod
+    def actual(cls):
+        """
+        Espacio de trabajo de este proceso (se crea al primer uso)
+
+        Returns:
+            str: Ruta de la carpeta
+        """
+        if cls._ruta and cls._pid == os.getpid() and os.path.isdir(cls._ruta):
+            return cls._ruta
+        base = cls.base()
+        os.makedirs(base, exist_ok=True)
+        cls._limpiar_huerfanos(base)
+        banco = re.sub(r"[^a-z0-9]+", "", LogManager._banco_actual.lower()) or "rpa"
+        cls._ruta = tempfile.mkdtemp(prefix=f"{cls.PREFIJO}{banco}_{os.getpid()}_", dir=base)
+        cls._pid = os.getpid()
+        atexit.register(cls.limpiar)
+        LogManager.escribir_log("DEBUG", f"Espacio de trabajo: {cls._ruta}")
+        return cls._ruta
+
+    @classmethod
+    def contiene(cls, ruta):
+        """Indica si la ruta está dentro del espacio de trabajo de este proceso"""
+        return bool(cls._ruta) and cls._pid == os.getpid() and \
+            os.path.abspath(ruta).startswith(cls._ruta + os.sep)
+
+    @classmethod
+    def limpiar(cls):
+        """Borra el espacio de trabajo de este proceso (no el heredado de un fork)"""
+        if cls._ruta and cls._pid == os.getpid():
+            shutil.rmtree(cls._ruta, ignore_errors=True)
+        cls._ruta = None
+        cls._pid = None
+
+    @classmethod
+    def _limpiar_huerfanos(cls, base):
+        """Elimina espacios de trabajo cuyo proceso ya no existe (rpa_<banco>_<pid>_<sufijo>)"""
+        try:
+            for nombre in os.listdir(base):
+                partes = nombre.split("_", 3)
+                if not nombre.startswith(cls.PREFIJO) or len(partes) < 4 or not partes[2].isdigit():
+                    continue
+                try:
+                    os.kill(int(partes[2]), 0)
+                except ProcessLookupError:
+                    shutil.rmtree(os.path.join(base, nombre), ignore_errors=True)
+                except OSError:
+                    pass
+        except OSError:
+            pass
+
+
+class DescargaEnMemoria:
+    """
+    Archivo descargado que se procesa desde memoria (bytes) sin copiarlo a
+    RUTAS_CONFIG['descargas'] ni volver a abrirlo del disco
+
+    Solo se escribe una copia en la carpeta de descargas cuando
+    RPA_ARCHIVAR_DESCARGAS=1, cuando el procesamiento falla (guardar()), para
+    revisión o para reintentarlo con --resume, o antes de ingerirla en una
+    ejecución con --resume (si vuelve a cortarse, la siguiente la reutiliza;
+    esa copia se borra al procesarla).
+
+    Uso:
+        descarga = ComponenteInteraccion.esperarDescarga(page, selector, en_memoria=True)
+        contenido = LectorArchivos.leerExcel(descarga)
+    """
+
+    def __init__(self, nombre_archivo, contenido):
+        """
+        Args:
+            nombre_archivo: Nombre con el que se guardaría (ej: sugerido por el banco)
+            contenido: Bytes del archivo
+        """
+        self.nombre_archivo = nombre_archivo
+        self.contenido = contenido
+        self.ruta = None
+
+    def __str__(self):
+        return self.ruta or f"{self.nombre_archivo} (en memoria)"
+
+    @staticmethod
+    def archivar():
+        """Indica si se debe conservar una copia de cada descarga (RPA_ARCHIVAR_DESCARGAS=1)"""
+        return os.environ.get("RPA_ARCHIVAR_DESCARGAS", "0") not in ("", "0")
+
+    @classmethod
+    def desde_descarga(cls, download, nombre_archivo):
+        """
+        Lee una descarga de Playwright a memoria y elimina el temporal del navegador
+
+        Args:
+            download: playwright Download
+            nombre_archivo: Nombre final del archivo
+
+        Returns:
+            DescargaEnMemoria: Descarga en memoria (ya guardada si se archiva)
+        """
+        carpeta_remota = PlaywrightManager.carpeta_descarga(download)
+        if carpeta_remota:
+            # Navegador del servicio (CDP): se guarda en la carpeta de la ejecución
+            os.makedirs(carpeta_remota, exist_ok=True)
+            ruta_temporal = os.path.join(carpeta_remota, f".{os.getpid()}_{nombre_archivo}")
+            download.save_as(ruta_temporal)
+        else:
+            ruta_temporal = download.path()
+        with open(ruta_temporal, 'rb') as archivo:
+            descarga = cls(nombre_archivo, archivo.read())
+        if carpeta_remota:
+            try:
+                os.remove(ruta_temporal)
+            except OSError:
+                pass
+        try:
+            download.delete()
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo eliminar archivo temporal: {str(e)}")
+        if cls.archivar():
+            descarga.guardar()
+        return descarga
+
+    def flujo(self):
+        """Contenido como archivo en memoria (io.BytesIO)"""
+        return io.BytesIO(self.contenido)
+
+    def guardar(self, carpeta=None):
+        """
+        Escribe la descarga en disco (una sola vez)
+
+        Args:
+            carpeta: Carpeta destino (por defecto RUTAS_CONFIG['descargas'])
+
+        Returns:
+            str: Ruta del archivo o None si no se pudo guardar
+        """
+        if self.ruta:
+            return self.ruta
+        try:
+            carpeta = carpeta or RUTAS_CONFIG['descargas']
+            os.makedirs(carpeta, exist_ok=True)
+            ruta = os.path.join(carpeta, self.nombre_archivo)
+            with open(ruta, 'wb') as archivo:
+                archivo.write(self.contenido)
+            self.ruta = ruta
+            LogManager.escribir_log("INFO", f"Descarga guardada en disco: {ruta}")
+            return ruta
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo guardar la descarga {self.nombre_archivo}: {str(e)}")
+            return None
+
+
 class LectorArchivos:
     """Clase para leer diferentes tipos de archivos"""
 
@@ -995,7 +2064,7 @@ class LectorArchivos:
         Lee un archivo Excel
 
         Args:
-            ruta_archivo: Ruta al archivo Excel
+            ruta_archivo: Ruta al archivo Excel o DescargaEnMemoria
             hoja: Índice o nombre de la hoja (por defecto 0)
             data_only: Solo datos, sin fórmulas
 
@@ -1003,7 +2072,10 @@ class LectorArchivos:
             openpyxl.Worksheet: Hoja de Excel cargada
         """
         try:
-            wb = openpyxl.load_workbook(ruta_archivo, data_only=data_only)
+            import openpyxl
+
+            origen = ruta_archivo.flujo() if isinstance(ruta_archivo, DescargaEnMemoria) else ruta_archivo
+            wb = openpyxl.load_workbook(origen, data_only=data_only)
 
             if isinstance(hoja, int):
                 ws = wb.worksheets[hoja]
@@ -1056,18 +2128,21 @@ class LectorArchivos:
             return ""
 
     @staticmethod
-    def obtener_ultimo_archivo_descargado(carpeta, extension=None):
+    def obtener_ultimo_archivo_descargado(carpeta=None, extension=None):
         """
         Obtiene el último archivo descargado de una carpeta
 
         Args:
-            carpeta: Ruta de la carpeta
+            carpeta: Ruta de la carpeta (por defecto el espacio de trabajo de
+                     esta ejecución; una carpeta compartida puede devolver la
+                     descarga de otro bot que corre a la vez)
             extension: Extensión de archivo a buscar (opcional)
 
         Returns:
             str: Ruta del último archivo descargado
         """
         try:
+            carpeta = carpeta or EspacioTrabajo.actual()
             archivos = []
             for archivo in os.listdir(carpeta):
                 if extension is None or archivo.endswith(extension):
@@ -1093,6 +2168,255 @@ class LectorArchivos:
                 "ERROR", f"Error buscando último archivo en {carpeta}: {str(e)}")
             return None
 
+    @staticmethod
+    def eliminar_procesado(ruta_archivo):
+        """
+        Descarta un archivo ya procesado: borra la ruta del disco o libera la
+        DescargaEnMemoria (su copia en disco se conserva solo si se archiva
+        con RPA_ARCHIVAR_DESCARGAS=1)
+
+        Args:
+            ruta_archivo: Ruta al archivo o DescargaEnMemoria
+        """
+        try:
+            if isinstance(ruta_archivo, DescargaEnMemoria):
+                ruta_archivo.contenido = b""
+                if not ruta_archivo.ruta or DescargaEnMemoria.archivar():
+                    return
+                # Copia escrita solo para el checkpoint: ya no hace falta
+                ruta_copia, ruta_archivo.ruta = ruta_archivo.ruta, None
+                ruta_archivo = ruta_copia
+            os.remove(ruta_archivo)
+            LogManager.escribir_log(
+                "INFO", f"Archivo eliminado: {ruta_archivo}")
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo eliminar archivo: {str(e)}")
+
+    @staticmethod
+    def conservar(ruta_archivo):
+        """
+        Asegura que el archivo quede en disco (p. ej. si su procesamiento falló):
+        guarda la DescargaEnMemoria o mueve el archivo del espacio de trabajo
+        a RUTAS_CONFIG['descargas']
+
+        Returns:
+            str: Ruta en disco del archivo (None si no se pudo guardar)
+        """
+        if isinstance(ruta_archivo, DescargaEnMemoria):
+            return ruta_archivo.guardar()
+        if not EspacioTrabajo.contiene(ruta_archivo):
+            return ruta_archivo
+        # El espacio de trabajo se borra al terminar: mover a la carpeta de descargas
+        try:
+            os.makedirs(RUTAS_CONFIG['descargas'], exist_ok=True)
+            destino = os.path.join(RUTAS_CONFIG['descargas'], os.path.basename(ruta_archivo))
+            shutil.move(ruta_archivo, destino)
+            LogManager.escribir_log("INFO", f"Archivo conservado en: {destino}")
+            return destino
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo conservar {ruta_archivo}: {str(e)}")
+            return None
+
+    @staticmethod
+    def reclamar(ruta_archivo):
+        """
+        Toma un archivo de una carpeta compartida (p. ej. descargas en JEP
+        --manual) para esta ejecución y lo mueve a su espacio de trabajo. El
+        primer paso es un rename atómico en la misma carpeta: si dos
+        ejecuciones ven el mismo archivo, solo una lo obtiene.
+
+        Args:
+            ruta_archivo: Ruta del archivo en la carpeta compartida
+
+        Returns:
+            str: Ruta del archivo en el espacio de trabajo o None si otra
+                 ejecución lo reclamó antes (o no se pudo mover)
+        """
+        carpeta, nombre = os.path.split(ruta_archivo)
+        reclamado = os.path.join(carpeta, f".{nombre}.{os.getpid()}.reclamado")
+        try:
+            os.rename(ruta_archivo, reclamado)
+        except FileNotFoundError:
+            LogManager.escribir_log(
+                "INFO", f"{nombre} ya fue tomado por otra ejecución")
+            return None
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"No se pudo reclamar {ruta_archivo}: {str(e)}")
+            return None
+
+        destino = os.path.join(EspacioTrabajo.actual(), nombre)
+        try:
+            shutil.move(reclamado, destino)
+            return destino
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"No se pudo mover {nombre} al espacio de trabajo: {str(e)}")
+            try:
+                os.rename(reclamado, ruta_archivo)
+            except OSError:
+                pass
+            return None
+
+# ==================== NORMALIZACIÓN DE MOVIMIENTOS ====================
+
+
+class NormalizadorMovimientos:
+    """
+    Etapa columnar (pandas) que convierte las filas de un estado de cuenta en
+    columnas tipadas según el esquema del banco; cada script solo hace la
+    deduplicación e inserción sobre el resultado.
+
+    Esquema (dict):
+        fila_inicio:  índice de la primera fila de movimientos
+        columnas:     {nombre: índice de columna}; todas salen como texto con
+                      la misma regla que `str(celda) if celda else ""`
+        min_columnas: filas más cortas quedan con _completa=False
+        requeridas:   columnas que no pueden venir vacías (_completa=False)
+        fechas:       {destino: {"columna", "formatos", "recorte"}} -> 'YYYY-MM-DD' o None
+        montos:       columnas que se reemplazan por float (sin $, comas ni
+                      espacios; "(x)" es negativo; lo no numérico es 0.0)
+        tipo:         {"columna", "valor", "si_coincide", "si_no", "mayusculas", "contiene"}
+
+    Columnas adicionales: fila (índice en el archivo) y _completa.
+
+    Uso:
+        movimientos = NormalizadorMovimientos.normalizar(contenido, ESQUEMA_ARCHIVO)
+        for registro in NormalizadorMovimientos.filas(movimientos[movimientos["_completa"]]):
+            ...
+    """
+
+    @staticmethod
+    def convertir_fecha(valor, formatos):
+        """
+        Convierte un texto de fecha probando los formatos en orden
+
+        Returns:
+            str: Fecha 'YYYY-MM-DD' o None si ningún formato coincide
+        """
+        if not valor:
+            return None
+        for formato in formatos:
+            try:
+                return datetime.strptime(valor, formato).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return None
+
+    @staticmethod
+    def _texto(columna):
+        """Columna como texto: str(celda) si la celda es verdadera, "" si no"""
+        return columna.where(columna.astype(bool), "").astype(str)
+
+    @classmethod
+    def _fechas(cls, texto, formatos, recorte=None):
+        """
+        Fechas SQL de una columna de texto. strptime se ejecuta una vez por
+        valor distinto (un estado de cuenta repite pocas fechas) y el
+        resultado se expande con los códigos de pd.factorize.
+        """
+        import numpy as np
+        import pandas as pd
+
+        if recorte:
+            texto = texto.str.slice(0, recorte)
+        codigos, unicos = pd.factorize(texto)
+        convertidas = np.array([cls.convertir_fecha(v, formatos) for v in unicos] + [None], dtype=object)
+        return pd.Series(convertidas[codigos], index=texto.index, dtype=object)
+
+    @staticmethod
+    def _a_float(valor):
+        """float(valor) o 0.0 si no es numérico"""
+        try:
+            return float(valor)
+        except ValueError:
+            return 0.0
+
+    @classmethod
+    def _montos(cls, texto):
+        """
+        Montos float de una columna de texto (sin $, comas ni espacios; "(x)"
+        es negativo; vacío o no numérico es 0.0). La conversión usa astype(float)
+        y no pd.to_numeric: to_numeric redondea el último dígito de muchos
+        valores y los números de documento que se arman con el monto cambiarían.
+        Solo si la columna trae texto no numérico se convierte valor por valor.
+        """
+        limpio = texto.str.replace(r"[$, ]", "", regex=True).str.strip()
+        parentesis = limpio.str.startswith("(") & limpio.str.endswith(")")
+        if parentesis.any():
+            limpio = limpio.where(~parentesis, "-" + limpio.str.slice(1, -1))
+        limpio = limpio.where((limpio != "") & (limpio != "-"), "0")
+        try:
+            return limpio.astype(float)
+        except (ValueError, TypeError):
+            return limpio.map(cls._a_float).astype(float)
+
+    @classmethod
+    def normalizar(cls, contenido, esquema):
+        """
+        Normaliza las filas de movimientos de un archivo
+
+        Args:
+            contenido: Lista de filas (ej: LectorArchivos.leerExcel)
+            esquema: Esquema del banco (ver docstring de la clase)
+
+        Returns:
+            pandas.DataFrame: Una fila por fila del archivo desde fila_inicio
+        """
+        import numpy as np
+        import pandas as pd
+
+        inicio = esquema.get("fila_inicio", 0)
+        filas = [list(fila) if fila else [] for fila in contenido[inicio:]]
+        crudo = pd.DataFrame(filas, dtype=object) if filas else pd.DataFrame(dtype=object)
+        indice = pd.RangeIndex(len(filas))
+        frame = pd.DataFrame({"fila": np.arange(inicio, inicio + len(filas))}, index=indice)
+
+        for nombre, columna in esquema["columnas"].items():
+            if columna in crudo.columns:
+                frame[nombre] = cls._texto(crudo[columna])
+            else:
+                frame[nombre] = pd.Series([""] * len(filas), index=indice, dtype=str)
+
+        completa = pd.Series([len(fila) >= esquema.get("min_columnas", 0) for fila in filas],
+                             index=indice, dtype=bool)
+        for nombre in esquema.get("requeridas", ()):
+            completa &= frame[nombre] != ""
+        frame["_completa"] = completa
+
+        for destino, regla in esquema.get("fechas", {}).items():
+            frame[destino] = cls._fechas(frame[regla["columna"]], regla["formatos"], regla.get("recorte"))
+
+        for nombre in esquema.get("montos", ()):
+            frame[nombre] = cls._montos(frame[nombre])
+
+        regla_tipo = esquema.get("tipo")
+        if regla_tipo:
+            texto = frame[regla_tipo["columna"]]
+            if regla_tipo.get("mayusculas"):
+                texto = texto.str.upper()
+            if regla_tipo.get("contiene"):
+                coincide = texto.str.contains(regla_tipo["valor"], regex=False)
+            else:
+                coincide = texto == regla_tipo["valor"]
+            frame["tipo"] = np.where(coincide, regla_tipo["si_coincide"], regla_tipo["si_no"])
+
+        return frame
+
+    @staticmethod
+    def filas(frame):
+        """
+        Registros del frame como dicts con tipos nativos de Python
+
+        Returns:
+            list: Un dict por fila
+        """
+        columnas = list(frame.columns)
+        valores = [frame[columna].tolist() for columna in columnas]
+        return [dict(zip(columnas, fila)) for fila in zip(*valores)]
+
 # ==================== GESTIÓN DE LOGS ====================
 
 
@@ -1142,14 +2466,9 @@ class LogManager:
 
         timestamp = datetime.now().strftime(
             "%Y-%m-%d %H:%M:%S") if incluir_timestamp else ""
-        fecha_archivo = datetime.now().strftime("%Y-%m-%d")
 
         # Crear nombre del archivo de log
-        if cls._id_ejecucion:
-            nombre_archivo = f"{cls._id_ejecucion}_{cls._banco_actual}_{fecha_archivo}.log"
-        else:
-            nombre_archivo = f"{cls._banco_actual}_{fecha_archivo}.log"
-            
+        nombre_archivo = f"{cls._nombre_base_archivo()}.log"
         ruta_archivo = os.path.join(cls._ruta_logs, nombre_archivo)
 
         # Formatear mensaje
@@ -1180,11 +2499,21 @@ class LogManager:
                 print(f"Error escribiendo log en ruta principal ({e}) y fallback ({e_inner})")
                 print(f"[{cls._banco_actual}] {linea_log.strip()}")
 
+    @classmethod
+    def _nombre_base_archivo(cls):
+        """Nombre (sin extensión) de los archivos de la ejecución actual"""
+        fecha_archivo = datetime.now().strftime("%Y-%m-%d")
+        if cls._id_ejecucion:
+            return f"{cls._id_ejecucion}_{cls._banco_actual}_{fecha_archivo}"
+        return f"{cls._banco_actual}_{fecha_archivo}"
+
     @classmethod
     def iniciar_proceso(cls, banco, idEjecucion, descripcion="Proceso iniciado"):
         """Inicia un nuevo proceso de banco"""
         cls.configurar_banco(banco)
         cls.configurar_id_ejecucion(idEjecucion)
+        MedidorTiempos.reiniciar()
+        MetricasEjecucion.reiniciar()
         cls.escribir_log("INFO", "=" * 80)
         cls.escribir_log("INFO", f"INICIANDO PROCESO: {banco}")
         cls.escribir_log("INFO", descripcion)
@@ -1204,8 +2533,37 @@ class LogManager:
         if descripcion:
             cls.escribir_log("INFO", descripcion)
 
+        cls.registrar_resumen_tiempos()
+
+        ruta_metricas = MetricasEjecucion.exportar(banco, exito)
+        if ruta_metricas:
+            cls.escribir_log("INFO", f"Métricas exportadas: {ruta_metricas}")
+
         cls.escribir_log("INFO", "=" * 60)
 
+    @classmethod
+    def registrar_resumen_tiempos(cls, limite=20):
+        """
+        Escribe la tabla de tiempos de la ejecución y guarda la línea de tiempo
+        JSON junto al log ({id}_{BANCO}_{fecha}.timeline.json)
+        """
+        resumen = MedidorTiempos.resumen()
+        if not resumen:
+            return
+
+        cls.escribir_log("INFO", "⏱️ RESUMEN DE TIEMPOS")
+        cls.escribir_log(
+            "INFO", f"   {'Tramo':<40} {'Veces':>6} {'Total(s)':>9} {'Prom(s)':>8} {'Máx(s)':>8}")
+        for nombre, veces, total, promedio, maximo in resumen[:limite]:
+            cls.escribir_log(
+                "INFO", f"   {nombre[:40]:<40} {veces:>6} {total:>9.2f} {promedio:>8.2f} {maximo:>8.2f}")
+
+        ruta_timeline = os.path.join(
+            cls._ruta_logs, f"{cls._nombre_base_archivo()}.timeline.json")
+        if MedidorTiempos.guardar_linea_tiempo(
+                ruta_timeline, banco=cls._banco_actual, id_ejecucion=cls._id_ejecucion):
+            cls.escribir_log("INFO", f"Línea de tiempo guardada: {ruta_timeline}")
+
     @classmethod
     def obtener_ruta_log_actual(cls):
         """Obtiene la ruta del archivo de log actual"""
@@ -1217,32 +2575,205 @@ class LogManager:
 
 
 class BaseDatos:
-    """Clase para manejar operaciones con base de datos SQL Server"""
+    """
+    Clase para manejar operaciones con base de datos
+
+    Motores disponibles (variable de entorno RPA_BD_MOTOR o configurar_motor):
+        - sqlserver (por defecto): ODBC Driver 18 con credencialesDB.csv
+        - sqlite: archivo local (RPA_BD_SQLITE o RUTAS_CONFIG['bd_sqlite']) con
+          el mismo esquema; las consultas T-SQL se traducen con adaptar_sql.
+          Pensado para benchmarks y pruebas de ingesta sin el servidor.
+    """
+
+    MOTORES = ("sqlserver", "sqlite")
+    motor = os.environ.get("RPA_BD_MOTOR", "sqlserver").strip().lower()
+    ruta_sqlite = os.environ.get("RPA_BD_SQLITE", RUTAS_CONFIG['bd_sqlite'])
+    _esquemas_creados = set()
+
+    ESQUEMA_SQLITE = """
+        CREATE TABLE IF NOT EXISTS RegistrosBancos (
+            numCuenta TEXT NOT NULL,
+            banco TEXT NOT NULL,
+            empresa TEXT,
+            numDocumento TEXT NOT NULL,
+            idEjecucion INTEGER,
+            fechaTransaccion TEXT,
+            tipo TEXT,
+            valor REAL,
+            saldoContable REAL,
+            disponible REAL,
+            oficina TEXT,
+            referencia TEXT,
+            contFecha INTEGER,
+            conceptoTransaccion TEXT,
+            ordenante TEXT,
+            PRIMARY KEY (numCuenta, banco, numDocumento)
+        );
+        CREATE INDEX IF NOT EXISTS IX_RegistrosBancos_Fecha
+            ON RegistrosBancos (numCuenta, banco, empresa, fechaTransaccion);
+        CREATE TABLE IF NOT EXISTS AutomationRun (
+            idAutomationRun INTEGER PRIMARY KEY,
+            processName TEXT,
+            startDate TEXT,
+            endDate TEXT,
+            finalizationStatus TEXT
+        );
+        CREATE TABLE IF NOT EXISTS AutomationLog (
+            idAutomationLog INTEGER PRIMARY KEY AUTOINCREMENT,
+            idAutomationRun INTEGER,
+            processName TEXT,
+            dateLog TEXT,
+            statusLog TEXT,
+            action TEXT
+        );
+        CREATE TABLE IF NOT EXISTS AutomationJob (
+            idJob INTEGER PRIMARY KEY AUTOINCREMENT,
+            banco TEXT NOT NULL,
+            empresa TEXT,
+            fechaDesde TEXT,
+            fechaHasta TEXT,
+            estado TEXT NOT NULL DEFAULT 'Pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            maxIntentos INTEGER NOT NULL DEFAULT 3,
+            trabajador TEXT,
+            leaseHasta TEXT,
+            ultimoLatido TEXT,
+            creado TEXT,
+            actualizado TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS IX_AutomationJob_Estado
+            ON AutomationJob (estado, banco, leaseHasta);
+    """
 
-    @staticmethod
-    def conexionBD(servidor, database, usuario, password):
+    @classmethod
+    def configurar_motor(cls, motor, ruta_sqlite=None):
         """
-        Establece conexión con base de datos SQL Server
+        Selecciona el motor de base de datos
 
         Args:
-            servidor: Servidor SQL Server
-            database: Nombre de la base de datos
-            usuario: Usuario de la base de datos
-            password: Contraseña de la base de datos
+            motor: 'sqlserver' o 'sqlite'
+            ruta_sqlite: Archivo SQLite (solo motor sqlite)
 
         Returns:
-            tuple: (conexion, cursor) o (None, None) si falla
+            bool: True si el motor es válido
         """
-        try:
-            import pyodbc
+        motor = str(motor).strip().lower()
+        if motor not in cls.MOTORES:
+            LogManager.escribir_log(
+                "ERROR", f"Motor de BD no soportado: {motor} (opciones: {', '.join(cls.MOTORES)})")
+            return False
+        cls.motor = motor
+        if ruta_sqlite:
+            cls.ruta_sqlite = ruta_sqlite
+        return True
 
-            connection_string = f"DRIVER={{ODBC Driver 18 for SQL Server}};SERVER={servidor};DATABASE={database};UID={usuario};PWD={password};TrustServerCertificate=yes"
-            conn = pyodbc.connect(connection_string)
-            cursor = conn.cursor()
+    @staticmethod
+    def adaptar_sql(query):
+        """
+        Traduce las construcciones T-SQL usadas en el proyecto a SQLite
+        (SYSDATETIME/GETDATE, TOP n, ISNULL, LEN y hints WITH (NOLOCK...)).
+        Con el motor sqlserver devuelve la consulta sin cambios.
+        """
+        if BaseDatos.motor != "sqlite":
+            return query
+
+        sql = re.sub(r"\b(SYSDATETIME|GETDATE)\s*\(\s*\)",
+                     "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')", query, flags=re.IGNORECASE)
+        sql = re.sub(r"\bISNULL\s*\(", "IFNULL(", sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\bLEN\s*\(", "LENGTH(", sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\bWITH\s*\(\s*(?:NOLOCK|UPDLOCK|HOLDLOCK|ROWLOCK|READPAST)(?:\s*,\s*(?:NOLOCK|UPDLOCK|HOLDLOCK|ROWLOCK|READPAST))*\s*\)",
+                     "", sql, flags=re.IGNORECASE)
+
+        top = re.search(r"\bSELECT\s+(DISTINCT\s+)?TOP\s*\(?\s*(\d+)\s*\)?", sql, flags=re.IGNORECASE)
+        if top:
+            sql = (sql[:top.start()] + "SELECT " + (top.group(1) or "") + sql[top.end():]).rstrip().rstrip(";")
+            sql = f"{sql} LIMIT {top.group(2)}"
+        return sql
 
-            # LogManager.escribir_log(
-            #     "SUCCESS", f"Conexión exitosa a BD: {database} en {servidor}")
-            return conn, cursor
+    @staticmethod
+    @MedidorTiempos.medido("bd.conectar")
+    def conexion_sqlite(ruta=None):
+        """
+        Abre el archivo SQLite local creando el esquema la primera vez
+
+        Returns:
+            tuple: (conexion, cursor) o (None, None) si falla
+        """
+        ruta = ruta or BaseDatos.ruta_sqlite
+        try:
+            directorio = os.path.dirname(ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conn = sqlite3.connect(ruta, timeout=30)
+            if ruta not in BaseDatos._esquemas_creados:
+                conn.executescript(BaseDatos.ESQUEMA_SQLITE)
+                BaseDatos._esquemas_creados.add(ruta)
+            return conn, conn.cursor()
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"Error abriendo BD SQLite {ruta}: {str(e)}")
+            return None, None
+
+    @staticmethod
+    def abrir_conexion():
+        """
+        Abre una conexión con el motor configurado
+
+        Returns:
+            tuple: (conexion, cursor)
+
+        Raises:
+            Exception: Si faltan credenciales o no se pudo conectar
+        """
+        if BaseDatos.motor == "sqlite":
+            conn, cursor = BaseDatos.conexion_sqlite()
+        else:
+            # Leer credenciales desde el archivo CSV
+            credenciales = LectorArchivos.leerCSV(
+                RUTAS_CONFIG["credenciales_bd"])
+            credenciales = credenciales[0] if credenciales else []
+
+            if len(credenciales) < 4:
+                raise Exception("Credenciales incompletas para base de datos")
+
+            conn, cursor = BaseDatos.conexionBD(
+                credenciales[0],  # servidor
+                credenciales[1],  # database
+                credenciales[2],  # usuario
+                credenciales[3]   # password
+            )
+
+        if not conn or not cursor:
+            raise Exception(
+                "No se pudo establecer conexión a la base de datos")
+        return conn, cursor
+
+    @staticmethod
+    @MedidorTiempos.medido("bd.conectar")
+    def conexionBD(servidor, database, usuario, password):
+        """
+        Establece conexión con base de datos SQL Server
+
+        Args:
+            servidor: Servidor SQL Server
+            database: Nombre de la base de datos
+            usuario: Usuario de la base de datos
+            password: Contraseña de la base de datos
+
+        Returns:
+            tuple: (conexion, cursor) o (None, None) si falla
+        """
+        try:
+            import pyodbc
+
+            connection_string = f"DRIVER={{ODBC Driver 18 for SQL Server}};SERVER={servidor};DATABASE={database};UID={usuario};PWD={password};TrustServerCertificate=yes"
+            conn = pyodbc.connect(connection_string)
+            cursor = conn.cursor()
+
+            # LogManager.escribir_log(
+            #     "SUCCESS", f"Conexión exitosa a BD: {database} en {servidor}")
+            return conn, cursor
 
         except Exception as e:
             LogManager.escribir_log(
@@ -1321,6 +2852,7 @@ class BaseDatos:
             return resultados
 
     @staticmethod
+    @MedidorTiempos.medido("bd.consultar")
     def consultarBD(query):
         """
         Ejecuta una consulta SELECT en la base de datos
@@ -1335,26 +2867,9 @@ class BaseDatos:
         cursor = None
 
         try:
-            # Leer credenciales desde el archivo CSV
-            credenciales = LectorArchivos.leerCSV(
-                RUTAS_CONFIG["credenciales_bd"])
-            credenciales = credenciales[0] if credenciales else []
-
-            if len(credenciales) < 4:
-                raise Exception("Credenciales incompletas para base de datos")
-
-            conn, cursor = BaseDatos.conexionBD(
-                credenciales[0],  # servidor
-                credenciales[1],  # database
-                credenciales[2],  # usuario
-                credenciales[3]   # password
-            )
-
-            if not conn or not cursor:
-                raise Exception(
-                    "No se pudo establecer conexión a la base de datos")
+            conn, cursor = BaseDatos.abrir_conexion()
 
-            cursor.execute(query)
+            cursor.execute(BaseDatos.adaptar_sql(query))
             resultados = cursor.fetchall()
 
             # PROCESAR AUTOMÁTICAMENTE LAS FECHAS
@@ -1373,6 +2888,7 @@ class BaseDatos:
                 conn.close()
 
     @staticmethod
+    @MedidorTiempos.medido("bd.ejecutar")
     def ejecutarSQL(query):
         """
         Ejecuta una consulta INSERT, UPDATE o DELETE en la base de datos
@@ -1388,26 +2904,9 @@ class BaseDatos:
         cursor = None
 
         try:
-            # Leer credenciales desde el archivo CSV
-            credenciales = LectorArchivos.leerCSV(
-                RUTAS_CONFIG["credenciales_bd"])
-            credenciales = credenciales[0] if credenciales else []
-
-            if len(credenciales) < 4:
-                raise Exception("Credenciales incompletas para base de datos")
-
-            conn, cursor = BaseDatos.conexionBD(
-                credenciales[0],  # servidor
-                credenciales[1],  # database
-                credenciales[2],  # usuario
-                credenciales[3]   # password
-            )
-
-            if not conn or not cursor:
-                raise Exception(
-                    "No se pudo establecer conexión a la base de datos")
+            conn, cursor = BaseDatos.abrir_conexion()
 
-            cursor.execute(query)
+            cursor.execute(BaseDatos.adaptar_sql(query))
             conn.commit()
 
             # LogManager.escribir_log("SUCCESS", f"Query ejecutado exitosamente")
@@ -1425,6 +2924,65 @@ class BaseDatos:
             if conn:
                 conn.close()
 
+    @staticmethod
+    @MedidorTiempos.medido("bd.ejecutar")
+    def registrar_ejecucion(tabla_runs, nombre_proceso, estado="Running"):
+        """
+        Reserva el ID de una ejecución e inserta su fila de inicio en un solo
+        viaje a la BD. El MAX()+1 y el INSERT son la misma sentencia: en SQL
+        Server con UPDLOCK, HOLDLOCK (dos bots que arrancan a la vez se
+        serializan en vez de obtener el mismo ID); en SQLite la escritura ya
+        es exclusiva y el ID es el rowid insertado.
+
+        Args:
+            tabla_runs: Tabla de ejecuciones (ej: DATABASE_RUNS)
+            nombre_proceso: processName de la ejecución
+            estado: finalizationStatus inicial
+
+        Returns:
+            int: ID de la ejecución (int(time.time()) si la BD no respondió)
+        """
+        conn = None
+        cursor = None
+        nombre = str(nombre_proceso).replace("'", "''")
+
+        try:
+            conn, cursor = BaseDatos.abrir_conexion()
+
+            if BaseDatos.motor == "sqlite":
+                cursor.execute(f"""
+                    INSERT INTO {tabla_runs} (idAutomationRun, processName, startDate, finalizationStatus)
+                    SELECT IFNULL(MAX(idAutomationRun), 0) + 1, '{nombre}',
+                           strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'), '{estado}'
+                    FROM {tabla_runs}
+                """)
+                id_ejecucion = cursor.lastrowid
+            else:
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    INSERT INTO {tabla_runs} (idAutomationRun, processName, startDate, finalizationStatus)
+                    OUTPUT INSERTED.idAutomationRun
+                    SELECT ISNULL(MAX(idAutomationRun), 0) + 1, '{nombre}', SYSDATETIME(), '{estado}'
+                    FROM {tabla_runs} WITH (UPDLOCK, HOLDLOCK)
+                """)
+                id_ejecucion = cursor.fetchone()[0]
+            conn.commit()
+
+            return int(id_ejecucion)
+
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"Error registrando ejecución en {tabla_runs}: {str(e)}")
+            if conn:
+                conn.rollback()
+            return int(time.time())  # Fallback
+
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
     @staticmethod
     def insertarBD(query):
         """
@@ -1455,17 +3013,7 @@ class BaseDatos:
         cursor = None
 
         try:
-            # Leer credenciales desde el archivo CSV
-            credenciales = LectorArchivos.leerCSV(
-                RUTAS_CONFIG["credenciales_bd"])
-            credenciales = credenciales[0] if credenciales else []
-
-            conn, cursor = BaseDatos.conexionBD(
-                credenciales[0],  # servidor
-                credenciales[1],  # database
-                credenciales[2],  # usuario
-                credenciales[3]   # password
-            )
+            conn, cursor = BaseDatos.abrir_conexion()
 
             if conn and cursor:
                 # Ejecutar una consulta simple para verificar
@@ -1492,6 +3040,27 @@ class BaseDatos:
 class CorreoManager:
     """Clase para manejar operaciones de correo IMAP"""
 
+    @staticmethod
+    def _abrir_imap(servidor):
+        """
+        Abre la conexión IMAP con el servidor indicado. Si RPA_IMAP_SIMULADO
+        (host:puerto) está definido se conecta sin SSL al IMAP falso de
+        benchmarks/simulador.py; las credenciales se envían igual.
+
+        Args:
+            servidor: Servidor IMAP de credencialesCorreo.csv
+
+        Returns:
+            imaplib.IMAP4: Conexión sin autenticar
+        """
+        import imaplib
+
+        simulado = os.environ.get("RPA_IMAP_SIMULADO")
+        if simulado:
+            host, _, puerto = simulado.rpartition(":")
+            return imaplib.IMAP4(host or "127.0.0.1", int(puerto))
+        return imaplib.IMAP4_SSL(servidor)
+
     @staticmethod
     def conectar_imap(carpeta="inbox", key='mail.maxximundo.com'):
         """
@@ -1504,8 +3073,6 @@ class CorreoManager:
             imaplib.IMAP4_SSL: Conexión IMAP o None si falla
         """
         try:
-            import imaplib
-
             # Leer credenciales de correo desde el archivo de configuración
             credenciales_correo = LectorArchivos.leerCSV(
                 RUTAS_CONFIG['credenciales_correo'],
@@ -1523,7 +3090,7 @@ class CorreoManager:
             usuario = fila_correo[1]
             password = fila_correo[2]
 
-            conexion = imaplib.IMAP4_SSL(servidor)
+            conexion = CorreoManager._abrir_imap(servidor)
             conexion.login(usuario, password)
             conexion.select(carpeta)
 
@@ -1548,7 +3115,6 @@ class CorreoManager:
             email.message.Message: Mensaje de correo o None si falla
         """
         try:
-            import imaplib
             import email
 
             conexion = CorreoManager.conectar_imap(carpeta, key)
@@ -1619,6 +3185,7 @@ class CorreoManager:
             return ""
 
     @staticmethod
+    @MedidorTiempos.medido("correo.obtener_codigo")
     def obtener_codigo_correo(asunto="Nuevo token", intentos=60, espera=1, key='mail.maxximundo.com', timestamp_inicio=None):
         """
         Obtiene un código de 6 dígitos de un correo electrónico específico
@@ -1636,7 +3203,6 @@ class CorreoManager:
         """
         mail = None
         try:
-            import imaplib
             import email
             import time
             import re
@@ -1674,7 +3240,7 @@ class CorreoManager:
                 "INFO", f"Conectando a {servidor} con usuario {correo}")
 
             # Conectar a IMAP
-            mail = imaplib.IMAP4_SSL(servidor)
+            mail = CorreoManager._abrir_imap(servidor)
             mail.login(correo, clave_correo)
             mail.select("inbox")
 
@@ -2175,10 +3741,74 @@ class ConfiguracionManager:
                 "ERROR", f"Error leyendo configuraciones para ID {id_busqueda}: {str(e)}")
             raise
 
+    @staticmethod
+    def empresas_filtro():
+        """
+        Empresas a procesar indicadas por RPA_EMPRESAS: lista JSON
+        (ej: '["EMPRESA, S.A."]') o, si no empieza con '[', separada por comas
+
+        La define el trabajador de la cola (trabajador_cola.py) en JSON para
+        que un bot procese solo la empresa de su trabajo aunque el nombre
+        tenga comas.
+
+        Returns:
+            list: Nombres de empresa, o None si se deben procesar todas
+        """
+        valor = os.environ.get("RPA_EMPRESAS", "").strip()
+        if valor.startswith("["):
+            try:
+                empresas = [str(e).strip() for e in json.loads(valor) if str(e).strip()]
+                return empresas or None
+            except ValueError:
+                LogManager.escribir_log(
+                    "WARNING", f"RPA_EMPRESAS no es una lista JSON válida: {valor}")
+        empresas = [e.strip() for e in valor.split(",") if e.strip()]
+        return empresas or None
+
+    @staticmethod
+    def incluir_empresa(nombre):
+        """
+        Indica si una empresa pasa el filtro RPA_EMPRESAS
+
+        La comparación ignora mayúsculas y acepta nombres parciales en ambos
+        sentidos ('MAXXIMUNDO' coincide con 'MAXXIMUNDO CIA. LTDA.').
+
+        Args:
+            nombre: Nombre de la empresa en el portal
+
+        Returns:
+            bool: True si no hay filtro o la empresa está incluida
+        """
+        filtro = ConfiguracionManager.empresas_filtro()
+        if not filtro:
+            return True
+        nombre = str(nombre).strip().upper()
+        return any(e.upper() in nombre or nombre in e.upper() for e in filtro)
+
+    @staticmethod
+    def ventana_fechas():
+        """
+        Ventana de fechas explícita indicada por RPA_FECHA_DESDE / RPA_FECHA_HASTA
+
+        Returns:
+            tuple: (fecha_desde, fecha_hasta) en formato dd/mm/yyyy, o None si no se definió
+        """
+        fecha_desde = os.environ.get("RPA_FECHA_DESDE", "").strip()
+        fecha_hasta = os.environ.get("RPA_FECHA_HASTA", "").strip()
+        if fecha_desde and fecha_hasta:
+            return fecha_desde, fecha_hasta
+        return None
+
     @staticmethod
     def actualizar_configuraciones_fecha():
         """Actualiza las configuraciones de fecha para la próxima ejecución"""
         try:
+            if ConfiguracionManager.ventana_fechas():
+                # Ventana explícita (trabajo de la cola): no mover la ventana diaria
+                LogManager.escribir_log(
+                    "DEBUG", "Ventana de fechas explícita, configuraciones.csv no se actualiza")
+                return True
+
             LogManager.escribir_log(
                 "INFO", "Actualizando configuraciones de fecha...")
 
@@ -2210,89 +3840,1520 @@ class ConfiguracionManager:
                 "ERROR", f"Error actualizando configuraciones: {str(e)}")
             return False
 
-# ==================== GESTIÓN DE SUBPROCESOS ====================
-
+# ==================== CONTROL DE TIEMPOS ====================
 
-class SubprocesoManager:
-    """Clase para manejar subprocesos de forma segura"""
-    @staticmethod
-    def ejecutar_bat_final():
-        """Ejecuta el archivo BAT al finalizar el bot"""
-        try:
-            # Ruta al archivo BAT en el escritorio
-            ruta_bat = RUTAS_CONFIG['bat_final']
+# Presupuestos por fase en segundos. Las fases con nombre "fase:detalle"
+# (ej: "descarga:MAXXIMUNDO") usan el presupuesto de "fase".
+PRESUPUESTOS_FASE = {
+    'login': 300,
+    'otp': 180,
+    'navegacion': 180,
+    'descarga': 180,  # Por empresa/cuenta
+    'ingesta': 300,   # Por archivo
+}
 
-            # Verificar si el archivo existe
-            if not os.path.exists(ruta_bat):
-                LogManager.escribir_log(
-                    "WARNING", f"Archivo BAT no encontrado: {ruta_bat}")
-                return False
 
-            LogManager.escribir_log(
-                "INFO", f"🔄 Ejecutando archivo BAT: {ruta_bat}")
+class CancelacionPorTiempo(BaseException):
+    """
+    Cancelación por presupuesto de tiempo agotado
+
+    Hereda de BaseException para que los `except Exception` intermedios no la
+    absorban; los bloques finally (cierre de navegador, etc.) sí se ejecutan.
+    """
+
+
+def formatear_tiempo_ejecucion(tiempo_delta):
+    """Formatea la duración de tiempo en formato legible"""
+    total_seconds = int(tiempo_delta.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+
+    if hours > 0:
+        return f"{hours}h {minutes}m {seconds}s"
+    elif minutes > 0:
+        return f"{minutes}m {seconds}s"
+    else:
+        return f"{seconds}s"
+
+
+class TimeoutManager:
+    """
+    Maneja el timeout global y los presupuestos por fase de una ejecución
+
+    Al agotarse el timeout global o el presupuesto de una fase activa:
+        1. Registra la ejecución como 'Timeout' en la tabla de runs (si se configuró)
+           y solicita el script de unión para publicar lo ya insertado.
+        2. Lanza CancelacionPorTiempo en el hilo principal (cierre ordenado).
+        3. Si el proceso no termina en `gracia_segundos`, fuerza la salida.
+    """
+
+    def __init__(self, timeout_seconds=600, presupuestos=None, gracia_segundos=30):
+        self.timeout_seconds = timeout_seconds
+        self.presupuestos = dict(PRESUPUESTOS_FASE)
+        self.presupuestos.update(presupuestos or {})
+        self.gracia_segundos = gracia_segundos
+        self.start_time = None
+        self.is_timeout = False
+        self.motivo = None
+        self.tabla_runs = None
+        self.id_ejecucion = None
+        self.tiempos_fase = []
+        self._fases_activas = []
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._vigilante = None
+        self._timer_gracia = None
+        self._manejador_anterior = None
+
+    def configurar_ejecucion(self, tabla_runs, id_ejecucion):
+        """Indica la fila de la tabla de runs a marcar como 'Timeout' al cancelar"""
+        self.tabla_runs = tabla_runs
+        self.id_ejecucion = id_ejecucion
+
+    def start(self):
+        """Inicia el vigilante de timeout"""
+        self.start_time = datetime.now()
+        self.is_timeout = False
+        self.motivo = None
+        self.tiempos_fase = []
+        self._fases_activas = []
+        self._detener.clear()
+        LogManager.escribir_log(
+            "INFO", f"Timeout manager iniciado: {self.timeout_seconds//60} minutos")
+
+        # La cancelación se entrega al hilo principal mediante SIGUSR1
+        if threading.current_thread() is threading.main_thread():
+            self._manejador_anterior = signal.signal(
+                signal.SIGUSR1, self._manejador_cancelacion)
+
+        self._vigilante = threading.Thread(
+            target=self._vigilar, name="timeout-manager", daemon=True)
+        self._vigilante.start()
+
+    def _vigilar(self):
+        """Hilo vigilante: revisa cada segundo el timeout global y las fases activas"""
+        while not self._detener.wait(1):
+            inicio = self.start_time
+            if inicio is None:
+                return
+            transcurrido = (datetime.now() - inicio).total_seconds()
+            if transcurrido > self.timeout_seconds:
+                self._cancelar(
+                    f"timeout global alcanzado ({formatear_tiempo_ejecucion(self.get_elapsed_time())})")
+                return
+
+            with self._lock:
+                fases = list(self._fases_activas)
+            for nombre, inicio, presupuesto in fases:
+                if presupuesto and time.time() - inicio > presupuesto:
+                    self._cancelar(
+                        f"presupuesto de la fase '{nombre}' agotado ({presupuesto}s)")
+                    return
+
+    def _cancelar(self, motivo):
+        """Registra el estado de la ejecución y cancela el hilo principal"""
+        self.is_timeout = True
+        self.motivo = motivo
+        LogManager.escribir_log("ERROR", f"TIMEOUT: {motivo}")
+
+        if self.tabla_runs and self.id_ejecucion:
+            BaseDatos.ejecutarSQL(f"""
+                UPDATE {self.tabla_runs}
+                SET endDate = SYSDATETIME(), finalizationStatus = 'Timeout'
+                WHERE idAutomationRun = {self.id_ejecucion}
+            """)
+            SubprocesoManager.ejecutar_bat_final()
+
+        # Salida forzada si el cierre ordenado no termina a tiempo
+        self._timer_gracia = threading.Timer(
+            self.gracia_segundos, self._salida_forzada)
+        self._timer_gracia.daemon = True
+        self._timer_gracia.start()
+
+        if self._manejador_anterior is not None:
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGUSR1)
+        else:
+            _thread.interrupt_main()
 
-            # Ejecutar el BAT y esperar a que termine
-            resultado = subprocess.run(
-                ruta_bat,
-                shell=True,
-                capture_output=False,  # No capturar output
-                stdout=subprocess.DEVNULL,  # Suprimir stdout
-                stderr=subprocess.DEVNULL,  # Suprimir stderr,
-                timeout=300  # Timeout de 5 minutos
-            )
+    def _manejador_cancelacion(self, signum, frame):
+        """Manejador de SIGUSR1 en el hilo principal"""
+        if self.is_timeout:
+            raise CancelacionPorTiempo(self.motivo or "timeout")
 
-            # Verificar el resultado
-            if resultado.returncode == 0:
-                LogManager.escribir_log(
-                    "SUCCESS", "✅ Archivo BAT ejecutado exitosamente")
+    def _salida_forzada(self):
+        """Último recurso si el cierre ordenado se bloquea"""
+        LogManager.escribir_log(
+            "ERROR", f"Cierre ordenado no terminó en {self.gracia_segundos}s, forzando salida")
+        os._exit(1)
 
-                return True
-            else:
-                LogManager.escribir_log(
-                    "ERROR", f"❌ Error ejecutando BAT. Código: {resultado.returncode}")
+    @contextmanager
+    def fase(self, nombre, presupuesto=None):
+        """
+        Context manager que mide una fase y aplica su presupuesto
 
-                return False
+        Args:
+            nombre: Nombre de la fase ('login', 'otp', 'descarga:EMPRESA', ...)
+            presupuesto: Segundos permitidos (por defecto según PRESUPUESTOS_FASE)
 
-        except subprocess.TimeoutExpired:
-            LogManager.escribir_log(
-                "ERROR", "❌ Timeout ejecutando archivo BAT (5 minutos)")
-            return False
-        except Exception as e:
-            LogManager.escribir_log(
-                "ERROR", f"❌ Error ejecutando archivo BAT: {str(e)}")
-            return False
+        Ejemplo:
+            with timeout_manager.fase("login"):
+                realizar_login(page)
+        """
+        if presupuesto is None:
+            presupuesto = self.presupuestos.get(nombre.split(":")[0])
+        registro = (nombre, time.time(), presupuesto)
+        with self._lock:
+            self._fases_activas.append(registro)
+        try:
+            with MedidorTiempos.medir(nombre):
+                yield
+        finally:
+            with self._lock:
+                if registro in self._fases_activas:
+                    self._fases_activas.remove(registro)
+                self.tiempos_fase.append((nombre, time.time() - registro[1]))
+            MetricasEjecucion.registrar_fase(nombre, time.time() - registro[1])
+
+    def check(self):
+        """Verifica si se ha alcanzado el timeout"""
+        if self.is_timeout:
+            raise CancelacionPorTiempo(
+                f"Proceso terminado por {self.motivo}")
+
+    def verificar(self, func):
+        """Decorator que verifica timeout antes de ejecutar funciones críticas"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            self.check()
+            return func(*args, **kwargs)
+        return wrapper
+
+    def get_elapsed_time(self):
+        """Obtiene el tiempo transcurrido"""
+        if self.start_time:
+            return datetime.now() - self.start_time
+        return timedelta(0)
+
+    def registrar_resumen_fases(self):
+        """Escribe en el log el tiempo consumido por cada fase"""
+        if not self.tiempos_fase:
+            return
+        LogManager.escribir_log("INFO", "⏱️ Tiempo por fase:")
+        for nombre, segundos in self.tiempos_fase:
+            presupuesto = self.presupuestos.get(nombre.split(":")[0])
+            limite = f" / {presupuesto}s" if presupuesto else ""
+            LogManager.escribir_log("INFO", f"   {nombre}: {segundos:.1f}s{limite}")
+
+    def stop(self):
+        """Detiene el vigilante y reporta los tiempos por fase"""
+        self._detener.set()
+        if self._timer_gracia:
+            self._timer_gracia.cancel()
+            self._timer_gracia = None
+        if self._manejador_anterior is not None:
+            try:
+                signal.signal(signal.SIGUSR1, self._manejador_anterior)
+            except Exception:
+                pass
+            self._manejador_anterior = None
+        if self.start_time:
+            self.registrar_resumen_fases()
+            self.start_time = None
 
-# ==================== EXPORTACIÓN DE FUNCIONES PRINCIPALES ====================
+# ==================== CHECKPOINT DE EJECUCIÓN ====================
 
-# Para mantener compatibilidad con código existente
 
+class CheckpointManager:
+    """
+    Estado por empresa/cuenta de una ventana de fechas, persistido en JSON
 
-def clickComponente(page, selector, intentos=5, timeout=30000, descripcion="elemento"):
-    return ComponenteInteraccion.clickComponente(page, selector, intentos, timeout, descripcion)
+    Permite que una re-ejecución (tras un timeout o error) procese solo lo
+    pendiente. El archivo se elimina cuando todas las empresas de la ventana
+    quedan completadas.
 
+    Estados: en_proceso, descargado, ingerido, sin_datos, fallido
+    """
 
-def escribirComponente(page, selector, valor, intentos=5, timeout=15000, descripcion="campo"):
-    return ComponenteInteraccion.escribirComponente(page, selector, valor, intentos, timeout, descripcion)
+    ESTADOS_COMPLETADOS = ("ingerido", "sin_datos")
+    ESTADOS_FALLIDOS = ("fallido", "en_proceso", "descargado")
 
+    def __init__(self, banco, ventana, solo_fallidos=False):
+        """
+        Args:
+            banco: Nombre del banco (ej: 'Banco Produbanco')
+            ventana: Identificador de la ventana de fechas (ej: '01/02/2026_05/02/2026')
+            solo_fallidos: Si True (--resume), solo se reintentan empresas fallidas
+        """
+        self.banco = banco
+        self.ventana = ventana
+        self.solo_fallidos = solo_fallidos
+        nombre = re.sub(r"[^A-Za-z0-9]+", "_", f"{banco}_{ventana}").strip("_")
+        self.ruta = os.path.join(RUTAS_CONFIG['checkpoints'], f"{nombre}.json")
+        self.empresas = self._cargar()
+
+    def _cargar(self):
+        """Carga el checkpoint existente (vacío si no hay)"""
+        try:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, 'r', encoding='utf-8') as archivo:
+                    empresas = json.load(archivo).get("empresas", {})
+                LogManager.escribir_log(
+                    "INFO", f"📌 Checkpoint encontrado para {self.ventana}: {len(empresas)} empresas registradas")
+                return empresas
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo leer checkpoint {self.ruta}: {str(e)}")
+        return {}
 
-def leerComponente(page, selector, intentos=5, timeout=15000, descripcion="elemento"):
-    return ComponenteInteraccion.leerComponente(page, selector, intentos, timeout, descripcion)
+    def _guardar(self):
+        """Guarda el checkpoint de forma atómica"""
+        try:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                json.dump({"banco": self.banco, "ventana": self.ventana,
+                           "empresas": self.empresas}, archivo, ensure_ascii=False, indent=2)
+            os.replace(temporal, self.ruta)
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo guardar checkpoint {self.ruta}: {str(e)}")
 
+    def estado(self, empresa):
+        """Estado registrado de una empresa (None si nunca se procesó)"""
+        return self.empresas.get(empresa, {}).get("estado")
 
-def leerValorInput(page, selector, intentos=5, timeout=15000, descripcion="input"):
-    return ComponenteInteraccion.leerValorInput(page, selector, intentos, timeout, descripcion)
+    def debe_procesar(self, empresa):
+        """Indica si la empresa debe procesarse en esta ejecución"""
+        estado = self.estado(empresa)
+        if estado in self.ESTADOS_COMPLETADOS:
+            return False
+        if self.solo_fallidos:
+            return estado in self.ESTADOS_FALLIDOS
+        return True
 
+    def marcar(self, empresa, estado, **detalles):
+        """
+        Registra el estado de una empresa y lo persiste
 
-def esperarElemento(page, selector, timeout=30000, estado='visible', descripcion="elemento"):
-    return ComponenteInteraccion.esperarElemento(page, selector, timeout, estado, descripcion)
+        Args:
+            empresa: Nombre de la empresa/cuenta
+            estado: Nuevo estado
+            **detalles: Datos adicionales (ej: ruta del archivo descargado)
+        """
+        registro = {"estado": estado,
+                    "actualizado": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        registro.update(detalles)
+        self.empresas[empresa] = registro
+        self._guardar()
+
+    def archivo_descargado(self, empresa):
+        """Ruta del archivo ya descargado y aún no ingerido (None si no existe)"""
+        registro = self.empresas.get(empresa, {})
+        ruta = registro.get("ruta")
+        if registro.get("estado") == "descargado" and ruta and os.path.exists(ruta):
+            return ruta
+        return None
+
+    def finalizar(self, empresas):
+        """
+        Elimina el checkpoint si todas las empresas quedaron completadas
 
+        Args:
+            empresas: Empresas esperadas en la ventana
 
-def leerCSV(ruta_archivo, filtro_columna=None, valor_filtro=None):
-    return LectorArchivos.leerCSV(ruta_archivo, filtro_columna, valor_filtro)
+        Returns:
+            bool: True si la ventana quedó completa
+        """
+        pendientes = [e for e in empresas if self.estado(e) not in self.ESTADOS_COMPLETADOS]
+        if pendientes:
+            LogManager.escribir_log(
+                "WARNING", f"📌 Checkpoint conservado, empresas pendientes: {', '.join(pendientes)}")
+            return False
+        try:
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo eliminar checkpoint {self.ruta}: {str(e)}")
+        return True
+
+# ==================== COLA DE TRABAJOS ====================
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos en la base de datos (tabla AutomationJob) compartida por
+    los trabajadores de todos los hosts (trabajador_cola.py)
+
+    Cada trabajo es un banco con, opcionalmente, una empresa y una ventana de
+    fechas. Un trabajador lo toma con un lease (leaseHasta) que renueva con
+    latidos mientras el bot corre; si el host cae, el lease vence y otro
+    trabajador lo vuelve a tomar hasta agotar maxIntentos.
+
+    - Las tomas se serializan (sp_getapplock en SQL Server, BEGIN IMMEDIATE en
+      SQLite) y todas las horas salen del reloj de la BD, no del host.
+    - Solo hay un trabajo EnCurso por banco a la vez: el portal admite una
+      sesión por usuario.
+
+    Estados: Pendiente, EnCurso, Exitoso, Error
+    """
+
+    TABLA = "AutomationJob"
+
+    ESQUEMA_SQLSERVER = """
+        IF OBJECT_ID('AutomationJob', 'U') IS NULL
+        BEGIN
+            CREATE TABLE AutomationJob (
+                idJob INT IDENTITY(1,1) PRIMARY KEY,
+                banco NVARCHAR(50) NOT NULL,
+                empresa NVARCHAR(200) NULL,
+                fechaDesde NVARCHAR(10) NULL,
+                fechaHasta NVARCHAR(10) NULL,
+                estado NVARCHAR(20) NOT NULL DEFAULT 'Pendiente',
+                intentos INT NOT NULL DEFAULT 0,
+                maxIntentos INT NOT NULL DEFAULT 3,
+                trabajador NVARCHAR(200) NULL,
+                leaseHasta DATETIME2 NULL,
+                ultimoLatido DATETIME2 NULL,
+                creado DATETIME2 NOT NULL DEFAULT SYSDATETIME(),
+                actualizado DATETIME2 NULL,
+                error NVARCHAR(1000) NULL
+            );
+            CREATE INDEX IX_AutomationJob_Estado ON AutomationJob (estado, banco, leaseHasta);
+        END
+    """
 
+    @staticmethod
+    def _texto(valor):
+        """Literal SQL de un valor opcional ('...' escapado o NULL)"""
+        if valor is None or str(valor).strip() == "":
+            return "NULL"
+        return "'" + str(valor).strip().replace("'", "''") + "'"
 
-def leerExcel(ruta_archivo, hoja=0, data_only=True):
-    return LectorArchivos.leerExcel(ruta_archivo, hoja, data_only)
+    @staticmethod
+    def _ahora(segundos=0):
+        """Expresión SQL de la hora de la BD desplazada en segundos"""
+        if BaseDatos.motor == "sqlite":
+            return f"strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime', '{int(segundos):+d} seconds')"
+        return f"DATEADD(SECOND, {int(segundos)}, SYSDATETIME())"
+
+    @staticmethod
+    def _ejecutar(consulta):
+        """
+        Ejecuta una sentencia de la cola en su propia transacción
+
+        Returns:
+            int: Filas afectadas, o -1 si falló
+        """
+        conn = None
+        cursor = None
+        try:
+            conn, cursor = BaseDatos.abrir_conexion()
+            cursor.execute(consulta)
+            filas = cursor.rowcount
+            conn.commit()
+            return filas
+        except Exception as e:
+            LogManager.escribir_log("ERROR", f"Error en cola de trabajos: {str(e)}")
+            if conn:
+                conn.rollback()
+            return -1
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def asegurar_tabla():
+        """
+        Crea la tabla AutomationJob si no existe (en SQLite ya es parte del esquema)
+
+        Returns:
+            bool: True si la tabla está disponible
+        """
+        if BaseDatos.motor == "sqlite":
+            return BaseDatos.conexion_sqlite()[0] is not None
+        return ColaTrabajos._ejecutar(ColaTrabajos.ESQUEMA_SQLSERVER) != -1
+
+    @staticmethod
+    def encolar(banco, empresa=None, fecha_desde=None, fecha_hasta=None, max_intentos=3):
+        """
+        Agrega un trabajo, salvo que ya exista uno igual Pendiente o EnCurso
+
+        Args:
+            banco: Clave del robot (ej: 'produbanco', ver orquestador.ROBOTS)
+            empresa: Empresa a procesar (None = todas)
+            fecha_desde: Inicio de la ventana dd/mm/yyyy (None = la del bot)
+            fecha_hasta: Fin de la ventana dd/mm/yyyy
+            max_intentos: Tomas permitidas antes de marcarlo como Error
+
+        Returns:
+            bool: True si se encoló, False si ya existía o hubo error
+        """
+        t = ColaTrabajos.TABLA
+        banco, empresa = ColaTrabajos._texto(banco), ColaTrabajos._texto(empresa)
+        desde, hasta = ColaTrabajos._texto(fecha_desde), ColaTrabajos._texto(fecha_hasta)
+        bloqueo = "" if BaseDatos.motor == "sqlite" else "WITH (UPDLOCK, HOLDLOCK)"
+        nulo = "IFNULL" if BaseDatos.motor == "sqlite" else "ISNULL"
+
+        filas = ColaTrabajos._ejecutar(f"""
+            INSERT INTO {t} (banco, empresa, fechaDesde, fechaHasta, estado, intentos, maxIntentos, creado, actualizado)
+            SELECT {banco}, {empresa}, {desde}, {hasta}, 'Pendiente', 0, {int(max_intentos)},
+                   {ColaTrabajos._ahora()}, {ColaTrabajos._ahora()}
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {t} {bloqueo}
+                WHERE banco = {banco}
+                  AND {nulo}(empresa, '') = {nulo}({empresa}, '')
+                  AND {nulo}(fechaDesde, '') = {nulo}({desde}, '')
+                  AND {nulo}(fechaHasta, '') = {nulo}({hasta}, '')
+                  AND estado IN ('Pendiente', 'EnCurso')
+            )
+        """)
+        return filas > 0
+
+    @staticmethod
+    def tomar(trabajador, bancos=None, lease_segundos=300):
+        """
+        Toma el trabajo pendiente más antiguo (o uno EnCurso con lease vencido)
+
+        Los trabajos con lease vencido y sin intentos restantes pasan a Error.
+
+        Args:
+            trabajador: Identificador del trabajador (host:pid)
+            bancos: Claves de robot aceptadas (None = todas)
+            lease_segundos: Duración del lease inicial
+
+        Returns:
+            dict: idJob, banco, empresa, fechaDesde, fechaHasta, intentos; o None
+        """
+        t = ColaTrabajos.TABLA
+        ahora = ColaTrabajos._ahora()
+        filtro_bancos = ""
+        if bancos:
+            filtro_bancos = "AND j.banco IN (" + ", ".join(ColaTrabajos._texto(b) for b in bancos) + ")"
+        disponible = f"""
+            (j.estado = 'Pendiente' OR (j.estado = 'EnCurso' AND j.leaseHasta < {ahora}))
+            AND j.intentos < j.maxIntentos {filtro_bancos}
+            AND NOT EXISTS (
+                SELECT 1 FROM {t} o
+                WHERE o.banco = j.banco AND o.idJob <> j.idJob
+                  AND o.estado = 'EnCurso' AND o.leaseHasta >= {ahora}
+            )
+        """
+        vencidos = f"""
+            UPDATE {t}
+            SET estado = 'Error', error = 'Lease vencido sin intentos restantes',
+                leaseHasta = NULL, actualizado = {ahora}
+            WHERE estado = 'EnCurso' AND leaseHasta < {ahora} AND intentos >= maxIntentos
+        """
+        asignacion = f"""
+            estado = 'EnCurso', trabajador = {ColaTrabajos._texto(trabajador)},
+            intentos = intentos + 1, leaseHasta = {ColaTrabajos._ahora(lease_segundos)},
+            ultimoLatido = {ahora}, actualizado = {ahora}, error = NULL
+        """
+        columnas = ["idJob", "banco", "empresa", "fechaDesde", "fechaHasta", "intentos"]
+
+        conn = None
+        cursor = None
+        try:
+            conn, cursor = BaseDatos.abrir_conexion()
+
+            if BaseDatos.motor == "sqlite":
+                conn.isolation_level = None
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(vencidos)
+                cursor.execute(f"""
+                    SELECT j.idJob FROM {t} j
+                    WHERE {disponible}
+                    ORDER BY j.creado, j.idJob
+                    LIMIT 1
+                """)
+                fila = cursor.fetchone()
+                if fila:
+                    cursor.execute(f"UPDATE {t} SET {asignacion} WHERE idJob = {fila[0]}")
+                    cursor.execute(f"SELECT {', '.join(columnas)} FROM {t} WHERE idJob = {fila[0]}")
+                    fila = cursor.fetchone()
+                cursor.execute("COMMIT")
+            else:
+                # Si no se obtiene el bloqueo (código < 0) el THROW cae en el
+                # except, que revierte la transacción sin tomar nada
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    DECLARE @r INT;
+                    EXEC @r = sp_getapplock @Resource = '{t}.tomar', @LockMode = 'Exclusive',
+                                            @LockOwner = 'Transaction', @LockTimeout = 30000;
+                    IF @r < 0
+                        THROW 51000, 'No se obtuvo el bloqueo de la cola de trabajos', 1;
+                """)
+                cursor.execute(vencidos)
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    WITH siguiente AS (
+                        SELECT TOP 1 * FROM {t} j WITH (UPDLOCK, ROWLOCK, READPAST)
+                        WHERE {disponible}
+                        ORDER BY j.creado, j.idJob
+                    )
+                    UPDATE siguiente SET {asignacion}
+                    OUTPUT {', '.join('INSERTED.' + c for c in columnas)};
+                """)
+                fila = cursor.fetchone()
+                conn.commit()
+
+            if not fila:
+                return None
+            trabajo = dict(zip(columnas, fila))
+            ventana = f" {trabajo['fechaDesde']} - {trabajo['fechaHasta']}" if trabajo['fechaDesde'] else ""
+            LogManager.escribir_log(
+                "INFO", f"📥 Trabajo {trabajo['idJob']} tomado: {trabajo['banco']} "
+                        f"{trabajo['empresa'] or '(todas las empresas)'}{ventana} (intento {trabajo['intentos']})")
+            return trabajo
+
+        except Exception as e:
+            LogManager.escribir_log("ERROR", f"Error tomando trabajo de la cola: {str(e)}")
+            if conn:
+                try:
+                    if BaseDatos.motor == "sqlite":
+                        cursor.execute("ROLLBACK")
+                    else:
+                        conn.rollback()
+                except Exception:
+                    pass
+            return None
+
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    @staticmethod
+    def latido(id_job, trabajador, lease_segundos=300):
+        """
+        Renueva el lease de un trabajo en curso
+
+        Returns:
+            bool: False si el trabajo ya no pertenece a este trabajador (lease perdido)
+        """
+        ahora = ColaTrabajos._ahora()
+        filas = ColaTrabajos._ejecutar(f"""
+            UPDATE {ColaTrabajos.TABLA}
+            SET leaseHasta = {ColaTrabajos._ahora(lease_segundos)}, ultimoLatido = {ahora}, actualizado = {ahora}
+            WHERE idJob = {int(id_job)} AND trabajador = {ColaTrabajos._texto(trabajador)} AND estado = 'EnCurso'
+        """)
+        if filas == -1:
+            return True  # BD no disponible: se reintenta en el siguiente latido
+        return filas == 1
+
+    @staticmethod
+    def finalizar(id_job, trabajador, exito, error=None):
+        """
+        Cierra un trabajo: Exitoso, o de vuelta a Pendiente si quedan intentos
+
+        Returns:
+            bool: True si el trabajo seguía siendo de este trabajador
+        """
+        if exito:
+            estado = "'Exitoso'"
+        else:
+            estado = "CASE WHEN intentos < maxIntentos THEN 'Pendiente' ELSE 'Error' END"
+        filas = ColaTrabajos._ejecutar(f"""
+            UPDATE {ColaTrabajos.TABLA}
+            SET estado = {estado}, leaseHasta = NULL, actualizado = {ColaTrabajos._ahora()},
+                error = {ColaTrabajos._texto(str(error)[:1000] if error else None)}
+            WHERE idJob = {int(id_job)} AND trabajador = {ColaTrabajos._texto(trabajador)} AND estado = 'EnCurso'
+        """)
+        return filas == 1
+
+    @staticmethod
+    def devolver(id_job, trabajador):
+        """
+        Devuelve un trabajo a Pendiente sin consumir el intento (trabajador detenido)
+
+        Returns:
+            bool: True si se devolvió
+        """
+        filas = ColaTrabajos._ejecutar(f"""
+            UPDATE {ColaTrabajos.TABLA}
+            SET estado = 'Pendiente', intentos = intentos - 1, leaseHasta = NULL,
+                actualizado = {ColaTrabajos._ahora()}
+            WHERE idJob = {int(id_job)} AND trabajador = {ColaTrabajos._texto(trabajador)} AND estado = 'EnCurso'
+        """)
+        return filas == 1
+
+    @staticmethod
+    def resumen():
+        """
+        Cantidad de trabajos por banco y estado
+
+        Returns:
+            list: Filas (banco, estado, cantidad)
+        """
+        return BaseDatos.consultarBD(f"""
+            SELECT banco, estado, COUNT(*) FROM {ColaTrabajos.TABLA}
+            GROUP BY banco, estado ORDER BY banco, estado
+        """)
+
+# ==================== REGISTRO DE SELECTORES ====================
+
+
+class RegistroSelectores:
+    """
+    Historial por banco de qué selector de una lista de respaldo funcionó,
+    persistido en JSON (configBancos/selectores/<banco>.json)
+
+    Cuando el portal cambia el DOM, probar los candidatos siempre en el mismo
+    orden consume el timeout de cada selector caído antes de llegar al que
+    sirve. ordenar() devuelve primero los que funcionaron (el más reciente y
+    rápido antes), luego los nunca probados en su orden original y al final
+    los que vienen fallando, de menos a más fallos seguidos.
+
+    Uso:
+        registro = RegistroSelectores("Banco Guayaquil")
+        for selector in registro.ordenar("usuario", SELECTORES_USUARIO):
+            ...
+            registro.registrar_exito("usuario", selector, ms)   # o registrar_fallo
+    """
+
+    def __init__(self, banco):
+        """
+        Args:
+            banco: Nombre del banco (ej: 'Banco Guayaquil')
+        """
+        self.banco = banco
+        nombre = re.sub(r"[^A-Za-z0-9]+", "_", banco).strip("_")
+        self.ruta = os.path.join(RUTAS_CONFIG['selectores'], f"{nombre}.json")
+        self._grupos = None
+
+    @property
+    def grupos(self):
+        """Historial {grupo: {selector: estadísticas}}, cargado en el primer uso"""
+        if self._grupos is None:
+            self._grupos = self._cargar()
+        return self._grupos
+
+    def _cargar(self):
+        """Carga el historial existente (vacío si no hay)"""
+        try:
+            if os.path.exists(self.ruta):
+                with open(self.ruta, 'r', encoding='utf-8') as archivo:
+                    return json.load(archivo).get("grupos", {})
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo leer historial de selectores {self.ruta}: {str(e)}")
+        return {}
+
+    def _guardar(self):
+        """Guarda el historial de forma atómica"""
+        try:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                json.dump({"banco": self.banco, "grupos": self.grupos},
+                          archivo, ensure_ascii=False, indent=2)
+            os.replace(temporal, self.ruta)
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo guardar historial de selectores {self.ruta}: {str(e)}")
+
+    def ordenar(self, grupo, selectores):
+        """
+        Candidatos ordenados según el historial del grupo
+
+        Args:
+            grupo: Nombre del campo o botón (ej: 'usuario')
+            selectores: Lista de selectores de respaldo (define los candidatos)
+
+        Returns:
+            list: Los mismos selectores, reordenados
+        """
+        historial = self.grupos.get(grupo, {})
+
+        def clave(posicion):
+            estadisticas = historial.get(selectores[posicion])
+            if not estadisticas:
+                return (1, 0, 0, posicion)
+            if estadisticas.get("fallos_seguidos", 0) == 0:
+                return (0, -estadisticas.get("ultimo_exito", 0), estadisticas.get("ms", 0), posicion)
+            return (2, estadisticas["fallos_seguidos"], 0, posicion)
+
+        ordenados = [selectores[i] for i in sorted(range(len(selectores)), key=clave)]
+        if ordenados and ordenados[0] != selectores[0]:
+            LogManager.escribir_log(
+                "DEBUG", f"Selectores de '{grupo}' reordenados por historial: primero {ordenados[0]}")
+        return ordenados
+
+    def registrar_exito(self, grupo, selector, ms):
+        """
+        Registra que el selector funcionó y cuánto tardó
+
+        Args:
+            grupo: Nombre del campo o botón
+            selector: Selector que funcionó
+            ms: Milisegundos desde que se empezó a probar el selector
+        """
+        estadisticas = self.grupos.setdefault(grupo, {}).setdefault(selector, {})
+        anterior = estadisticas.get("ms")
+        # Promedio móvil: una demora aislada no manda el selector al final
+        estadisticas["ms"] = round(ms if anterior is None else 0.7 * anterior + 0.3 * ms, 1)
+        estadisticas["exitos"] = estadisticas.get("exitos", 0) + 1
+        estadisticas["fallos_seguidos"] = 0
+        estadisticas["ultimo_exito"] = time.time()
+        self._guardar()
+
+    def registrar_fallo(self, grupo, selector):
+        """Registra que el selector no funcionó (baja en el orden hasta su próximo éxito)"""
+        estadisticas = self.grupos.setdefault(grupo, {}).setdefault(selector, {})
+        estadisticas["fallos"] = estadisticas.get("fallos", 0) + 1
+        estadisticas["fallos_seguidos"] = estadisticas.get("fallos_seguidos", 0) + 1
+        self._guardar()
+
+# ==================== REGISTRO DE ARCHIVOS INGERIDOS ====================
+
+
+class LedgerArchivos:
+    """
+    Registro (SQLite local) de archivos y filas ya ingeridos por banco
+
+    - Archivos: hash SHA-256 del contenido con filas, insertados, omitidos y
+      resultado. Un archivo idéntico a uno ya procesado se descarta sin
+      leerlo ni consultar la BD.
+    - Filas: hash de cada fila resuelta (insertada o ya existente en la BD)
+      por banco y cuenta. Si un archivo se solapa con uno anterior solo se
+      validan contra la BD las filas nuevas.
+
+    Ruta: variable de entorno RPA_LEDGER o RUTAS_CONFIG['ledger']; con
+    RPA_LEDGER=0 queda desactivado (todo se procesa como antes). Cualquier
+    error del registro se informa como WARNING y la ingesta continúa sin él.
+
+    Uso:
+        ledger = LedgerArchivos(NOMBRE_BANCO)
+        hash_archivo = LedgerArchivos.hash_archivo(ruta)
+        if ledger.archivo_procesado(hash_archivo):
+            ...
+        conocidas = ledger.filas_registradas(cuenta, hashes)
+        ...
+        ledger.registrar_filas(cuenta, hashes_resueltos)
+        ledger.registrar_archivo(hash_archivo, ruta, filas, insertados, omitidos)
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS archivos (
+            hash TEXT NOT NULL,
+            banco TEXT NOT NULL,
+            nombre TEXT,
+            filas INTEGER,
+            insertados INTEGER,
+            omitidos INTEGER,
+            resultado TEXT,
+            fecha TEXT,
+            PRIMARY KEY (hash, banco)
+        );
+        CREATE TABLE IF NOT EXISTS filas (
+            banco TEXT NOT NULL,
+            cuenta TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (banco, cuenta, hash)
+        ) WITHOUT ROWID;
+    """
+    LOTE_CONSULTA = 500  # Parámetros por consulta IN (límite de SQLite: 999)
+
+    def __init__(self, banco, ruta=None):
+        """
+        Args:
+            banco: Nombre del banco (ej: 'Banco Bolivariano')
+            ruta: Archivo SQLite (por defecto RPA_LEDGER o RUTAS_CONFIG['ledger'])
+        """
+        self.banco = banco
+        ruta = ruta or os.environ.get("RPA_LEDGER", RUTAS_CONFIG['ledger'])
+        self.ruta = None if ruta.strip() in ("", "0") else ruta
+
+    @staticmethod
+    def hash_archivo(ruta):
+        """SHA-256 del contenido del archivo (lectura por bloques)"""
+        resumen = hashlib.sha256()
+        with open(ruta, 'rb') as archivo:
+            for bloque in iter(lambda: archivo.read(1024 * 1024), b""):
+                resumen.update(bloque)
+        return resumen.hexdigest()
+
+    @staticmethod
+    def hash_fila(*valores):
+        """Hash de una fila a partir de sus valores ya limpios"""
+        texto = "\x1f".join(str(valor).strip() for valor in valores)
+        return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _conexion(self):
+        """Conexión al registro; crea la carpeta y el esquema si hace falta"""
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        conexion = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            conexion.executescript(self.ESQUEMA)
+            yield conexion
+            conexion.commit()
+        finally:
+            conexion.close()
+
+    def archivo_procesado(self, hash_archivo):
+        """
+        Busca un procesamiento anterior del mismo contenido
+
+        Returns:
+            dict: nombre, filas, insertados, omitidos, fecha; None si no existe
+        """
+        if not self.ruta:
+            return None
+        try:
+            with self._conexion() as conexion:
+                fila = conexion.execute(
+                    "SELECT nombre, filas, insertados, omitidos, fecha FROM archivos "
+                    "WHERE hash = ? AND banco = ? AND resultado = 'procesado'",
+                    (hash_archivo, self.banco)).fetchone()
+            if fila:
+                return dict(zip(("nombre", "filas", "insertados", "omitidos", "fecha"), fila))
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo consultar el registro de archivos {self.ruta}: {str(e)}")
+        return None
+
+    def filas_registradas(self, cuenta, hashes):
+        """
+        Filtra los hashes de fila que ya se ingirieron para la cuenta
+
+        Returns:
+            set: Hashes ya registrados
+        """
+        conocidas = set()
+        if not self.ruta or not hashes:
+            return conocidas
+        hashes = list(set(hashes))
+        try:
+            with self._conexion() as conexion:
+                for i in range(0, len(hashes), self.LOTE_CONSULTA):
+                    lote = hashes[i:i + self.LOTE_CONSULTA]
+                    marcadores = ", ".join("?" * len(lote))
+                    conocidas.update(fila[0] for fila in conexion.execute(
+                        f"SELECT hash FROM filas WHERE banco = ? AND cuenta = ? AND hash IN ({marcadores})",
+                        [self.banco, str(cuenta)] + lote))
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo consultar el registro de filas {self.ruta}: {str(e)}")
+            return set()
+        return conocidas
+
+    def registrar_filas(self, cuenta, hashes):
+        """Registra filas resueltas (insertadas o ya existentes en la BD)"""
+        if not self.ruta or not hashes:
+            return False
+        try:
+            with self._conexion() as conexion:
+                conexion.executemany(
+                    "INSERT OR IGNORE INTO filas (banco, cuenta, hash) VALUES (?, ?, ?)",
+                    [(self.banco, str(cuenta), h) for h in hashes])
+            return True
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo registrar filas en {self.ruta}: {str(e)}")
+            return False
+
+    def registrar_archivo(self, hash_archivo, ruta_archivo, filas, insertados, omitidos, resultado="procesado"):
+        """
+        Registra el resultado de un archivo
+
+        Args:
+            hash_archivo: hash_archivo() del contenido
+            ruta_archivo: Ruta original (se guarda solo el nombre)
+            filas: Filas de movimientos leídas
+            insertados: Registros insertados
+            omitidos: Registros omitidos
+            resultado: 'procesado' (se descartará si vuelve a llegar), 'parcial'
+                       (fallaron inserciones: se reprocesa si vuelve a llegar)
+                       o 'rechazado'
+        """
+        if not self.ruta:
+            return False
+        try:
+            with self._conexion() as conexion:
+                conexion.execute(
+                    "INSERT OR REPLACE INTO archivos "
+                    "(hash, banco, nombre, filas, insertados, omitidos, resultado, fecha) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (hash_archivo, self.banco, os.path.basename(ruta_archivo), filas,
+                     insertados, omitidos, resultado, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            return True
+        except Exception as e:
+            LogManager.escribir_log(
+                "WARNING", f"No se pudo registrar el archivo en {self.ruta}: {str(e)}")
+            return False
+
+# ==================== VIGILANCIA DE CARPETAS ====================
+
+
+class VigilanteDirectorio:
+    """
+    Detecta archivos nuevos en una carpeta de entrada sin reescanearla
+
+    Usa inotify (Linux, vía ctypes) con IN_CLOSE_WRITE / IN_MOVED_TO: un
+    archivo se informa cuando quien lo escribía lo cerró o lo renombró dentro
+    de la carpeta, y además su tamaño y fecha no cambiaron durante
+    `espera_estable` segundos. Si inotify no está disponible (otro sistema
+    operativo, carpeta montada por red) o se pide con sondeo=True, compara
+    tamaño/fecha cada `intervalo_sondeo` segundos y solo informa un archivo
+    cuando no cambió entre dos sondeos seguidos (una copia por red puede
+    quedar quieta más de `espera_estable` sin haber terminado).
+
+    Uso:
+        vigilante = VigilanteDirectorio(RUTAS_CONFIG['bolivariano'], ('.txt',))
+        vigilante.iniciar()
+        for ruta in vigilante.esperar_archivos():
+            procesar(ruta)
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+
+    def __init__(self, directorio, extensiones, espera_estable=1.0, intervalo_sondeo=None, sondeo=False):
+        self.directorio = directorio
+        self.extensiones = tuple(e.lower() for e in extensiones)
+        self.espera_estable = espera_estable
+        self.intervalo_sondeo = intervalo_sondeo or float(os.environ.get("RPA_VIGILAR_SONDEO", "5"))
+        self.sondeo = sondeo
+        self._fd = None
+        self._detenido = False
+        self._conocidos = {}   # ruta -> (tamaño, mtime) visto en el último sondeo
+        self._pendientes = {}  # ruta -> (tamaño, mtime, instante del último cambio)
+
+    def _aceptado(self, nombre):
+        return nombre.lower().endswith(self.extensiones) and not nombre.startswith(('.', '~$'))
+
+    def _firma(self, ruta):
+        try:
+            estado = os.stat(ruta)
+            return estado.st_size, estado.st_mtime
+        except OSError:
+            return None
+
+    def _escanear(self):
+        """Firmas de los archivos aceptados presentes en la carpeta"""
+        firmas = {}
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and self._aceptado(entrada.name):
+                    firma = self._firma(entrada.path)
+                    if firma:
+                        firmas[entrada.path] = firma
+        return firmas
+
+    def _iniciar_inotify(self):
+        """Crea el descriptor inotify; devuelve False si no es posible"""
+        try:
+            import ctypes
+            import ctypes.util
+
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1")
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.directorio), self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+            if wd < 0:
+                errno_inotify = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(errno_inotify, "inotify_add_watch")
+            self._fd = fd
+            return True
+        except (OSError, AttributeError) as e:
+            LogManager.escribir_log("WARNING", f"inotify no disponible ({e}); se usará sondeo")
+            return False
+
+    def iniciar(self):
+        """
+        Empieza a vigilar. Los archivos que ya estaban en la carpeta no se
+        informan: el llamador los procesa con su listado habitual después de
+        llamar a iniciar(), así no se pierde nada que llegue entre ambos pasos.
+
+        Returns:
+            str: Modo usado ("inotify" o "sondeo")
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        self._detenido = False
+        self._conocidos = self._escanear()
+        if not self.sondeo and self._iniciar_inotify():
+            modo = "inotify"
+        else:
+            modo = "sondeo"
+        LogManager.escribir_log(
+            "INFO", f"👀 Vigilando {self.directorio} ({', '.join(self.extensiones)}) con {modo}")
+        return modo
+
+    def detener(self):
+        """Termina esperar_archivos() en la siguiente vuelta (seguro desde un manejador de señal)"""
+        self._detenido = True
+
+    def _cerrar(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def _marcar_pendiente(self, ruta):
+        firma = self._firma(ruta)
+        if firma:
+            self._pendientes[ruta] = (*firma, time.monotonic())
+
+    def _leer_eventos(self, espera):
+        """Espera eventos inotify hasta `espera` segundos y marca los archivos afectados"""
+        import select
+        import struct
+
+        listos, _, _ = select.select([self._fd], [], [], espera)
+        if not listos:
+            return
+        try:
+            datos = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        desplazamiento = 0
+        while desplazamiento + 16 <= len(datos):
+            _, mascara, _, largo = struct.unpack_from("iIII", datos, desplazamiento)
+            nombre = datos[desplazamiento + 16:desplazamiento + 16 + largo].rstrip(b"\0")
+            desplazamiento += 16 + largo
+
+            if mascara & self.IN_Q_OVERFLOW:
+                # Se perdieron eventos: un único reescaneo para recuperarlos
+                LogManager.escribir_log("WARNING", "Cola de inotify desbordada, reescaneando carpeta")
+                for ruta in self._escanear():
+                    self._marcar_pendiente(ruta)
+            elif mascara & self.IN_IGNORED:
+                LogManager.escribir_log("WARNING", f"La carpeta vigilada dejó de existir: {self.directorio}")
+                self._cerrar()
+                self._conocidos = {}
+            elif nombre and self._aceptado(os.fsdecode(nombre)):
+                self._marcar_pendiente(os.path.join(self.directorio, os.fsdecode(nombre)))
+
+    def _sondear(self, espera):
+        """Modo sin inotify: compara tamaño/fecha con el sondeo anterior"""
+        time.sleep(espera)
+        try:
+            firmas = self._escanear()
+        except OSError:
+            return
+        for ruta, firma in firmas.items():
+            if self._conocidos.get(ruta) != firma:
+                self._marcar_pendiente(ruta)
+        self._conocidos = firmas
+
+    def _estables(self):
+        """
+        Pendientes cuyo tamaño y fecha no cambiaron durante espera_estable
+        (en modo sondeo, además, durante un intervalo de sondeo completo)
+        """
+        ahora = time.monotonic()
+        espera = self.espera_estable if self._fd is not None else max(self.espera_estable, self.intervalo_sondeo)
+        estables = []
+        for ruta, (tamaño, mtime, desde) in list(self._pendientes.items()):
+            firma = self._firma(ruta)
+            if firma is None:
+                del self._pendientes[ruta]
+            elif firma != (tamaño, mtime):
+                self._pendientes[ruta] = (*firma, ahora)
+            elif ahora - desde >= espera:
+                del self._pendientes[ruta]
+                estables.append(ruta)
+        return sorted(estables, key=lambda ruta: (self._firma(ruta) or (0, 0))[1])
+
+    def esperar_archivos(self):
+        """
+        Generador infinito (hasta detener()) de rutas de archivos completos
+
+        Yields:
+            str: Ruta del archivo listo para procesar
+        """
+        try:
+            while not self._detenido:
+                if self._fd is not None:
+                    self._leer_eventos(min(self.espera_estable, 0.5) if self._pendientes else 1.0)
+                else:
+                    # Un pendiente se confirma en el sondeo siguiente, no antes
+                    self._sondear(self.intervalo_sondeo)
+
+                for ruta in self._estables():
+                    if self._detenido:
+                        break
+                    yield ruta
+        finally:
+            self._cerrar()
+
+# ==================== PROCESAMIENTO EN PARALELO ====================
+
+
+class ProcesadorParalelo:
+    """
+    Procesa archivos independientes en un pool de procesos (--workers N)
+
+    Los archivos se agrupan por una clave (la cuenta): los de un mismo grupo se
+    procesan en orden dentro del mismo worker, para no competir por el
+    contador de fecha ni por los sufijos de documento de esa cuenta, y los
+    grupos distintos corren en paralelo. Cada worker abre sus propias
+    conexiones (BaseDatos abre una por consulta) y recibe del proceso
+    principal el banco, el id de ejecución y el motor de BD.
+
+    Uso:
+        grupos = ProcesadorParalelo.agrupar(archivos, obtener_cuenta)
+        for archivo, resultado in ProcesadorParalelo.procesar(procesar_archivo, grupos, workers, id_ejecucion):
+            ...
+
+    Con workers=1 (o un solo grupo) procesa en el mismo proceso, en orden.
+    Los contadores de MetricasEjecucion (filas leídas/insertadas/omitidas) de
+    los workers se suman a los del proceso principal; los tiempos por tramo
+    de los workers quedan solo en su log.
+    """
+
+    @staticmethod
+    def leer_workers(argv=None):
+        """
+        Lee `--workers N` (o `--workers=N`) de la línea de comandos; si no
+        está, usa la variable de entorno RPA_WORKERS
+
+        Returns:
+            int: Cantidad de workers (mínimo 1)
+        """
+        argv = sys.argv if argv is None else argv
+        valor = os.environ.get("RPA_WORKERS", "1")
+        for i, argumento in enumerate(argv):
+            if argumento == "--workers" and i + 1 < len(argv):
+                valor = argv[i + 1]
+            elif argumento.startswith("--workers="):
+                valor = argumento.split("=", 1)[1]
+        try:
+            return max(1, int(valor))
+        except ValueError:
+            LogManager.escribir_log(
+                "WARNING", f"Valor de --workers no válido: {valor}, se usa 1")
+            return 1
+
+    @staticmethod
+    def agrupar(archivos, clave):
+        """
+        Agrupa los archivos por clave conservando el orden original
+
+        Args:
+            archivos: Rutas a procesar
+            clave: Función ruta -> clave (ej: número de cuenta). Si falla o
+                   devuelve vacío, el archivo queda en un grupo propio.
+
+        Returns:
+            list: Lista de grupos (listas de rutas)
+        """
+        grupos = {}
+        for archivo in archivos:
+            try:
+                valor = clave(archivo)
+            except Exception as e:
+                LogManager.escribir_log(
+                    "WARNING", f"No se pudo obtener la cuenta de {os.path.basename(archivo)}: {str(e)}")
+                valor = None
+            grupos.setdefault(valor or ("archivo", archivo), []).append(archivo)
+        return list(grupos.values())
+
+    @staticmethod
+    def _inicializar_worker(banco, id_ejecucion, motor, ruta_sqlite):
+        """Replica en el worker el estado del proceso principal"""
+        LogManager.configurar_banco(banco)
+        LogManager.configurar_id_ejecucion(id_ejecucion)
+        BaseDatos.configurar_motor(motor, ruta_sqlite)
+        # Ctrl+C lo atiende el proceso principal
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    @staticmethod
+    def _procesar_grupo(funcion, archivos, args):
+        """
+        Procesa en orden los archivos de un grupo (se ejecuta en el worker)
+
+        Returns:
+            list: (archivo, resultado, contadores de MetricasEjecucion) por archivo
+        """
+        resultados = []
+        for archivo in archivos:
+            MetricasEjecucion.reiniciar()
+            try:
+                resultado = funcion(archivo, *args)
+            except Exception as e:
+                LogManager.escribir_log(
+                    "ERROR", f"Error procesando archivo {archivo}: {str(e)}")
+                resultado = False
+            resultados.append((archivo, resultado, dict(MetricasEjecucion._contadores)))
+        return resultados
+
+    @classmethod
+    def procesar(cls, funcion, grupos, workers, *args):
+        """
+        Ejecuta funcion(archivo, *args) para cada archivo de cada grupo
+
+        Args:
+            funcion: Función de nivel de módulo (se envía a los workers)
+            grupos: Resultado de agrupar()
+            workers: Cantidad máxima de procesos
+            *args: Argumentos adicionales para funcion (ej: id_ejecucion)
+
+        Yields:
+            tuple: (archivo, resultado) a medida que terminan los grupos
+        """
+        workers = min(workers, len(grupos))
+        if workers <= 1:
+            for archivos in grupos:
+                for archivo in archivos:
+                    try:
+                        resultado = funcion(archivo, *args)
+                    except Exception as e:
+                        LogManager.escribir_log(
+                            "ERROR", f"Error procesando archivo {archivo}: {str(e)}")
+                        resultado = False
+                    yield archivo, resultado
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        LogManager.escribir_log(
+            "INFO", f"⚙️ Procesando {sum(len(g) for g in grupos)} archivos en {len(grupos)} grupos con {workers} workers")
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=cls._inicializar_worker,
+                initargs=(LogManager._banco_actual, LogManager._id_ejecucion,
+                          BaseDatos.motor, BaseDatos.ruta_sqlite)) as pool:
+            futuros = {pool.submit(cls._procesar_grupo, funcion, archivos, args): archivos
+                       for archivos in grupos}
+            for futuro in as_completed(futuros):
+                try:
+                    resultados = futuro.result()
+                except Exception as e:
+                    LogManager.escribir_log(
+                        "ERROR", f"Worker falló procesando {len(futuros[futuro])} archivos: {str(e)}")
+                    resultados = [(archivo, False, {}) for archivo in futuros[futuro]]
+                for archivo, resultado, contadores in resultados:
+                    for nombre, valor in contadores.items():
+                        MetricasEjecucion.incrementar(nombre, valor)
+                    yield archivo, resultado
+
+# ==================== GESTIÓN DE SUBPROCESOS ====================
+
+
+class SubprocesoManager:
+    """Clase para manejar subprocesos de forma segura"""
+
+    @staticmethod
+    def ejecutar_bat_final(esperar=False):
+        """
+        Solicita la ejecución del script de unión al finalizar el bot
+
+        Las solicitudes se agrupan: se registra la solicitud y un único
+        coordinador (protegido con lockfile) ejecuta la unión cuando pasan
+        UNION_DEBOUNCE_SEGUNDOS sin nuevas solicitudes. Si varios bots terminan
+        juntos, la unión corre una sola vez; si llega una solicitud mientras la
+        unión corre, se vuelve a ejecutar una vez al terminar.
+
+        Args:
+            esperar: Si True, ejecuta la unión en este proceso (sin debounce)
+                y espera a que termine
+
+        Returns:
+            bool: True si la unión se ejecutó (esperar=True) o quedó programada
+        """
+        try:
+            ruta_bat = RUTAS_CONFIG['bat_final']
+
+            # Verificar si el archivo existe
+            if not os.path.exists(ruta_bat):
+                LogManager.escribir_log(
+                    "WARNING", f"Archivo BAT no encontrado: {ruta_bat}")
+                return False
+
+            SubprocesoManager._registrar_solicitud_union()
+
+            if esperar:
+                return SubprocesoManager.coordinar_union(bloqueante=True, debounce=0)
+
+            # Coordinador en segundo plano; si ya hay uno activo, este termina
+            # enseguida y el activo atiende la solicitud
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), "--coordinar-union"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            LogManager.escribir_log(
+                "INFO", f"🔄 Unión de bancos programada (debounce {UNION_DEBOUNCE_SEGUNDOS}s)")
+            return True
+
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"❌ Error solicitando archivo BAT: {str(e)}")
+            return False
+
+    @staticmethod
+    def _ruta_estado_union(nombre):
+        """Ruta de un archivo de estado del coordinador de unión"""
+        os.makedirs(RUTAS_CONFIG['union_estado'], exist_ok=True)
+        return os.path.join(RUTAS_CONFIG['union_estado'], nombre)
+
+    @staticmethod
+    def _leer_marca_union(nombre):
+        """Lee una marca (solicitud/atendida) del coordinador; 0 si no existe"""
+        try:
+            with open(SubprocesoManager._ruta_estado_union(nombre), 'r') as archivo:
+                return int(archivo.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _escribir_marca_union(nombre, marca):
+        """Escribe una marca de forma atómica"""
+        ruta = SubprocesoManager._ruta_estado_union(nombre)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w') as archivo:
+            archivo.write(str(marca))
+        os.replace(temporal, ruta)
+
+    @staticmethod
+    def _registrar_solicitud_union():
+        """Registra una nueva solicitud de unión (marca de tiempo en ns)"""
+        marca = time.time_ns()
+        SubprocesoManager._escribir_marca_union("solicitud", marca)
+        return marca
+
+    @staticmethod
+    def coordinar_union(bloqueante=False, debounce=None):
+        """
+        Ejecuta la unión atendiendo todas las solicitudes pendientes
+
+        Solo un coordinador puede estar activo (flock sobre union.lock).
+
+        Args:
+            bloqueante: Si True espera el lock; si False sale si otro coordina
+            debounce: Segundos sin solicitudes nuevas antes de ejecutar
+                (por defecto UNION_DEBOUNCE_SEGUNDOS)
+
+        Returns:
+            bool: Resultado de la última ejecución de la unión
+        """
+        if debounce is None:
+            debounce = UNION_DEBOUNCE_SEGUNDOS
+        resultado = True
+
+        while True:
+            with open(SubprocesoManager._ruta_estado_union("union.lock"), 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | (0 if bloqueante else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    # Otro coordinador activo: atenderá nuestra solicitud
+                    return True
+
+                atendida = SubprocesoManager._leer_marca_union("atendida")
+                while True:
+                    # Esperar hasta que no lleguen solicitudes durante la ventana
+                    solicitud = SubprocesoManager._leer_marca_union("solicitud")
+                    restante = solicitud / 1e9 + debounce - time.time()
+                    if restante > 0:
+                        time.sleep(min(restante, 5))
+                        continue
+
+                    if solicitud <= atendida:
+                        break
+
+                    resultado = SubprocesoManager._ejecutar_union()
+                    atendida = solicitud
+                    SubprocesoManager._escribir_marca_union("atendida", atendida)
+
+            # Una solicitud pudo llegar justo al liberar el lock; si es así,
+            # intentar coordinar de nuevo (si otro tomó el lock, él la atiende)
+            if SubprocesoManager._leer_marca_union("solicitud") <= atendida:
+                return resultado
+            bloqueante = False
+
+    @staticmethod
+    def _ejecutar_union():
+        """Ejecuta el archivo BAT de unión y espera a que termine"""
+        try:
+            # Ruta al archivo BAT en el escritorio
+            ruta_bat = RUTAS_CONFIG['bat_final']
+
+            LogManager.escribir_log(
+                "INFO", f"🔄 Ejecutando archivo BAT: {ruta_bat}")
+
+            # Ejecutar el BAT y esperar a que termine
+            resultado = subprocess.run(
+                ruta_bat,
+                shell=True,
+                capture_output=False,  # No capturar output
+                stdout=subprocess.DEVNULL,  # Suprimir stdout
+                stderr=subprocess.DEVNULL,  # Suprimir stderr,
+                timeout=300  # Timeout de 5 minutos
+            )
+
+            # Verificar el resultado
+            if resultado.returncode == 0:
+                LogManager.escribir_log(
+                    "SUCCESS", "✅ Archivo BAT ejecutado exitosamente")
+
+                return True
+            else:
+                LogManager.escribir_log(
+                    "ERROR", f"❌ Error ejecutando BAT. Código: {resultado.returncode}")
+
+                return False
+
+        except subprocess.TimeoutExpired:
+            LogManager.escribir_log(
+                "ERROR", "❌ Timeout ejecutando archivo BAT (5 minutos)")
+            return False
+        except Exception as e:
+            LogManager.escribir_log(
+                "ERROR", f"❌ Error ejecutando archivo BAT: {str(e)}")
+            return False
+
+# ==================== EXPORTACIÓN DE FUNCIONES PRINCIPALES ====================
+
+# Para mantener compatibilidad con código existente
+
+
+def clickComponente(page, selector, intentos=5, timeout=30000, descripcion="elemento"):
+    return ComponenteInteraccion.clickComponente(page, selector, intentos, timeout, descripcion)
+
+
+def escribirComponente(page, selector, valor, intentos=5, timeout=15000, descripcion="campo"):
+    return ComponenteInteraccion.escribirComponente(page, selector, valor, intentos, timeout, descripcion)
+
+
+def leerComponente(page, selector, intentos=5, timeout=15000, descripcion="elemento"):
+    return ComponenteInteraccion.leerComponente(page, selector, intentos, timeout, descripcion)
+
+
+def leerValorInput(page, selector, intentos=5, timeout=15000, descripcion="input"):
+    return ComponenteInteraccion.leerValorInput(page, selector, intentos, timeout, descripcion)
+
+
+def esperarElemento(page, selector, timeout=30000, estado='visible', descripcion="elemento"):
+    return ComponenteInteraccion.esperarElemento(page, selector, timeout, estado, descripcion)
+
+
+def esperarAlguno(page, selectores, timeout=30000, estado='visible', descripcion="elemento"):
+    return ComponenteInteraccion.esperarAlguno(page, selectores, timeout, estado, descripcion)
+
+
+def leerCSV(ruta_archivo, filtro_columna=None, valor_filtro=None):
+    return LectorArchivos.leerCSV(ruta_archivo, filtro_columna, valor_filtro)
+
+
+def leerExcel(ruta_archivo, hoja=0, data_only=True):
+    return LectorArchivos.leerExcel(ruta_archivo, hoja, data_only)
 
 
 def leerTxt(ruta_archivo, encoding='utf-8'):
@@ -2371,3 +5432,10 @@ def actualizarConfiguracion(ruta_csv, id_config, nuevo_valor):
 
 def validarArchivosConfiguracion(rutas_config):
     return ConfiguracionManager.validar_archivos_configuracion(rutas_config)
+
+
+if __name__ == "__main__":
+    # Coordinador de unión lanzado en segundo plano por ejecutar_bat_final()
+    if "--coordinar-union" in sys.argv:
+        LogManager.configurar_banco("UNION_BANCOS")
+        sys.exit(0 if SubprocesoManager.coordinar_union() else 1)
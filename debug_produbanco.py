@@ -1,5 +1,5 @@
 
-from componentes_comunes import PlaywrightManager, EsperasInteligentes, LectorArchivos, RUTAS_CONFIG
+from componentes_comunes import PlaywrightManager, EsperasInteligentes, LectorArchivos, EspacioTrabajo, RUTAS_CONFIG
 from datetime import datetime
 import os
 
@@ -7,7 +7,7 @@ def main():
     # Inicializar Playwright
     manager = PlaywrightManager(
         headless=True,
-        download_path=RUTAS_CONFIG['descargas'],
+        download_path=EspacioTrabajo.actual(),
         timeout=120000
     )
     playwright, browser, context, page = manager.iniciar_navegador()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+ORQUESTADOR DE ROBOTS BANCARIOS
+
+Ejecuta varios robots en paralelo desde un único proceso padre, en lugar de
+depender de horarios de cron escalonados por banco.
+
+    - Cada robot corre en su propio proceso (aislamiento de Playwright, logs y
+      TimeoutManager); el orquestador importa el módulo y llama a ejecutar(),
+      el mismo punto de entrada que `python <robot>.py` (mismos argumentos,
+      código de salida y manejo de cancelación por tiempo).
+    - La concurrencia máxima es configurable (--concurrencia).
+    - Cada robot con navegador visible levanta su propio Xvfb en un display
+      libre (PantallaVirtual); con --xvfb-compartido se usa uno solo en :99.
+    - Cada robot conserva su timeout duro (equivalente al `timeout` de los .sh).
+
+Uso:
+    python orquestador.py                                   # robots activos
+    python orquestador.py --bancos guayaquil produbanco     # solo algunos
+    python orquestador.py --concurrencia 2
+    python orquestador.py --xvfb-compartido               # un solo Xvfb en :99
+    python orquestador.py --bancos produbanco --argumentos --resume
+"""
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+import multiprocessing
+from multiprocessing.connection import wait
+from componentes_comunes import LogManager, CancelacionPorTiempo, EspacioTrabajo, PantallaVirtual
+
+
+# ==================== CONFIGURACIÓN GLOBAL ====================
+NOMBRE_PROCESO = "Orquestador"
+CONCURRENCIA_POR_DEFECTO = 3
+DISPLAY_COMPARTIDO = ":99"
+XVFB_WHD = os.environ.get("XVFB_WHD", "1920x1080x24")
+
+# Robots disponibles: módulo a importar, timeout duro (segundos), si necesita
+# navegador (Xvfb con --xvfb-compartido) y si se ejecuta cuando no se indican bancos explícitamente.
+# por_empresa / por_fechas: si el robot respeta RPA_EMPRESAS y RPA_FECHA_DESDE/HASTA
+# (trabajos de la cola con empresa o ventana propia, ver trabajador_cola.py).
+ROBOTS = {
+    'guayaquil': {
+        'modulo': 'BancoGuayaquil_Final',
+        'timeout': 900,
+        'navegador': True,
+        'activo': True,
+        'por_empresa': True,
+        'por_fechas': False,
+    },
+    'produbanco': {
+        'modulo': 'BancoProdubanco_Final',
+        'timeout': 900,
+        'navegador': True,
+        'activo': True,
+        'por_empresa': True,
+        'por_fechas': True,
+    },
+    'jep': {
+        'modulo': 'CooperativaJEP_Final',
+        'timeout': 900,
+        'navegador': True,
+        'activo': True,
+        'por_empresa': False,
+        'por_fechas': False,
+    },
+    'crea': {
+        'modulo': 'CooperativaCREA_Final',
+        'timeout': 900,
+        'navegador': True,
+        'activo': False,  # Obsoleto
+        'por_empresa': False,
+        'por_fechas': False,
+    },
+    'bolivariano': {
+        'modulo': 'BancoBolivariano_Final',
+        'timeout': 300,
+        'navegador': False,
+        'activo': True,
+        'por_empresa': False,
+        'por_fechas': False,
+    },
+    'pichincha': {
+        'modulo': '2BancoPichincha_Final',
+        'timeout': 300,
+        'navegador': False,
+        'activo': True,
+        'por_empresa': False,
+        'por_fechas': False,
+    },
+}
+
+
+# ==================== XVFB COMPARTIDO (OPCIONAL) ====================
+def _socket_display(display):
+    """Ruta del socket X11 correspondiente a un display (':99' -> /tmp/.X11-unix/X99)"""
+    return f"/tmp/.X11-unix/X{display.lstrip(':')}"
+
+
+def iniciar_xvfb(display=DISPLAY_COMPARTIDO, espera=10):
+    """
+    Inicia Xvfb en el display indicado si no está corriendo
+
+    Args:
+        display: Display a usar (ej: ':99')
+        espera: Segundos máximos esperando a que aparezca el socket
+
+    Returns:
+        tuple: (exito, proceso) - proceso es None si Xvfb ya estaba corriendo
+    """
+    try:
+        if os.path.exists(_socket_display(display)):
+            LogManager.escribir_log(
+                "INFO", f"✅ Xvfb ya está corriendo en {display}")
+            return True, None
+
+        LogManager.escribir_log("INFO", f"🚀 Iniciando Xvfb en {display}")
+        proceso = subprocess.Popen(
+            ["Xvfb", display, "-screen", "0", XVFB_WHD, "-ac", "+extension", "GLX",
+             "+render", "-noreset", "-dpi", "96"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        limite = time.time() + espera
+        while time.time() < limite:
+            if os.path.exists(_socket_display(display)):
+                LogManager.escribir_log("SUCCESS", "✅ Xvfb iniciado correctamente")
+                return True, proceso
+            if proceso.poll() is not None:
+                break
+            time.sleep(0.2)
+
+        LogManager.escribir_log("ERROR", "❌ Error iniciando Xvfb")
+        detener_xvfb(proceso)
+        return False, None
+
+    except Exception as e:
+        LogManager.escribir_log("ERROR", f"Error iniciando Xvfb: {str(e)}")
+        return False, None
+
+
+def detener_xvfb(proceso):
+    """Detiene el Xvfb iniciado por el orquestador (no toca uno preexistente)"""
+    if not proceso:
+        return
+    try:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+    except Exception:
+        try:
+            proceso.kill()
+        except Exception:
+            pass
+
+
+# ==================== EJECUCIÓN DE ROBOTS ====================
+def _ejecutar_robot(clave, argumentos=None):
+    """
+    Punto de entrada del proceso hijo: importa el módulo del robot y ejecuta
+    su ejecutar(), la misma lógica que el bloque __main__ del script
+
+    Args:
+        clave: Clave de ROBOTS
+        argumentos: Argumentos extra para el robot (p. ej. ["--resume"])
+
+    El código de salida del proceso es el que devuelve el robot (0 = éxito).
+    """
+    config = ROBOTS[clave]
+    try:
+        modulo = importlib.import_module(config['modulo'])
+        codigo = modulo.ejecutar([config['modulo']] + list(argumentos or []))
+    except CancelacionPorTiempo as e:
+        LogManager.escribir_log(
+            "ERROR", f"Robot {clave} cancelado: {str(e)}")
+        codigo = 1
+    except Exception as e:
+        LogManager.escribir_log(
+            "ERROR", f"Error no controlado en robot {clave}: {str(e)}")
+        codigo = 1
+    # multiprocessing termina el hijo con os._exit: los atexit no se ejecutan
+    EspacioTrabajo.limpiar()
+    PantallaVirtual.detener()
+    sys.exit(codigo)
+
+
+def ejecutar_robots(claves, concurrencia=CONCURRENCIA_POR_DEFECTO, argumentos=None):
+    """
+    Ejecuta los robots indicados respetando el límite de concurrencia
+
+    Args:
+        claves: Lista de claves de ROBOTS a ejecutar (en orden de arranque)
+        concurrencia: Máximo de robots ejecutándose a la vez
+        argumentos: Argumentos extra que se pasan a cada robot
+
+    Returns:
+        dict: {clave: codigo_salida} (124 si se agotó el timeout, como `timeout`)
+    """
+    contexto = multiprocessing.get_context("fork")
+    pendientes = list(claves)
+    activos = {}
+    resultados = {}
+
+    while pendientes or activos:
+        # Lanzar robots hasta llenar los cupos libres
+        while pendientes and len(activos) < concurrencia:
+            clave = pendientes.pop(0)
+            proceso = contexto.Process(
+                target=_ejecutar_robot, args=(clave, argumentos), name=f"robot-{clave}")
+            proceso.start()
+            activos[clave] = (proceso, time.time())
+            LogManager.escribir_log(
+                "INFO", f"▶️ Robot {clave} iniciado (PID {proceso.pid})")
+
+        # Esperar a que termine alguno (o revisar timeouts cada segundo)
+        wait([proceso.sentinel for proceso, _ in activos.values()], timeout=1)
+
+        for clave, (proceso, inicio) in list(activos.items()):
+            duracion = time.time() - inicio
+            if not proceso.is_alive():
+                proceso.join()
+                resultados[clave] = proceso.exitcode
+                nivel = "SUCCESS" if proceso.exitcode == 0 else "ERROR"
+                LogManager.escribir_log(
+                    nivel, f"⏹️ Robot {clave} terminó con código {proceso.exitcode} ({duracion:.0f}s)")
+                del activos[clave]
+            elif duracion > ROBOTS[clave]['timeout']:
+                LogManager.escribir_log(
+                    "ERROR", f"⏰ Robot {clave} superó su timeout ({ROBOTS[clave]['timeout']}s), terminando...")
+                proceso.terminate()
+                proceso.join(10)
+                if proceso.is_alive():
+                    proceso.kill()
+                    proceso.join()
+                resultados[clave] = 124
+                del activos[clave]
+
+    return resultados
+
+
+# ==================== FUNCIÓN PRINCIPAL ====================
+def main(argumentos=None):
+    """Función principal del orquestador"""
+    parser = argparse.ArgumentParser(
+        description="Ejecuta varios robots bancarios en paralelo")
+    parser.add_argument("--bancos", nargs="+", choices=sorted(ROBOTS),
+                        help="Robots a ejecutar (por defecto: todos los activos)")
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA_POR_DEFECTO,
+                        help=f"Máximo de robots simultáneos (por defecto {CONCURRENCIA_POR_DEFECTO})")
+    parser.add_argument("--xvfb-compartido", action="store_true",
+                        help=f"Un único Xvfb en {DISPLAY_COMPARTIDO} para todos los robots "
+                             "(por defecto cada robot con ventana inicia el suyo)")
+    parser.add_argument("--argumentos", nargs=argparse.REMAINDER, default=[],
+                        help="Argumentos que se pasan tal cual a cada robot "
+                             "(p. ej. --argumentos --resume); debe ir al final")
+    args = parser.parse_args(argumentos)
+
+    claves = args.bancos or [clave for clave, config in ROBOTS.items() if config['activo']]
+    concurrencia = max(1, args.concurrencia)
+
+    LogManager.iniciar_proceso(
+        NOMBRE_PROCESO, int(time.time()),
+        f"Robots: {', '.join(claves)} - concurrencia: {concurrencia}")
+
+    proceso_xvfb = None
+    try:
+        if args.xvfb_compartido and any(ROBOTS[clave]['navegador'] for clave in claves):
+            ok, proceso_xvfb = iniciar_xvfb(DISPLAY_COMPARTIDO)
+            if not ok:
+                LogManager.finalizar_proceso(
+                    NOMBRE_PROCESO, False, "No se pudo iniciar Xvfb")
+                return False
+            os.environ["DISPLAY"] = DISPLAY_COMPARTIDO
+
+        inicio = time.time()
+        resultados = ejecutar_robots(claves, concurrencia, args.argumentos)
+
+        # Resumen
+        LogManager.escribir_log("INFO", "📊 RESUMEN DE ROBOTS:")
+        for clave in claves:
+            codigo = resultados.get(clave)
+            estado = "✅ OK" if codigo == 0 else ("⏰ TIMEOUT" if codigo == 124 else f"❌ código {codigo}")
+            LogManager.escribir_log("INFO", f"   {clave}: {estado}")
+
+        exito = all(codigo == 0 for codigo in resultados.values())
+        LogManager.finalizar_proceso(
+            NOMBRE_PROCESO, exito, f"Duración total: {time.time() - inicio:.0f}s")
+        return exito
+
+    finally:
+        detener_xvfb(proceso_xvfb)
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(0 if main() else 1)
+    except KeyboardInterrupt:
+        LogManager.escribir_log("WARNING", "Orquestador interrumpido por el usuario")
+        sys.exit(1)
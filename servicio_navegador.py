@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+SERVICIO DE NAVEGADOR (CHROMIUM RESIDENTE)
+
+Mantiene un Chromium caliente con puerto CDP local para que los bots lanzados
+por cron no paguen el arranque en frío del navegador en cada ejecución.
+
+    - PlaywrightManager lee configBancos/navegador/servicio.json, se conecta con
+      connect_over_cdp y crea un contexto nuevo y aislado por ejecución; si el
+      servicio no está activo lanza Chromium localmente como siempre.
+    - Chequeo de salud cada --intervalo segundos (/json/version); dos fallos
+      seguidos o la caída del proceso reinician el navegador.
+    - Reciclado automático tras --max-ejecuciones ejecuciones o si el RSS del
+      árbol de procesos supera --max-rss-mb. Solo se recicla cuando ningún bot
+      está conectado (flock exclusivo sobre uso.lock, ver ServicioNavegador).
+
+Uso:
+    python servicio_navegador.py
+    python servicio_navegador.py --puerto 9222 --max-ejecuciones 50 --max-rss-mb 1500
+    python servicio_navegador.py --con-ventana          # requiere DISPLAY (Xvfb)
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+from urllib.request import urlopen
+from componentes_comunes import LogManager, PlaywrightManager, ServicioNavegador
+
+
+# ==================== CONFIGURACIÓN GLOBAL ====================
+NOMBRE_PROCESO = "Servicio Navegador"
+PUERTO_POR_DEFECTO = int(os.environ.get("RPA_NAVEGADOR_PUERTO", "9222"))
+MAX_EJECUCIONES_POR_DEFECTO = int(os.environ.get("RPA_NAVEGADOR_MAX_EJECUCIONES", "50"))
+MAX_RSS_MB_POR_DEFECTO = int(os.environ.get("RPA_NAVEGADOR_MAX_RSS_MB", "1500"))
+INTERVALO_POR_DEFECTO = 15
+ESPERA_ARRANQUE = 30  # segundos máximos hasta que el puerto CDP responde
+
+_detener = False
+
+
+# ==================== CHROMIUM ====================
+def ruta_chromium():
+    """Ejecutable de Chromium instalado por Playwright (`playwright install`)"""
+    from playwright.sync_api import sync_playwright
+    with sync_playwright() as playwright:
+        return playwright.chromium.executable_path
+
+
+def endpoint_sano(endpoint, timeout=3):
+    """Indica si el puerto CDP responde (GET /json/version)"""
+    try:
+        with urlopen(f"{endpoint}/json/version", timeout=timeout) as respuesta:
+            return respuesta.status == 200 and "webSocketDebuggerUrl" in json.loads(respuesta.read())
+    except Exception:
+        return False
+
+
+def rss_mb(pid):
+    """
+    Memoria residente del proceso y todos sus descendientes (renderers, GPU, etc.)
+
+    Returns:
+        float: RSS total en MB
+    """
+    hijos = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat", 'r') as archivo:
+                campos = archivo.read().rsplit(")", 1)[1].split()
+            hijos.setdefault(int(campos[1]), []).append(int(entrada))
+        except (OSError, IndexError):
+            continue
+
+    total_kb = 0
+    pendientes = [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        try:
+            with open(f"/proc/{actual}/status", 'r') as archivo:
+                for linea in archivo:
+                    if linea.startswith("VmRSS:"):
+                        total_kb += int(linea.split()[1])
+                        break
+        except OSError:
+            pass
+        pendientes.extend(hijos.get(actual, []))
+    return total_kb / 1024
+
+
+def iniciar_chromium(ejecutable, puerto, headless, generacion):
+    """
+    Lanza Chromium con puerto CDP y espera a que responda, luego publica servicio.json
+
+    Returns:
+        tuple: (proceso, perfil) o (None, None) si no arrancó
+    """
+    perfil = tempfile.mkdtemp(prefix="rpa_chromium_")
+    argumentos = [
+        ejecutable,
+        f"--remote-debugging-port={puerto}",
+        "--remote-debugging-address=127.0.0.1",
+        f"--user-data-dir={perfil}",
+        "--no-first-run",
+        "--no-default-browser-check",
+    ] + PlaywrightManager.argumentos_chromium(headless)
+    if headless:
+        argumentos += ["--headless=new", "--hide-scrollbars", "--mute-audio"]
+    argumentos.append("about:blank")
+
+    # Sesión propia: al detener se termina el grupo completo (renderers incluidos)
+    proceso = subprocess.Popen(
+        argumentos, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+    endpoint = f"http://127.0.0.1:{puerto}"
+    limite = time.time() + ESPERA_ARRANQUE
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            break
+        if endpoint_sano(endpoint, timeout=1):
+            ServicioNavegador.publicar_estado({
+                "endpoint": endpoint,
+                "pid": os.getpid(),
+                "pid_chromium": proceso.pid,
+                "generacion": generacion,
+                "headless": headless,
+                "inicio": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            LogManager.escribir_log(
+                "SUCCESS", f"✅ Chromium listo en {endpoint} (PID {proceso.pid}, generación {generacion})")
+            return proceso, perfil
+        time.sleep(0.5)
+
+    LogManager.escribir_log("ERROR", f"❌ Chromium no respondió en {endpoint}")
+    detener_chromium(proceso, perfil)
+    return None, None
+
+
+def detener_chromium(proceso, perfil):
+    """Termina el grupo de procesos de Chromium y borra su perfil temporal"""
+    if proceso:
+        try:
+            os.killpg(proceso.pid, signal.SIGTERM)
+            proceso.wait(timeout=10)
+        except ProcessLookupError:
+            pass
+        except Exception:
+            try:
+                os.killpg(proceso.pid, signal.SIGKILL)
+                proceso.wait(timeout=5)
+            except Exception:
+                pass
+    if perfil:
+        shutil.rmtree(perfil, ignore_errors=True)
+
+
+def reiniciar(ejecutable, args, proceso, perfil, generacion, motivo):
+    """
+    Retira el estado publicado, detiene el navegador actual y arranca una generación nueva
+
+    Returns:
+        tuple: (proceso, perfil, generacion)
+    """
+    LogManager.escribir_log("WARNING", f"♻️ Reiniciando Chromium: {motivo}")
+    ServicioNavegador.publicar_estado(None)
+    detener_chromium(proceso, perfil)
+    try:
+        os.remove(ServicioNavegador.ruta(f"usos_{generacion}"))
+    except OSError:
+        pass
+    generacion += 1
+    proceso, perfil = iniciar_chromium(ejecutable, args.puerto, not args.con_ventana, generacion)
+    return proceso, perfil, generacion
+
+
+# ==================== FUNCIÓN PRINCIPAL ====================
+def _solicitar_detencion(signum, frame):
+    global _detener
+    _detener = True
+
+
+def main(argumentos=None):
+    """Función principal del servicio"""
+    parser = argparse.ArgumentParser(description="Chromium residente para los bots (connect_over_cdp)")
+    parser.add_argument("--puerto", type=int, default=PUERTO_POR_DEFECTO,
+                        help=f"Puerto CDP local (por defecto {PUERTO_POR_DEFECTO})")
+    parser.add_argument("--max-ejecuciones", type=int, default=MAX_EJECUCIONES_POR_DEFECTO,
+                        help="Ejecuciones de bots antes de reciclar el navegador")
+    parser.add_argument("--max-rss-mb", type=int, default=MAX_RSS_MB_POR_DEFECTO,
+                        help="RSS máximo (MB) del árbol de Chromium antes de reciclarlo")
+    parser.add_argument("--intervalo", type=int, default=INTERVALO_POR_DEFECTO,
+                        help="Segundos entre chequeos de salud")
+    parser.add_argument("--con-ventana", action="store_true",
+                        help="Chromium con ventana (usa el DISPLAY actual) en lugar de headless")
+    args = parser.parse_args(argumentos)
+
+    signal.signal(signal.SIGTERM, _solicitar_detencion)
+    signal.signal(signal.SIGINT, _solicitar_detencion)
+
+    LogManager.iniciar_proceso(
+        NOMBRE_PROCESO, int(time.time()),
+        f"Puerto {args.puerto} - reciclar cada {args.max_ejecuciones} ejecuciones o {args.max_rss_mb} MB")
+
+    existente = ServicioNavegador.leer_estado()
+    if existente:
+        LogManager.finalizar_proceso(
+            NOMBRE_PROCESO, False, f"Ya hay un servicio activo (PID {existente['pid']})")
+        return False
+
+    ejecutable = ruta_chromium()
+    generacion = int(time.time())
+    proceso, perfil = iniciar_chromium(ejecutable, args.puerto, not args.con_ventana, generacion)
+    fallos_salud = 0
+
+    try:
+        while not _detener:
+            endpoint = f"http://127.0.0.1:{args.puerto}"
+
+            if proceso is None or proceso.poll() is not None:
+                proceso, perfil, generacion = reiniciar(
+                    ejecutable, args, proceso, perfil, generacion, "el proceso no está corriendo")
+                fallos_salud = 0
+            elif not endpoint_sano(endpoint):
+                fallos_salud += 1
+                if fallos_salud >= 2:
+                    proceso, perfil, generacion = reiniciar(
+                        ejecutable, args, proceso, perfil, generacion, "el puerto CDP no responde")
+                    fallos_salud = 0
+            else:
+                fallos_salud = 0
+                usos = ServicioNavegador.usos(generacion)
+                memoria = rss_mb(proceso.pid)
+                motivo = None
+                if usos >= args.max_ejecuciones:
+                    motivo = f"{usos} ejecuciones"
+                elif memoria > args.max_rss_mb:
+                    motivo = f"RSS {memoria:.0f} MB"
+
+                if motivo:
+                    # Solo con el lock exclusivo: ningún bot está conectado
+                    lease = ServicioNavegador.tomar_lease(exclusivo=True)
+                    if lease is None:
+                        LogManager.escribir_log(
+                            "DEBUG", f"Reciclado pendiente ({motivo}): hay bots conectados")
+                    else:
+                        try:
+                            proceso, perfil, generacion = reiniciar(
+                                ejecutable, args, proceso, perfil, generacion, motivo)
+                        finally:
+                            ServicioNavegador.liberar_lease(lease)
+
+            # Espera interrumpible por SIGTERM/SIGINT
+            limite = time.time() + args.intervalo
+            while not _detener and time.time() < limite:
+                time.sleep(0.5)
+
+        LogManager.finalizar_proceso(NOMBRE_PROCESO, True, "Servicio detenido")
+        return True
+
+    finally:
+        ServicioNavegador.publicar_estado(None)
+        detener_chromium(proceso, perfil)
+        try:
+            os.remove(ServicioNavegador.ruta(f"usos_{generacion}"))
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+TRABAJADOR DE LA COLA DE TRABAJOS
+
+Reparte las ejecuciones de los robots entre varios hosts a través de la tabla
+AutomationJob (ver ColaTrabajos en componentes_comunes).
+
+    - `encolar` agrega trabajos: un banco, opcionalmente por empresa y con una
+      ventana de fechas propia. No duplica trabajos Pendiente/EnCurso iguales,
+      así que puede correr desde el cron de cualquier host.
+    - `trabajar` toma trabajos con lease y ejecuta cada uno en un proceso hijo
+      (igual que el orquestador), renovando el lease con latidos. Si el host
+      cae, el lease vence y otro trabajador lo retoma; si el lease se pierde,
+      el hijo se termina para no procesar dos veces.
+    - Solo hay un trabajo en curso por banco en toda la flota (una sesión de
+      portal por usuario).
+    - SIGTERM/SIGINT: deja de tomar trabajos, termina los hijos y devuelve sus
+      trabajos a Pendiente sin consumir el intento.
+
+Uso:
+    python trabajador_cola.py encolar                                     # robots activos
+    python trabajador_cola.py encolar --bancos produbanco --empresas MAXXIMUNDO AUTOLLANTA
+    python trabajador_cola.py encolar --bancos produbanco --desde 01/10/2026 --hasta 05/10/2026
+    python trabajador_cola.py trabajar --concurrencia 2
+    python trabajador_cola.py trabajar --bancos guayaquil produbanco --una-vez
+    python trabajador_cola.py estado
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import importlib
+import multiprocessing
+from multiprocessing.connection import wait
+from componentes_comunes import LogManager, ColaTrabajos, ConfiguracionManager
+from orquestador import ROBOTS, CONCURRENCIA_POR_DEFECTO, _ejecutar_robot
+
+
+# ==================== CONFIGURACIÓN GLOBAL ====================
+NOMBRE_PROCESO = "Trabajador Cola"
+LEASE_POR_DEFECTO = 300    # segundos sin latido antes de que otro host retome el trabajo
+LATIDO_POR_DEFECTO = 60    # segundos entre renovaciones del lease
+ESPERA_POR_DEFECTO = 30    # segundos entre consultas a la cola vacía
+
+_detener = False
+
+
+# ==================== ENCOLAR ====================
+def encolar(args):
+    """
+    Agrega a la cola un trabajo por banco (o por banco y empresa)
+
+    Los trabajos por empresa de un robot con ventana propia (Produbanco) sin
+    --desde/--hasta llevan la ventana vigente de configuraciones.csv: cada
+    ejecución exitosa la mueve a ayer-hoy, y los trabajos que corrieran
+    después perderían los días atrasados. La ventana pasa a los trabajos y
+    configuraciones.csv se actualiza al encolarlos.
+
+    Returns:
+        bool: True si no hubo errores (los duplicados no son error)
+    """
+    bancos = args.bancos or [clave for clave, config in ROBOTS.items() if config['activo']]
+    if bool(args.desde) != bool(args.hasta):
+        LogManager.escribir_log("ERROR", "--desde y --hasta se indican juntos")
+        return False
+
+    encolados = 0
+    for banco in bancos:
+        config = ROBOTS[banco]
+        empresas = args.empresas or [None]
+        if args.empresas and not config['por_empresa']:
+            LogManager.escribir_log(
+                "WARNING", f"{banco} no admite trabajos por empresa, se encola completo")
+            empresas = [None]
+        desde, hasta = args.desde, args.hasta
+        if desde and not config['por_fechas']:
+            LogManager.escribir_log(
+                "WARNING", f"{banco} usa la ventana fija de su portal, se ignora {desde} - {hasta}")
+            desde, hasta = None, None
+        ventana_vigente = not desde and config['por_fechas'] and empresas != [None]
+        if ventana_vigente:
+            desde, hasta = importlib.import_module(config['modulo']).obtener_fechas_consulta()
+
+        encolados_banco = 0
+        for empresa in empresas:
+            if ColaTrabajos.encolar(banco, empresa, desde, hasta, args.max_intentos):
+                encolados_banco += 1
+                encolados += 1
+                LogManager.escribir_log(
+                    "SUCCESS", f"➕ Encolado: {banco} {empresa or '(todas las empresas)'} {desde or ''} {hasta or ''}")
+            else:
+                LogManager.escribir_log(
+                    "INFO", f"Ya existe un trabajo pendiente o en curso: {banco} {empresa or '(todas las empresas)'}")
+        if ventana_vigente and encolados_banco:
+            # La ventana ya quedó en los trabajos: la próxima empieza en ayer-hoy
+            ConfiguracionManager.actualizar_configuraciones_fecha()
+
+    LogManager.escribir_log("INFO", f"📊 Trabajos encolados: {encolados}")
+    return True
+
+
+# ==================== TRABAJAR ====================
+def _ejecutar_trabajo(trabajo):
+    """
+    Punto de entrada del proceso hijo: fija el filtro del trabajo y ejecuta el robot
+
+    Los bots leen RPA_EMPRESAS y RPA_FECHA_DESDE/HASTA (ConfiguracionManager).
+    """
+    # El fork hereda el manejador del trabajador: terminate() debe terminar al hijo
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    for variable in ("RPA_EMPRESAS", "RPA_FECHA_DESDE", "RPA_FECHA_HASTA"):
+        os.environ.pop(variable, None)
+    if trabajo['empresa']:
+        # JSON: un nombre de empresa puede contener comas
+        os.environ["RPA_EMPRESAS"] = json.dumps([trabajo['empresa']])
+    if trabajo['fechaDesde'] and trabajo['fechaHasta']:
+        os.environ["RPA_FECHA_DESDE"] = trabajo['fechaDesde']
+        os.environ["RPA_FECHA_HASTA"] = trabajo['fechaHasta']
+    _ejecutar_robot(trabajo['banco'])
+
+
+def _terminar_hijo(proceso):
+    """Termina el proceso hijo (SIGTERM y, si no responde, SIGKILL)"""
+    proceso.terminate()
+    proceso.join(10)
+    if proceso.is_alive():
+        proceso.kill()
+        proceso.join()
+
+
+def _solicitar_detencion(signum, frame):
+    global _detener
+    _detener = True
+
+
+def trabajar(args):
+    """
+    Toma y ejecuta trabajos hasta recibir SIGTERM (o hasta vaciar la cola con --una-vez)
+
+    Returns:
+        bool: True si todos los trabajos ejecutados terminaron bien
+    """
+    trabajador = f"{socket.gethostname()}:{os.getpid()}"
+    concurrencia = max(1, args.concurrencia)
+    contexto = multiprocessing.get_context("fork")
+    activos = {}  # idJob -> (proceso, trabajo, inicio, ultimo_latido)
+    exito_total = True
+    proxima_consulta = 0
+
+    LogManager.escribir_log(
+        "INFO", f"👷 Trabajador {trabajador} - bancos: {', '.join(args.bancos or ['todos'])} - concurrencia: {concurrencia}")
+
+    while not _detener:
+        # Tomar trabajos hasta llenar los cupos libres
+        cola_vacia = False
+        if time.time() >= proxima_consulta:
+            while len(activos) < concurrencia and not _detener:
+                trabajo = ColaTrabajos.tomar(trabajador, args.bancos, args.lease)
+                if not trabajo:
+                    cola_vacia = True
+                    proxima_consulta = time.time() + args.espera
+                    break
+                proceso = contexto.Process(
+                    target=_ejecutar_trabajo, args=(trabajo,), name=f"trabajo-{trabajo['idJob']}")
+                proceso.start()
+                ahora = time.time()
+                activos[trabajo['idJob']] = (proceso, trabajo, ahora, ahora)
+                LogManager.escribir_log(
+                    "INFO", f"▶️ Trabajo {trabajo['idJob']} ({trabajo['banco']}) iniciado (PID {proceso.pid})")
+
+        if args.una_vez and cola_vacia and not activos:
+            break
+
+        if activos:
+            wait([proceso.sentinel for proceso, _, _, _ in activos.values()], timeout=1)
+        else:
+            time.sleep(1)
+
+        for id_job, (proceso, trabajo, inicio, ultimo_latido) in list(activos.items()):
+            timeout = ROBOTS[trabajo['banco']]['timeout']
+            duracion = time.time() - inicio
+
+            if not proceso.is_alive():
+                proceso.join()
+                exito = proceso.exitcode == 0
+                exito_total = exito_total and exito
+                ColaTrabajos.finalizar(
+                    id_job, trabajador, exito, None if exito else f"Código de salida {proceso.exitcode}")
+                nivel = "SUCCESS" if exito else "ERROR"
+                LogManager.escribir_log(
+                    nivel, f"⏹️ Trabajo {id_job} ({trabajo['banco']}) terminó con código {proceso.exitcode} ({duracion:.0f}s)")
+                del activos[id_job]
+                proxima_consulta = 0  # cupo libre: consultar la cola de inmediato
+
+            elif duracion > timeout:
+                LogManager.escribir_log(
+                    "ERROR", f"⏰ Trabajo {id_job} ({trabajo['banco']}) superó su timeout ({timeout}s), terminando...")
+                _terminar_hijo(proceso)
+                ColaTrabajos.finalizar(id_job, trabajador, False, f"Timeout ({timeout}s)")
+                exito_total = False
+                del activos[id_job]
+
+            elif time.time() - ultimo_latido >= args.latido:
+                if ColaTrabajos.latido(id_job, trabajador, args.lease):
+                    activos[id_job] = (proceso, trabajo, inicio, time.time())
+                else:
+                    # Otro trabajador lo retomó (este host estuvo sin BD más que el lease)
+                    LogManager.escribir_log(
+                        "ERROR", f"🔒 Trabajo {id_job} ({trabajo['banco']}): lease perdido, terminando el robot")
+                    _terminar_hijo(proceso)
+                    exito_total = False
+                    del activos[id_job]
+
+    # Detención: los trabajos interrumpidos vuelven a la cola
+    for id_job, (proceso, trabajo, _, _) in activos.items():
+        LogManager.escribir_log(
+            "WARNING", f"↩️ Devolviendo trabajo {id_job} ({trabajo['banco']}) a la cola")
+        _terminar_hijo(proceso)
+        ColaTrabajos.devolver(id_job, trabajador)
+
+    return exito_total
+
+
+# ==================== ESTADO ====================
+def mostrar_estado(args):
+    """Muestra la cantidad de trabajos por banco y estado"""
+    filas = ColaTrabajos.resumen()
+    print(f"{'Banco':<14} {'Estado':<10} {'Trabajos':>8}")
+    for banco, estado, cantidad in filas:
+        print(f"{banco:<14} {estado:<10} {cantidad:>8}")
+    return True
+
+
+# ==================== FUNCIÓN PRINCIPAL ====================
+def main(argumentos=None):
+    """Función principal del trabajador"""
+    parser = argparse.ArgumentParser(
+        description="Cola de trabajos de los robots bancarios compartida entre hosts")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_encolar = subparsers.add_parser("encolar", help="Agregar trabajos a la cola")
+    p_encolar.add_argument("--bancos", nargs="+", choices=sorted(ROBOTS),
+                           help="Robots a encolar (por defecto: todos los activos)")
+    p_encolar.add_argument("--empresas", nargs="+",
+                           help="Un trabajo por empresa (solo robots con por_empresa)")
+    p_encolar.add_argument("--desde", help="Inicio de la ventana dd/mm/yyyy (solo robots con por_fechas)")
+    p_encolar.add_argument("--hasta", help="Fin de la ventana dd/mm/yyyy")
+    p_encolar.add_argument("--max-intentos", type=int, default=3,
+                           help="Tomas permitidas antes de marcar el trabajo como Error")
+
+    p_trabajar = subparsers.add_parser("trabajar", help="Tomar y ejecutar trabajos")
+    p_trabajar.add_argument("--bancos", nargs="+", choices=sorted(ROBOTS),
+                            help="Robots que este host puede ejecutar (por defecto: todos)")
+    p_trabajar.add_argument("--concurrencia", type=int, default=CONCURRENCIA_POR_DEFECTO,
+                            help=f"Máximo de trabajos simultáneos (por defecto {CONCURRENCIA_POR_DEFECTO})")
+    p_trabajar.add_argument("--lease", type=int, default=LEASE_POR_DEFECTO,
+                            help=f"Segundos de lease sin latido (por defecto {LEASE_POR_DEFECTO})")
+    p_trabajar.add_argument("--latido", type=int, default=LATIDO_POR_DEFECTO,
+                            help=f"Segundos entre latidos (por defecto {LATIDO_POR_DEFECTO})")
+    p_trabajar.add_argument("--espera", type=int, default=ESPERA_POR_DEFECTO,
+                            help="Segundos entre consultas cuando la cola está vacía")
+    p_trabajar.add_argument("--una-vez", action="store_true",
+                            help="Terminar cuando la cola quede vacía (para cron)")
+
+    subparsers.add_parser("estado", help="Trabajos por banco y estado")
+    args = parser.parse_args(argumentos)
+
+    if args.comando == "trabajar" and args.latido >= args.lease:
+        parser.error("--latido debe ser menor que --lease")
+
+    if not ColaTrabajos.asegurar_tabla():
+        LogManager.escribir_log("ERROR", "No se pudo crear o acceder a la tabla de la cola")
+        return False
+
+    if args.comando == "encolar":
+        return encolar(args)
+    if args.comando == "estado":
+        return mostrar_estado(args)
+
+    signal.signal(signal.SIGTERM, _solicitar_detencion)
+    signal.signal(signal.SIGINT, _solicitar_detencion)
+
+    LogManager.iniciar_proceso(
+        NOMBRE_PROCESO, int(time.time()),
+        f"Lease {args.lease}s - latido {args.latido}s - concurrencia {args.concurrencia}")
+    inicio = time.time()
+    exito = trabajar(args)
+    LogManager.finalizar_proceso(
+        NOMBRE_PROCESO, exito, f"Duración total: {time.time() - inicio:.0f}s")
+    return exito
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)